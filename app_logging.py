@@ -0,0 +1,123 @@
+import atexit
+import collections
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from typing import Deque, Dict, List, Optional, Tuple
+
+from paths import LOG_DIR, LOG_FILE
+
+LOGGER_NAME = "beatz"
+MAX_BYTES = 1 << 20
+BACKUP_COUNT = 3
+RING_SIZE = 500
+RATE_WINDOW = 60.0
+RATE_BURST = 3
+FORMAT = "%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s"
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, window: float = RATE_WINDOW, burst: int = RATE_BURST, max_keys: int = 1024):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._seen: Dict[Tuple, List[float]] = {}
+
+    @staticmethod
+    def signature(record: logging.LogRecord) -> Tuple:
+        exc = record.exc_info
+        if exc and exc[2] is not None:
+            tb = exc[2]
+            while tb.tb_next is not None:
+                tb = tb.tb_next
+            return (record.name, record.levelno, exc[0].__name__, tb.tb_frame.f_code.co_filename, tb.tb_lineno)
+        return (record.name, record.levelno, record.pathname, record.lineno, record.getMessage())
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = self.signature(record)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                suppressed = int(entry[2]) if entry else 0
+                if len(self._seen) >= self.max_keys:
+                    self._seen.clear()
+                self._seen[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} [{suppressed} similar message(s) suppressed]"
+                return True
+            if entry[1] < self.burst:
+                entry[1] += 1
+                return True
+            entry[2] += 1
+            return False
+
+class _AsyncQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class RingBufferHandler(logging.Handler):
+    def __init__(self, capacity: int = RING_SIZE):
+        super().__init__()
+        self.records: Deque[str] = collections.deque(maxlen=capacity)
+        self.setFormatter(logging.Formatter(FORMAT))
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.records.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+_lock = threading.Lock()
+_configured = False
+_listener: Optional[logging.handlers.QueueListener] = None
+_ring: Optional[RingBufferHandler] = None
+
+def _build_file_handler() -> Optional[logging.Handler]:
+    try:
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT,
+                                                       encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter(FORMAT))
+        return handler
+    except Exception:
+        return None
+
+def get_logger(name: Optional[str] = None) -> logging.Logger:
+    global _configured, _listener, _ring
+    if not _configured:
+        with _lock:
+            if not _configured:
+                root = logging.getLogger(LOGGER_NAME)
+                root.setLevel(logging.INFO)
+                root.propagate = False
+                q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+                handler = _AsyncQueueHandler(q)
+                handler.addFilter(RateLimitFilter())
+                root.addHandler(handler)
+                _ring = RingBufferHandler()
+                targets = [h for h in (_build_file_handler(), _ring) if h is not None]
+                _listener = logging.handlers.QueueListener(q, *targets, respect_handler_level=True)
+                _listener.start()
+                atexit.register(shutdown)
+                _configured = True
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+def recent_events(limit: Optional[int] = None) -> List[str]:
+    if _ring is None:
+        return []
+    events = list(_ring.records)
+    return events[-limit:] if limit else events
+
+def shutdown():
+    global _listener
+    with _lock:
+        if _listener is not None:
+            try:
+                _listener.stop()
+            except Exception:
+                pass
+            _listener = None
@@ -0,0 +1,346 @@
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from library_index import LibraryIndex, get_library_index
+from metadata_utils import SUPPORTED_EXT, read_metadata_from
+from metrics import counter, gauge
+from paths import AUDIO_CACHE_DIR
+from utils import log_exc_to_file
+
+AUDIO_CACHE_FLAG = "--audio-cache"
+AUDIO_CACHE_ENV = "BEATZ_AUDIO_CACHE"
+LATENCY_ENV = "BEATZ_AUDIO_CACHE_LATENCY_MS"
+DEFAULT_BUDGET_MB = 2048
+PREFETCH_AHEAD = 2
+COPY_CHUNK = 1 << 20
+TOUCH_DELAY = 5.0
+
+_hits = counter("audio_cache_hits_total", "Tracks played from the local audio cache")
+_misses = counter("audio_cache_misses_total", "Tracks played from their source because no local copy was ready")
+_fetched = counter("audio_cache_fetched_bytes_total", "Bytes copied from library sources into the audio cache")
+_evicted = counter("audio_cache_evictions_total", "Local copies removed to stay within the audio cache budget")
+_cache_bytes = gauge("audio_cache_bytes", "Bytes held in the local audio cache")
+
+def audio_cache_budget(argv: Optional[List[str]] = None) -> int:
+    # "--audio-cache" or BEATZ_AUDIO_CACHE=1 enables the default budget;
+    # BEATZ_AUDIO_CACHE=<n> sets it to n MiB.
+    argv = sys.argv if argv is None else argv
+    env = os.environ.get(AUDIO_CACHE_ENV, "")
+    if AUDIO_CACHE_FLAG not in argv and env in ("", "0"):
+        return 0
+    try:
+        mb = int(env)
+    except ValueError:
+        mb = 0
+    return (mb if mb > 1 else DEFAULT_BUDGET_MB) << 20
+
+def simulated_latency() -> float:
+    try:
+        return max(0.0, float(os.environ.get(LATENCY_ENV, "0"))) / 1000.0
+    except ValueError:
+        return 0.0
+
+class CacheEntry(NamedTuple):
+    name: str
+    size: int
+    mtime_ns: int
+
+class AudioCache(threading.Thread):
+    """Read-through local copies of library files on slow or network storage.
+
+    resolve() never touches the source: it returns the local copy when one
+    exists (and asks this thread to re-check it), or the source path while a
+    copy is fetched for next time. follow() prefetches the tracks the core
+    will play next. Copies are evicted least-recently-played first, and the
+    LRU order survives restarts in library.db (audio_cache).
+    """
+
+    def __init__(self, budget: int, directory: Path = AUDIO_CACHE_DIR, latency: float = 0.0,
+                 index: Optional[LibraryIndex] = None, cache_tags: bool = True):
+        super().__init__(name="audio-cache", daemon=True)
+        self.budget = budget
+        self.directory = directory
+        self.latency = latency
+        self.cache_tags = cache_tags
+        self._index = index or get_library_index()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._pending: "OrderedDict[str, None]" = OrderedDict()
+        self._forgotten: List[str] = []
+        self._touched: Dict[str, float] = {}
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        try:
+            for path, size, mtime_ns, name, _ in self._index.audio_cache_entries():
+                self._entries[path] = CacheEntry(name, size, mtime_ns)
+                self._bytes += size
+        except Exception as e:
+            log_exc_to_file(e)
+        _cache_bytes.set(self._bytes)
+
+    def _local(self, entry: CacheEntry) -> Path:
+        return self.directory / entry.name
+
+    def resolve(self, path: Path) -> Path:
+        key = str(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._touched[key] = time.time()
+        self.request([path])
+        if entry is not None and self._local(entry).exists():
+            _hits.inc()
+            return self._local(entry)
+        _misses.inc()
+        return path
+
+    def request(self, paths: Iterable[Path]):
+        with self._lock:
+            for p in paths:
+                self._pending[str(p)] = None
+        self._wake.set()
+
+    def forget(self, paths: Iterable[Path]):
+        # Copies of tracks that left the library are dropped by this thread.
+        with self._lock:
+            for p in paths:
+                key = str(p)
+                self._pending.pop(key, None)
+                if key in self._entries:
+                    self._forgotten.append(key)
+        self._wake.set()
+
+    def follow(self, core, ahead: int = PREFETCH_AHEAD):
+        def _listener(event: str, data: dict):
+            if event in ("track", "queue", "playlist"):
+                self.request(core.upcoming(ahead))
+            elif event == "removed":
+                self.forget(data["paths"])
+        core.add_listener(_listener)
+
+    # Source access goes through these two methods, which add the configured
+    # latency per operation so a local folder can stand in for a slow share.
+    def _source_identity(self, path: Path) -> Optional[Tuple[int, int]]:
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def _copy_source(self, path: Path, dest: Path) -> int:
+        copied = 0
+        if self.latency:
+            time.sleep(self.latency)
+        with open(path, "rb") as src, open(dest, "wb") as out:
+            while not self._stop_event.is_set():
+                chunk = src.read(COPY_CHUNK)
+                if self.latency:
+                    time.sleep(self.latency)
+                if not chunk:
+                    return copied
+                out.write(chunk)
+                copied += len(chunk)
+        raise InterruptedError
+
+    def _drop(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size
+            self._touched.pop(key, None)
+        if entry is None:
+            return
+        try:
+            self._local(entry).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError:
+            # Still open (being played, on Windows): the orphan sweep at the
+            # next start removes it.
+            pass
+        self._index.remove_audio_cache_entries([key])
+        _cache_bytes.set(self._bytes)
+
+    def _make_room(self, size: int, keep: str):
+        while True:
+            with self._lock:
+                if self._bytes + size <= self.budget:
+                    return
+                victim = next((k for k in self._entries if k != keep), None)
+            if victim is None:
+                return
+            self._drop(victim)
+            _evicted.inc()
+
+    def _sync(self, key: str):
+        path = Path(key)
+        ident = self._source_identity(path)
+        with self._lock:
+            entry = self._entries.get(key)
+        if ident is None:
+            return  # Source offline or gone: keep serving the copy we have.
+        if entry is not None:
+            if (entry.size, entry.mtime_ns) == ident and self._local(entry).exists():
+                return
+            self._drop(key)
+        if ident[0] > self.budget:
+            return
+        self._make_room(ident[0], key)
+        name = hashlib.blake2b(key.encode("utf-8"), digest_size=12).hexdigest() + path.suffix.lower()
+        local = self.directory / name
+        part = local.with_name(local.name + ".part")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        try:
+            copied = self._copy_source(path, part)
+            if copied != ident[0] or self._source_identity(path) != ident:
+                raise OSError(f"{path} changed while it was being cached")
+            os.replace(part, local)
+        except Exception as e:
+            try:
+                part.unlink()
+            except OSError:
+                pass
+            if not isinstance(e, InterruptedError):
+                log_exc_to_file(e)
+            return
+        _fetched.inc(copied)
+        now = time.time()
+        with self._lock:
+            self._entries[key] = CacheEntry(name, ident[0], ident[1])
+            self._bytes += ident[0]
+        _cache_bytes.set(self._bytes)
+        self._index.set_audio_cache_entry(key, ident[0], ident[1], name, now)
+        if self.cache_tags and path.suffix.lower() in SUPPORTED_EXT and not self._index.get_tags([path], verify=False):
+            # Tags are read from the local copy and kept in the index, so the
+            # library loads next time without reading them over the network.
+            self._index.set_tags({key: read_metadata_from(path, local)})
+
+    def _sweep(self):
+        if not self.directory.exists():
+            return
+        with self._lock:
+            known = {e.name for e in self._entries.values()}
+        for f in self.directory.iterdir():
+            if f.name not in known:
+                try:
+                    f.unlink()
+                except OSError:
+                    pass
+
+    def _flush_touched(self):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        try:
+            self._index.touch_audio_cache(touched)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def run(self):
+        try:
+            self._sweep()
+            self._make_room(0, "")
+        except Exception as e:
+            log_exc_to_file(e)
+        while not self._stop_event.is_set():
+            self._wake.wait(TOUCH_DELAY)
+            self._wake.clear()
+            with self._lock:
+                forgotten, self._forgotten = self._forgotten, []
+            for key in forgotten:
+                self._drop(key)
+            while not self._stop_event.is_set():
+                with self._lock:
+                    if not self._pending:
+                        break
+                    key = next(iter(self._pending))
+                    del self._pending[key]
+                try:
+                    self._sync(key)
+                except Exception as e:
+                    log_exc_to_file(e)
+            self._flush_touched()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        if self.is_alive():
+            self.join(timeout=2.0)
+        self._flush_touched()
+
+def _play_through(path: Path, latency: float) -> float:
+    # Stands in for the player reading a whole track.
+    t0 = time.perf_counter()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(COPY_CHUNK)
+            if latency:
+                time.sleep(latency)
+            if not chunk:
+                break
+    return time.perf_counter() - t0
+
+def run_benchmark(tracks: int, size_mb: float, latency: float, budget_mb: int, dwell: float) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        share = Path(tmp) / "share"
+        share.mkdir()
+        paths = []
+        for i in range(tracks):
+            p = share / f"track{i:03d}.bin"
+            p.write_bytes(os.urandom(int(size_mb * (1 << 20))))
+            paths.append(p)
+        index = LibraryIndex(Path(tmp) / "bench.db")
+        cache = AudioCache(budget_mb << 20, Path(tmp) / "cache", latency=latency, index=index, cache_tags=False)
+        cache.start()
+        played = {"hit": [], "miss": []}
+        for i, p in enumerate(paths):
+            cache.request(paths[i + 1:i + 1 + PREFETCH_AHEAD])
+            local = cache.resolve(p)
+            slow = local == p
+            played["miss" if slow else "hit"].append(_play_through(local, latency if slow else 0.0))
+            time.sleep(dwell)
+        cache.stop()
+        cached_bytes = cache._bytes
+        index.close()
+    mean = lambda xs: sum(xs) / len(xs) if xs else 0.0
+    return {
+        "tracks": tracks,
+        "hits": len(played["hit"]),
+        "misses": len(played["miss"]),
+        "hit_read_ms": mean(played["hit"]) * 1000,
+        "miss_read_ms": mean(played["miss"]) * 1000,
+        "cached_mb": cached_bytes / (1 << 20),
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Simulate a slow library share to measure the local audio cache.")
+    parser.add_argument("--bench", action="store_true", help="run the read-through cache benchmark")
+    parser.add_argument("--tracks", type=int, default=12)
+    parser.add_argument("--size-mb", type=float, default=8.0)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="delay added to every source stat/read")
+    parser.add_argument("--budget-mb", type=int, default=48)
+    parser.add_argument("--dwell", type=float, default=1.0, help="seconds each track 'plays' before the next")
+    args = parser.parse_args(argv)
+    if not args.bench:
+        parser.print_help()
+        return 0
+    r = run_benchmark(args.tracks, args.size_mb, args.latency_ms / 1000.0, args.budget_mb, args.dwell)
+    print(f"{r['tracks']} tracks of {args.size_mb:g} MiB, {args.latency_ms:g} ms per source operation")
+    print(f"  played from cache : {r['hits']:3d}  ({r['hit_read_ms']:8.1f} ms to read a track)")
+    print(f"  played from source: {r['misses']:3d}  ({r['miss_read_ms']:8.1f} ms to read a track)")
+    print(f"  cache size at end : {r['cached_mb']:.1f} / {args.budget_mb} MiB")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,23 +1,262 @@
 import vlc
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Iterable, List, NamedTuple, Optional, Sequence, Tuple
 
 try:
     os.add_dll_directory(r"C:\Program Files\VideoLAN\VLC")
 except Exception:
     pass
 
+PREAMP_LIMIT_DB = 20.0
+TAP_DRIFT_MS = 150
+
+EQ_BAND_COUNT = 10
+RENDER_FORMATS = {"wav": ("s16l", "wav"), "flac": ("flac", "raw")}
+
+class RenderResult(NamedTuple):
+    src: str
+    dest: str
+    ok: bool
+    duration_ms: int
+    elapsed: float
+
+def render_destinations(tracks: Iterable[Path], out_dir: Path, fmt: str) -> List[Path]:
+    # Output files are named after the track; a stem that repeats in the
+    # batch gets " (2)", " (3)", ... instead of overwriting the first one.
+    taken = set()
+    out = []
+    for track in tracks:
+        name, n = track.stem, 2
+        while name.casefold() in taken:
+            name = f"{track.stem} ({n})"
+            n += 1
+        taken.add(name.casefold())
+        out.append(out_dir / f"{name}.{fmt}")
+    return out
+
+class OfflineRenderer:
+    def __init__(self, bands: Optional[Sequence[float]] = None, fmt: str = "wav", samplerate: int = 44100,
+                 channels: int = 2, timeout: float = 900.0):
+        if fmt not in RENDER_FORMATS:
+            raise ValueError(f"unsupported render format: {fmt}")
+        self.bands = list(bands)[:EQ_BAND_COUNT] if bands else None
+        self.fmt = fmt
+        self.samplerate = samplerate
+        self.channels = channels
+        self.timeout = timeout
+
+    def _uses_equalizer(self, gain_db: float) -> bool:
+        return bool(self.bands) or abs(gain_db) >= 0.05
+
+    def _instance_args(self, gain_db: float) -> List[str]:
+        args = ["--no-video", "--no-xlib", "--quiet", "--no-sout-video", "--aout=dummy"]
+        gain_db = max(-PREAMP_LIMIT_DB, min(PREAMP_LIMIT_DB, gain_db))
+        if self._uses_equalizer(gain_db):
+            bands = (self.bands or []) + [0.0] * (EQ_BAND_COUNT - len(self.bands or []))
+            args += ["--no-equalizer-vlcfreqs",
+                     "--equalizer-bands=" + " ".join(f"{b:.1f}" for b in bands),
+                     f"--equalizer-preamp={gain_db:.2f}"]
+        return args
+
+    def _sout(self, dest: str, use_eq: bool) -> str:
+        acodec, mux = RENDER_FORMATS[self.fmt]
+        afilter = ",afilter=equalizer" if use_eq else ""
+        # dst is a quoted value in the sout chain, where ' and \ must be escaped.
+        dst = dest.replace("\\", "/") if os.name == "nt" else dest
+        dst = dst.replace("\\", "\\\\").replace("'", "\\'")
+        return (f":sout=#transcode{{acodec={acodec},channels={self.channels},samplerate={self.samplerate}{afilter}}}"
+                f":std{{access=file,mux={mux},dst='{dst}'}}")
+
+    def render(self, src: str, dest: str, gain_db: float = 0.0) -> RenderResult:
+        instance = None
+        player = None
+        start = time.monotonic()
+        length = 0
+        try:
+            instance = vlc.Instance(*self._instance_args(gain_db))
+            media = instance.media_new(src)
+            media.add_option(self._sout(dest, self._uses_equalizer(gain_db)))
+            player = instance.media_player_new()
+            player.set_media(media)
+            player.play()
+            deadline = start + self.timeout
+            done = (vlc.State.Ended, vlc.State.Error, vlc.State.Stopped)
+            while time.monotonic() < deadline:
+                length = max(length, int(player.get_length() or 0))
+                state = player.get_state()
+                if state in done:
+                    ok = state == vlc.State.Ended and os.path.exists(dest)
+                    return RenderResult(src, dest, ok, length, time.monotonic() - start)
+                time.sleep(0.02)
+        except Exception:
+            pass
+        finally:
+            try:
+                if player is not None:
+                    player.stop()
+                    player.release()
+                if instance is not None:
+                    instance.release()
+            except Exception:
+                pass
+        return RenderResult(src, dest, False, length, time.monotonic() - start)
+
+    def render_many(self, jobs: Sequence[Tuple[str, str, float]], workers: Optional[int] = None,
+                    progress: Optional[Callable[[RenderResult, int, int], None]] = None,
+                    cancelled: Optional[Callable[[], bool]] = None) -> Tuple[List[RenderResult], float]:
+        results: List[RenderResult] = []
+        start = time.monotonic()
+        workers = workers or max(1, min(len(jobs), os.cpu_count() or 2))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for src, dest, gain in jobs:
+                futures.append(pool.submit(self._render_job, src, dest, gain, cancelled))
+            for fut in as_completed(futures):
+                res = fut.result()
+                results.append(res)
+                if progress is not None:
+                    progress(res, len(results), len(jobs))
+        wall = max(time.monotonic() - start, 1e-6)
+        audio = sum(r.duration_ms for r in results if r.ok) / 1000.0
+        return results, audio / wall
+
+    def _render_job(self, src: str, dest: str, gain_db: float, cancelled: Optional[Callable[[], bool]]) -> RenderResult:
+        if cancelled is not None and cancelled():
+            return RenderResult(src, dest, False, 0, 0.0)
+        return self.render(src, dest, gain_db)
+
+def transcode_to_wav(src: str, dest: str, samplerate: int = 48000, channels: int = 2, timeout: float = 600.0) -> bool:
+    return OfflineRenderer(samplerate=samplerate, channels=channels, timeout=timeout).render(src, dest).ok
+
 class AudioEngine:
     def __init__(self):
         self.instance = vlc.Instance()
         self.player = self.instance.media_player_new()
         self.media = None
+        self.gain_db = 0.0
+        self._user_equalizer = None
+        self._gain_equalizer = None
+        self._tap_player = None
+        self._tap_callback = None
 
-    def set_media(self, path: str):
+    def set_media(self, path: str, gain_db: float = 0.0, start_ms: int = 0):
         try:
             self.media = self.instance.media_new(path)
+            if start_ms > 0:
+                self.media.add_option(f":start-time={start_ms / 1000.0:.3f}")
             self.player.set_media(self.media)
         except Exception:
             pass
+        self._tap_set_media(path)
+        self.set_gain(gain_db)
+
+    def set_gain(self, gain_db: float):
+        self.gain_db = max(-PREAMP_LIMIT_DB, min(PREAMP_LIMIT_DB, float(gain_db or 0.0)))
+        self._apply_equalizer()
+
+    def set_equalizer(self, eq):
+        self._user_equalizer = eq
+        self._apply_equalizer()
+
+    def _apply_equalizer(self):
+        try:
+            eq = self._user_equalizer
+            if eq is None and abs(self.gain_db) >= 0.05:
+                if self._gain_equalizer is None:
+                    self._gain_equalizer = vlc.AudioEqualizer()
+                eq = self._gain_equalizer
+            if eq is not None:
+                eq.set_preamp(self.gain_db)
+            for p in (self.player, self._tap_player):
+                if p is not None:
+                    p.set_equalizer(eq)
+        except Exception:
+            pass
+
+    def set_equalizer_bands(self, bands: Optional[Sequence[float]]):
+        if not bands:
+            self.set_equalizer(None)
+            return
+        try:
+            eq = vlc.AudioEqualizer()
+            for i, db in enumerate(list(bands)[:EQ_BAND_COUNT]):
+                eq.set_amp_at_index(float(db), i)
+        except Exception:
+            return
+        self.set_equalizer(eq)
+
+    def equalizer_bands(self) -> Optional[List[float]]:
+        eq = self._user_equalizer
+        if eq is None:
+            return None
+        try:
+            return [float(eq.get_amp_at_index(i)) for i in range(EQ_BAND_COUNT)]
+        except Exception:
+            return None
+
+    def enable_tap(self, ring, rate: int, channels: int) -> bool:
+        if self._tap_player is not None:
+            return True
+        try:
+            @vlc.CallbackDecorators.AudioPlayCb
+            def _play(data, samples, count, pts):
+                ring.write(samples, count)
+
+            tap = self.instance.media_player_new()
+            tap.audio_set_callbacks(_play, None, None, None, None, None)
+            tap.audio_set_format("S16N", rate, channels)
+            self._tap_callback = _play
+            self._tap_player = tap
+            if self.media is not None:
+                tap.set_media(self.instance.media_new(self.media.get_mrl()))
+            self._apply_equalizer()
+            self.sync_tap()
+            return True
+        except Exception:
+            self._tap_player = None
+            self._tap_callback = None
+            return False
+
+    def disable_tap(self):
+        tap = self._tap_player
+        self._tap_player = None
+        if tap is None:
+            return
+        try:
+            tap.stop()
+            tap.release()
+        except Exception:
+            pass
+        self._tap_callback = None
+
+    def _tap_set_media(self, path: str):
+        tap = self._tap_player
+        if tap is None:
+            return
+        try:
+            tap.set_media(self.instance.media_new(path))
+        except Exception:
+            pass
+
+    def sync_tap(self):
+        tap = self._tap_player
+        if tap is None:
+            return
+        try:
+            playing = bool(self.player.is_playing())
+            tap_playing = bool(tap.is_playing())
+            if playing and not tap_playing:
+                tap.play()
+                tap.set_time(int(self.player.get_time() or 0))
+            elif not playing and tap_playing:
+                tap.set_pause(1)
+            elif playing and abs(int(tap.get_time() or 0) - int(self.player.get_time() or 0)) > TAP_DRIFT_MS:
+                tap.set_time(int(self.player.get_time() or 0))
+        except Exception:
+            pass
 
     def play(self):
         try:
@@ -58,6 +297,8 @@ class AudioEngine:
     def set_time(self, ms: int):
         try:
             self.player.set_time(int(ms))
+            if self._tap_player is not None:
+                self._tap_player.set_time(int(ms))
         except Exception:
             pass
 
@@ -87,6 +328,7 @@ class AudioEngine:
 
     def release(self):
         try:
+            self.disable_tap()
             try:
                 self.player.release()
             except Exception:
@@ -0,0 +1,294 @@
+import collections
+import sys
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from metrics import counter, gauge
+
+LRU = "lru"
+LFU = "lfu"
+DEFAULT_GLOBAL_BUDGET = 96 << 20
+ENTRY_OVERHEAD = 64
+
+_MISSING = object()
+
+def estimate_size(obj: Any) -> int:
+    if obj is None:
+        return 0
+    if isinstance(obj, (bytes, bytearray, str)):
+        return sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(estimate_size(v) for v in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    return sys.getsizeof(obj)
+
+class _Flight:
+    __slots__ = ("event", "value", "error", "stale")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.stale = False
+
+class Cache:
+    def __init__(self, name: str, budget: int, policy: str = LRU,
+                 sizeof: Callable[[Any], int] = estimate_size, manager: Optional["CacheManager"] = None):
+        if policy not in (LRU, LFU):
+            raise ValueError(f"unknown cache policy {policy!r}")
+        self.name = name
+        self.budget = budget
+        self.policy = policy
+        self.sizeof = sizeof
+        self.manager = manager
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loads = 0
+        self.shared_loads = 0
+        self._lock = threading.RLock()
+        self._entries: Dict[Hashable, Any] = {}
+        self._sizes: Dict[Hashable, int] = {}
+        self._order: "collections.OrderedDict[Hashable, None]" = collections.OrderedDict()
+        self._freq: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, "collections.OrderedDict[Hashable, None]"] = {}
+        self._min_freq = 0
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._m_hits = counter("cache_hits_total", "Cache lookups served from memory", cache=name)
+        self._m_misses = counter("cache_misses_total", "Cache lookups that had to load", cache=name)
+        self._m_evictions = counter("cache_evictions_total", "Entries evicted to stay within a byte budget", cache=name)
+        self._m_entries = gauge("cache_entries", "Entries held by an in-memory cache", cache=name)
+        self._m_bytes = gauge("cache_bytes", "Estimated bytes held by an in-memory cache", cache=name)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def _touch(self, key: Hashable):
+        if self.policy == LRU:
+            self._order.move_to_end(key)
+            return
+        f = self._freq[key]
+        bucket = self._buckets[f]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[f]
+            if self._min_freq == f:
+                self._min_freq = f + 1
+        self._freq[key] = f + 1
+        self._buckets.setdefault(f + 1, collections.OrderedDict())[key] = None
+
+    def _track(self, key: Hashable):
+        if self.policy == LRU:
+            self._order[key] = None
+        else:
+            self._freq[key] = 1
+            self._buckets.setdefault(1, collections.OrderedDict())[key] = None
+            self._min_freq = 1
+
+    def _untrack(self, key: Hashable):
+        if self.policy == LRU:
+            self._order.pop(key, None)
+            return
+        f = self._freq.pop(key, None)
+        if f is None:
+            return
+        bucket = self._buckets[f]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[f]
+            if self._min_freq == f:
+                self._min_freq = min(self._buckets, default=0)
+
+    def _victim(self) -> Optional[Hashable]:
+        if self.policy == LRU:
+            return next(iter(self._order), None)
+        bucket = self._buckets.get(self._min_freq)
+        return next(iter(bucket), None) if bucket else None
+
+    def _remove(self, key: Hashable):
+        self._untrack(key)
+        del self._entries[key]
+        self.bytes -= self._sizes.pop(key)
+
+    def _publish(self):
+        self._m_entries.set(len(self._entries))
+        self._m_bytes.set(self.bytes)
+
+    def evict_one(self) -> bool:
+        with self._lock:
+            key = self._victim()
+            if key is None:
+                return False
+            self._remove(key)
+            self.evictions += 1
+            self._m_evictions.inc()
+            self._publish()
+            return True
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                self._m_misses.inc()
+                return default
+            self.hits += 1
+            self._m_hits.inc()
+            self._touch(key)
+            return value
+
+    def _store(self, key: Hashable, value: Any, size: int, only_if_absent: bool) -> bool:
+        if key in self._entries:
+            if only_if_absent:
+                return False
+            self._remove(key)
+        if size > self.budget:
+            self._publish()
+            return False
+        while self.bytes + size > self.budget and self.evict_one():
+            pass
+        self._entries[key] = value
+        self._sizes[key] = size
+        self.bytes += size
+        self._track(key)
+        self._publish()
+        return True
+
+    def _enforce_global(self):
+        if self.manager is not None:
+            self.manager.enforce_budget()
+
+    def put(self, key: Hashable, value: Any, only_if_absent: bool = False) -> bool:
+        size = self.sizeof(value) + self.sizeof(key) + ENTRY_OVERHEAD
+        with self._lock:
+            stored = self._store(key, value, size, only_if_absent)
+        if stored:
+            self._enforce_global()
+        return stored
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self.hits += 1
+                self._m_hits.inc()
+                self._touch(key)
+                return value
+            self.misses += 1
+            self._m_misses.inc()
+            flight = self._inflight.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._inflight[key] = _Flight()
+                self.loads += 1
+            else:
+                self.shared_loads += 1
+        if not owner:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        stored = False
+        try:
+            flight.value = loader()
+            size = self.sizeof(flight.value) + self.sizeof(key) + ENTRY_OVERHEAD
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                if flight.error is None and not flight.stale:
+                    stored = self._store(key, flight.value, size, False)
+            flight.event.set()
+        if stored:
+            self._enforce_global()
+        return flight.value
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            flight = self._inflight.pop(key, None)
+            if flight is not None:
+                flight.stale = True
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            self._publish()
+            return True
+
+    def clear(self):
+        with self._lock:
+            for flight in self._inflight.values():
+                flight.stale = True
+            self._inflight.clear()
+            self._entries.clear()
+            self._sizes.clear()
+            self._order.clear()
+            self._freq.clear()
+            self._buckets.clear()
+            self._min_freq = 0
+            self.bytes = 0
+            self._publish()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "policy": self.policy,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "loads": self.loads,
+            "shared_loads": self.shared_loads,
+        }
+
+class CacheManager:
+    def __init__(self, budget: int = DEFAULT_GLOBAL_BUDGET):
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._caches: Dict[str, Cache] = {}
+
+    def create(self, name: str, budget: int, policy: str = LRU,
+               sizeof: Callable[[Any], int] = estimate_size) -> Cache:
+        with self._lock:
+            if name in self._caches:
+                raise ValueError(f"cache {name!r} already exists")
+            cache = self._caches[name] = Cache(name, budget, policy, sizeof, self)
+            return cache
+
+    def caches(self) -> List[Cache]:
+        with self._lock:
+            return list(self._caches.values())
+
+    @property
+    def bytes(self) -> int:
+        return sum(c.bytes for c in self.caches())
+
+    def enforce_budget(self):
+        caches = self.caches()
+        while sum(c.bytes for c in caches) > self.budget:
+            largest = max(caches, key=lambda c: c.bytes)
+            if not largest.evict_one():
+                break
+
+    def invalidate(self, key: Hashable) -> int:
+        return sum(1 for c in self.caches() if c.invalidate(key))
+
+    def clear(self):
+        for c in self.caches():
+            c.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"budget": self.budget, "bytes": self.bytes, "caches": [c.stats() for c in self.caches()]}
+
+CACHES = CacheManager()
@@ -0,0 +1,140 @@
+import argparse
+import queue
+import signal
+import sys
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from utils import log_exc_to_file
+from paths import SONGS_DIR
+from audio_engine import AudioEngine
+from metadata_utils import scan_folder_for_songs
+from player_core import PlaybackCore
+from ipc import IpcServer, default_address
+from play_history import HistoryStore
+from library_roots import RootScanner, load_library_roots, is_primary_root
+from audio_cache import AUDIO_CACHE_ENV, AUDIO_CACHE_FLAG, AudioCache, audio_cache_budget, simulated_latency
+from session import SessionStore, load_session, make_snapshot, restore_snapshot
+import metrics
+
+def _gain_for(path: Path) -> float:
+    from library_index import get_library_index
+    from replay_gain import gain_for_track, REPLAY_GAIN_TRACK
+    return gain_for_track(get_library_index(), path, REPLAY_GAIN_TRACK)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Headless music player controlled over a local socket.")
+    parser.add_argument("--songs-dir", default=str(SONGS_DIR), help="library folder to scan")
+    parser.add_argument("--library-root", action="append", default=[], metavar="DIR",
+                        help="another library folder, scanned on its own thread (repeatable; "
+                             "library_roots.json is read as well)")
+    parser.add_argument("--socket", default=None, help=f"listen address (default: {default_address()})")
+    parser.add_argument("--volume", type=int, default=80)
+    parser.add_argument("--play", action="store_true", help="start playing the library immediately")
+    parser.add_argument("--shuffle", action="store_true")
+    parser.add_argument("--no-session", action="store_true", help="do not restore or save the last session")
+    parser.add_argument(metrics.METRICS_FLAG, action="store_true",
+                        help=f"collect metrics and serve them on 127.0.0.1 (port ${metrics.METRICS_PORT_ENV}, "
+                             f"default {metrics.DEFAULT_PORT})")
+    parser.add_argument(AUDIO_CACHE_FLAG, action="store_true",
+                        help=f"play from local copies of library files (size in MiB via ${AUDIO_CACHE_ENV})")
+    args = parser.parse_args(argv)
+
+    tasks: "queue.Queue[Optional[Callable[[], None]]]" = queue.Queue()
+
+    try:
+        audio = AudioEngine()
+    except Exception as e:
+        log_exc_to_file(e)
+        print(f"Could not start audio: {e}", file=sys.stderr)
+        return 1
+
+    budget = audio_cache_budget([AUDIO_CACHE_FLAG] if args.audio_cache else [])
+    cache = AudioCache(budget, latency=simulated_latency()) if budget else None
+    core = PlaybackCore(audio, tasks.put, gain_for=_gain_for, resolve=cache.resolve if cache else None)
+    if cache is not None:
+        cache.follow(core)
+        cache.start()
+    core.set_library(scan_folder_for_songs(Path(args.songs_dir)))
+    roots = [r for r in load_library_roots() if not is_primary_root(r)] + [Path(r) for r in args.library_root]
+
+    def _root_scanned(root: Path, songs: Optional[List[Path]], tags: dict, gone: List[Path]):
+        if songs is None:
+            print(f"Library folder offline: {root}", flush=True)
+        else:
+            def _apply():
+                core.remove_songs(gone)
+                core.add_songs(songs)
+            tasks.put(_apply)
+
+    for root in roots:
+        RootScanner(root, _root_scanned).start()
+    core.set_volume(args.volume)
+    core.set_shuffle(args.shuffle)
+
+    history = HistoryStore()
+    core.add_listener(history.listener)
+    history.start()
+
+    store = None
+    if not args.no_session:
+        snap = load_session()
+        if snap and not args.play:
+            audio.set_equalizer_bands(snap.get("eq"))
+            restore_snapshot(core, snap)
+        store = SessionStore(lambda: make_snapshot(core, eq=audio.equalizer_bands()), tasks.put, lambda: core.is_playing)
+        core.add_listener(store.touch)
+        store.start()
+
+    try:
+        server = IpcServer(core, tasks.put, args.socket, extra_commands={"quit": lambda: tasks.put(None)})
+    except Exception as e:
+        print(f"Could not listen: {e}", file=sys.stderr)
+        audio.release()
+        return 1
+    server.start()
+
+    def _request_stop(*_):
+        tasks.put(None)
+
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+
+    print(f"Listening on {server.address} ({len(core.all_songs)} track(s))", flush=True)
+    try:
+        port = metrics.start_exporter()
+        if port:
+            print(f"Metrics on http://127.0.0.1:{port}/metrics", flush=True)
+    except Exception as e:
+        log_exc_to_file(e)
+    if args.play:
+        core.next_track()
+
+    while True:
+        try:
+            fn = tasks.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        if fn is None:
+            break
+        try:
+            fn()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    server.close()
+    metrics.stop_exporter()
+    if store is not None:
+        store.flush()
+    history.flush()
+    if cache is not None:
+        cache.stop()
+    try:
+        audio.stop()
+        audio.release()
+    except Exception as e:
+        log_exc_to_file(e)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import hashlib
+import mmap
+import multiprocessing
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+HASH_CHUNK = 8 * 1024 * 1024
+INLINE_HASH_LIMIT = 4
+
+DUPLICATE_SKIP = "skip"
+DUPLICATE_LINK = "link"
+DUPLICATE_ALLOW = "allow"
+
+Span = Tuple[int, int]
+
+def _id3v2_end(buf, offset: int) -> int:
+    while buf[offset:offset + 3] == b"ID3" and offset + 10 <= len(buf):
+        flags = buf[offset + 5]
+        b = buf[offset + 6:offset + 10]
+        size = (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+        offset += 10 + size + (10 if flags & 0x10 else 0)
+    return min(offset, len(buf))
+
+def _trailing_tags_start(buf, end: int) -> int:
+    changed = True
+    while changed and end > 0:
+        changed = False
+        if end >= 128 and buf[end - 128:end - 125] == b"TAG":
+            end -= 128
+            changed = True
+        if end >= 32 and buf[end - 32:end - 24] == b"APETAGEX":
+            size, flags = struct.unpack("<II", buf[end - 20:end - 12])
+            end -= size + (32 if flags & 0x80000000 else 0)
+            end = max(end, 0)
+            changed = True
+        if end >= 15 and buf[end - 9:end] == b"LYRICS200":
+            try:
+                end -= int(buf[end - 15:end - 9]) + 15
+                end = max(end, 0)
+                changed = True
+            except ValueError:
+                pass
+    return end
+
+def _flac_spans(buf, start: int) -> List[Span]:
+    offset = start + 4
+    while offset + 4 <= len(buf):
+        header = buf[offset]
+        length = int.from_bytes(buf[offset + 1:offset + 4], "big")
+        offset += 4 + length
+        if header & 0x80:
+            break
+    return [(min(offset, len(buf)), _trailing_tags_start(buf, len(buf)))]
+
+def _riff_spans(buf) -> List[Span]:
+    offset = 12
+    while offset + 8 <= len(buf):
+        cid = buf[offset:offset + 4]
+        size = struct.unpack("<I", buf[offset + 4:offset + 8])[0]
+        if cid == b"data":
+            return [(offset + 8, min(offset + 8 + size, len(buf)))]
+        offset += 8 + size + (size & 1)
+    return [(0, len(buf))]
+
+def _mp4_spans(buf) -> List[Span]:
+    spans = []
+    offset = 0
+    while offset + 8 <= len(buf):
+        size, kind = struct.unpack(">I4s", buf[offset:offset + 8])
+        header = 8
+        if size == 1 and offset + 16 <= len(buf):
+            size = struct.unpack(">Q", buf[offset + 8:offset + 16])[0]
+            header = 16
+        elif size == 0:
+            size = len(buf) - offset
+        if size < header:
+            break
+        if kind == b"mdat":
+            spans.append((offset + header, min(offset + size, len(buf))))
+        offset += size
+    return spans or [(0, len(buf))]
+
+def _ogg_spans(buf) -> List[Span]:
+    spans = []
+    offset = 0
+    while offset + 27 <= len(buf) and buf[offset:offset + 4] == b"OggS":
+        granule = struct.unpack("<q", buf[offset + 6:offset + 14])[0]
+        nsegs = buf[offset + 26]
+        table = buf[offset + 27:offset + 27 + nsegs]
+        body = offset + 27 + nsegs
+        end = body + sum(table)
+        if granule != 0:
+            if spans and spans[-1][1] == offset:
+                spans[-1] = (spans[-1][0], end)
+            else:
+                spans.append((body, end))
+        offset = end
+    return spans or [(0, len(buf))]
+
+def audio_payload_spans(buf) -> List[Span]:
+    start = _id3v2_end(buf, 0)
+    head = buf[start:start + 12]
+    if head[:4] == b"fLaC":
+        return _flac_spans(buf, start)
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return _riff_spans(buf)
+    if head[:4] == b"OggS":
+        return _ogg_spans(buf)
+    if head[4:8] == b"ftyp":
+        return _mp4_spans(buf)
+    return [(start, _trailing_tags_start(buf, len(buf)))]
+
+def hash_audio_payload(path: Path) -> Optional[str]:
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size == 0:
+                return h.hexdigest()
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    try:
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    except Exception:
+                        pass
+                view = memoryview(mm)
+                try:
+                    for a, b in audio_payload_spans(mm):
+                        for pos in range(a, b, HASH_CHUNK):
+                            h.update(view[pos:min(pos + HASH_CHUNK, b)])
+                finally:
+                    view.release()
+    except Exception:
+        return None
+    return h.hexdigest()
+
+def _hash_one(path_str: str) -> Tuple[str, Optional[str]]:
+    return path_str, hash_audio_payload(Path(path_str))
+
+def hash_files(paths: Iterable[Path], max_workers: Optional[int] = None) -> Dict[str, str]:
+    items = [str(p) for p in paths]
+    out: Dict[str, str] = {}
+    if not items:
+        return out
+    if len(items) <= INLINE_HASH_LIMIT:
+        results = map(_hash_one, items)
+        for path, h in results:
+            if h:
+                out[path] = h
+        return out
+    workers = max_workers or min(len(items), os.cpu_count() or 2)
+    # Spawned, not forked: the caller is usually the multithreaded GUI
+    # process, and forking it with VLC/Qt threads running can deadlock.
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        for path, h in pool.map(_hash_one, items, chunksize=max(1, len(items) // (workers * 4))):
+            if h:
+                out[path] = h
+    return out
+
+def update_library_hashes(index, paths: Iterable[Path], max_workers: Optional[int] = None) -> int:
+    stale = index.stale_hash_paths(paths)
+    if not stale:
+        return 0
+    hashes = hash_files(stale, max_workers=max_workers)
+    index.set_hashes(hashes)
+    return len(hashes)
@@ -0,0 +1,113 @@
+from PyQt5 import QtWidgets, QtCore
+import metrics
+from cache_manager import CACHES
+from app_logging import recent_events
+from utils import log_exc_to_file
+
+class DiagnosticsDialog(QtWidgets.QDialog):
+    COLUMNS = ["Metric", "Labels", "Count / Value", "Mean", "p50", "p95", "Max"]
+    REFRESH_MS = 1000
+
+    def __init__(self, parent: QtWidgets.QWidget = None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostics")
+        self.setModal(False)
+        self.resize(820, 560)
+        self.setWindowFlags(self.windowFlags() & ~QtCore.Qt.WindowContextHelpButtonHint)
+
+        self._build_ui()
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(self.REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+        self.refresh()
+
+    def _build_ui(self):
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(12, 12, 12, 12)
+        layout.setSpacing(8)
+
+        self.status_label = QtWidgets.QLabel()
+        self.status_label.setWordWrap(True)
+        layout.addWidget(self.status_label)
+
+        self.cache_label = QtWidgets.QLabel()
+        self.cache_label.setWordWrap(True)
+        layout.addWidget(self.cache_label)
+
+        self.table = QtWidgets.QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        layout.addWidget(self.table, 3)
+
+        layout.addWidget(QtWidgets.QLabel("Recent log events"))
+        self.events_view = QtWidgets.QPlainTextEdit()
+        self.events_view.setReadOnly(True)
+        self.events_view.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        layout.addWidget(self.events_view, 2)
+
+        btns = QtWidgets.QHBoxLayout()
+        copy_json_btn = QtWidgets.QPushButton("Copy JSON")
+        copy_json_btn.clicked.connect(lambda: QtWidgets.QApplication.clipboard().setText(metrics.REGISTRY.to_json()))
+        copy_prom_btn = QtWidgets.QPushButton("Copy Prometheus")
+        copy_prom_btn.clicked.connect(lambda: QtWidgets.QApplication.clipboard().setText(metrics.REGISTRY.to_prometheus()))
+        close_btn = QtWidgets.QPushButton("Close")
+        close_btn.clicked.connect(self.close)
+        btns.addWidget(copy_json_btn)
+        btns.addWidget(copy_prom_btn)
+        btns.addStretch(1)
+        btns.addWidget(close_btn)
+        layout.addLayout(btns)
+
+    @staticmethod
+    def _ms(seconds: float) -> str:
+        return f"{seconds * 1000:.2f} ms"
+
+    @staticmethod
+    def _cache_summary() -> str:
+        stats = CACHES.stats()
+        parts = [f"Caches {stats['bytes'] / 1048576:.1f} / {stats['budget'] / 1048576:.0f} MiB"]
+        for c in stats["caches"]:
+            parts.append(f"{c['name']} ({c['policy'].upper()}): {c['entries']} entries, "
+                         f"{c['bytes'] / 1048576:.1f} / {c['budget'] / 1048576:.0f} MiB, "
+                         f"{c['hit_rate']:.0%} hits, {c['evictions']} evicted, {c['shared_loads']} shared loads")
+        return "\n".join(parts)
+
+    def refresh(self):
+        try:
+            if not metrics.ENABLED:
+                self.status_label.setText(f"Metrics are disabled. Start with {metrics.METRICS_FLAG} "
+                                          f"or set {metrics.METRICS_ENV}=1 to collect them.")
+            else:
+                port = metrics.exporter_port()
+                where = f"http://127.0.0.1:{port}/metrics (and /metrics.json)" if port else "exporter not running"
+                self.status_label.setText(f"Metrics enabled — {where}")
+            self.cache_label.setText(self._cache_summary())
+            rows = metrics.REGISTRY.snapshot()
+            self.table.setRowCount(len(rows))
+            for r, m in enumerate(rows):
+                labels = ", ".join(f"{k}={v}" for k, v in m["labels"].items())
+                if m["type"] == "histogram":
+                    cells = [m["name"], labels, str(m["count"]),
+                             self._ms(m["mean"]), self._ms(m["p50"]), self._ms(m["p95"]), self._ms(m["max"])]
+                else:
+                    cells = [m["name"], labels, f"{m['value']:g}", "", "", "", ""]
+                for c, text in enumerate(cells):
+                    self.table.setItem(r, c, QtWidgets.QTableWidgetItem(text))
+            events = "\n".join(recent_events(200))
+            if events != self.events_view.toPlainText():
+                self.events_view.setPlainText(events)
+                self.events_view.verticalScrollBar().setValue(self.events_view.verticalScrollBar().maximum())
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
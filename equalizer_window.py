@@ -3,6 +3,7 @@ import json
 import vlc
 from paths import EQ_PRESETS_FILE
 from utils import log_exc_to_file
+from spectrum_widget import SpectrumWidget
 
 class EqualizerWindow(QtWidgets.QDialog):
     BAND_LABELS = ["32 Hz", "64 Hz", "125 Hz", "250 Hz", "500 Hz", "1 kHz", "2 kHz", "4 kHz", "8 kHz", "16 kHz", "20 kHz"]
@@ -12,7 +13,7 @@ class EqualizerWindow(QtWidgets.QDialog):
         super().__init__(parent)
         self.setWindowTitle("🎚Equalizer")
         self.setModal(False)
-        self.resize(780, 420)
+        self.resize(780, 560)
         self.parent_player = parent_player
 
         self.eq = None
@@ -32,6 +33,7 @@ class EqualizerWindow(QtWidgets.QDialog):
         self._load_user_presets()
 
         self._build_ui()
+        self._load_engine_bands()
         self.apply_eq_to_engine()
         self._do_open_animation()
 
@@ -105,6 +107,9 @@ class EqualizerWindow(QtWidgets.QDialog):
 
         layout.addWidget(slider_frame)
 
+        self.spectrum = SpectrumWidget(getattr(self.parent_player, "audio", None), self)
+        layout.addWidget(self.spectrum)
+
         bottom_layout = QtWidgets.QHBoxLayout()
         self.auto_apply_chk = QtWidgets.QCheckBox("Apply automatically on track change")
         self.auto_apply_chk.setChecked(True)
@@ -182,6 +187,17 @@ class EqualizerWindow(QtWidgets.QDialog):
         except Exception as e:
             log_exc_to_file(e)
 
+    def _load_engine_bands(self):
+        mp = getattr(self.parent_player, "audio", None)
+        bands = mp.equalizer_bands() if mp is not None and hasattr(mp, "equalizer_bands") else None
+        if not bands:
+            return
+        for s, db in zip(self.sliders, bands):
+            s.blockSignals(True)
+            s.setValue(int(round(db * 10)))
+            s.blockSignals(False)
+            s.value_label.setText(f"{db:.1f} dB")
+
     def reset_eq(self):
         for i, s in enumerate(self.sliders):
             anim = self.animations[i]
@@ -230,7 +246,9 @@ class EqualizerWindow(QtWidgets.QDialog):
                         pass
             try:
                 mp = getattr(self.parent_player, "audio", None)
-                if mp and getattr(mp, "player", None) is not None:
+                if mp is not None and hasattr(mp, "set_equalizer"):
+                    mp.set_equalizer(eq_inst)
+                elif mp and getattr(mp, "player", None) is not None:
                     try:
                         mp.player.set_equalizer(eq_inst)
                     except Exception:
@@ -243,6 +261,14 @@ class EqualizerWindow(QtWidgets.QDialog):
         except Exception as e:
             log_exc_to_file(e)
 
+    def showEvent(self, event: QtGui.QShowEvent):
+        super().showEvent(event)
+        self.spectrum.start()
+
+    def hideEvent(self, event: QtGui.QHideEvent):
+        self.spectrum.stop()
+        super().hideEvent(event)
+
     def _do_open_animation(self):
         self.setWindowOpacity(0.0)
         anim = QtCore.QPropertyAnimation(self, b"windowOpacity", self)
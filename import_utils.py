@@ -0,0 +1,130 @@
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from metadata_utils import SUPPORTED_EXT, LYRICS_EXTS
+
+FICLONE = 0x40049409
+
+def collect_import_files(paths: Iterable[Path]) -> Tuple[List[Path], List[Path]]:
+    music: List[Path] = []
+    lyrics: List[Path] = []
+    seen: Set[str] = set()
+    for p in paths:
+        try:
+            candidates = sorted(p.rglob("*")) if p.is_dir() else [p]
+        except Exception:
+            continue
+        for f in candidates:
+            key = str(f)
+            if key in seen or not f.is_file():
+                continue
+            seen.add(key)
+            suffix = f.suffix.lower()
+            if suffix in SUPPORTED_EXT:
+                music.append(f)
+            elif suffix in LYRICS_EXTS:
+                lyrics.append(f)
+    return music, lyrics
+
+def pair_lyrics_by_stem(music: List[Path], lyrics: List[Path]) -> List[Tuple[Path, Optional[Path]]]:
+    by_stem: Dict[str, Path] = {}
+    for lf in lyrics:
+        key = lf.stem.lower()
+        prev = by_stem.get(key)
+        if prev is None or LYRICS_EXTS.index(lf.suffix.lower()) < LYRICS_EXTS.index(prev.suffix.lower()):
+            by_stem[key] = lf
+    return [(m, by_stem.get(m.stem.lower())) for m in music]
+
+def unique_destination(folder: Path, stem: str, suffix: str, reserved: Set[str],
+                       companions: Iterable[Tuple[Path, str]] = ()) -> Path:
+    # companions are (folder, suffix) pairs that must be free under the same
+    # stem too, so a track and its lyrics file keep matching names.
+    slots = [(folder, suffix)] + list(companions)
+    name, n = stem, 2
+    while any((d / f"{name}{s}").exists() or str(d / f"{name}{s}").lower() in reserved for d, s in slots):
+        name = f"{stem} ({n})"
+        n += 1
+    for d, s in slots:
+        reserved.add(str(d / f"{name}{s}").lower())
+    return folder / f"{name}{suffix}"
+
+def same_filesystem(src: Path, dest_dir: Path) -> bool:
+    try:
+        return os.stat(src).st_dev == os.stat(dest_dir).st_dev
+    except Exception:
+        return False
+
+def reflink_file(src: Path, dest: Path) -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+    except Exception:
+        return False
+    try:
+        fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    except Exception:
+        return False
+    # Only the file created above is ever removed again.
+    try:
+        with open(src, "rb") as fin, os.fdopen(fd, "wb") as fout:
+            fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+        shutil.copystat(str(src), str(dest))
+        return True
+    except Exception:
+        try:
+            dest.unlink()
+        except Exception:
+            pass
+        return False
+
+def _place_file(src: Path, dest: Path) -> str:
+    # Creates dest and fails if it already exists; never touches an existing file.
+    if same_filesystem(src, dest.parent):
+        if reflink_file(src, dest):
+            return "reflink"
+        try:
+            os.link(src, dest)
+            return "hardlink"
+        except FileExistsError:
+            raise
+        except Exception:
+            pass
+    try:
+        with open(src, "rb") as fin, open(dest, "xb") as fout:
+            shutil.copyfileobj(fin, fout)
+        shutil.copystat(str(src), str(dest))
+    except FileExistsError:
+        raise
+    except BaseException:
+        try:
+            dest.unlink()
+        except Exception:
+            pass
+        raise
+    return "copy"
+
+def zero_copy_file(src: Path, dest: Path, overwrite: bool = False) -> str:
+    if not dest.exists():
+        return _place_file(src, dest)
+    if not overwrite:
+        raise FileExistsError(f"{dest.name} already exists")
+    if os.path.samefile(src, dest):
+        raise shutil.SameFileError(f"{src} and {dest} are the same file")
+    # The new copy is built beside dest and swapped in, so dest is only
+    # replaced once its successor is complete.
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}-{threading.get_ident()}.part")
+    try:
+        method = _place_file(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        try:
+            tmp.unlink()
+        except Exception:
+            pass
+        raise
+    return method
@@ -120,7 +120,8 @@ def main():
         "requests",
         "beautifulsoup4",
         "qtawesome",
-        "qdarkstyle"
+        "qdarkstyle",
+        "numpy"
     ]
 
     install_packages(required_packages)
@@ -0,0 +1,353 @@
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from utils import log_exc_to_file
+
+REQUEST_TIMEOUT = 5.0
+SEND_TIMEOUT = 0.5
+PORT_FILE = Path(tempfile.gettempdir()) / "beatz-ipc.port"
+
+class IpcError(Exception):
+    pass
+
+def default_address() -> str:
+    if hasattr(socket, "AF_UNIX") and sys.platform != "win32":
+        base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+        return os.path.join(base, f"beatz-{os.getuid()}.sock")
+    return "tcp:127.0.0.1:0"
+
+def _is_tcp(address: str) -> bool:
+    return address.startswith("tcp:")
+
+def _tcp_target(address: str):
+    host, _, port = address[4:].rpartition(":")
+    port = int(port or 0)
+    if port == 0:
+        try:
+            port = int(PORT_FILE.read_text().strip())
+        except Exception:
+            raise ConnectionRefusedError("no running instance")
+    return host or "127.0.0.1", port
+
+def connect(address: Optional[str] = None, timeout: float = 2.0) -> socket.socket:
+    address = address or default_address()
+    if _is_tcp(address):
+        return socket.create_connection(_tcp_target(address), timeout=timeout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+def _encode(msg: Dict[str, Any]) -> bytes:
+    return (json.dumps(msg, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+
+class IpcClient:
+    def __init__(self, address: Optional[str] = None, timeout: float = 2.0):
+        self.sock = connect(address, timeout)
+        self._reader = self.sock.makefile("r", encoding="utf-8")
+        self._next_id = 0
+        self._pending_events: List[Dict[str, Any]] = []
+
+    def _read(self) -> Dict[str, Any]:
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("connection closed")
+        return json.loads(line)
+
+    def request(self, cmd: str, **args) -> Any:
+        self._next_id += 1
+        req_id = self._next_id
+        self.sock.sendall(_encode({"id": req_id, "cmd": cmd, **args}))
+        while True:
+            msg = self._read()
+            if "event" in msg:
+                self._pending_events.append(msg)
+                continue
+            if msg.get("id") != req_id:
+                continue
+            if not msg.get("ok"):
+                raise IpcError(msg.get("error") or "request failed")
+            return msg.get("result")
+
+    def events(self) -> Iterator[Dict[str, Any]]:
+        self.request("subscribe")
+        self.sock.settimeout(None)
+        while self._pending_events:
+            yield self._pending_events.pop(0)
+        while True:
+            msg = self._read()
+            if "event" in msg:
+                yield msg
+
+    def close(self):
+        try:
+            self._reader.close()
+            self.sock.close()
+        except Exception:
+            pass
+
+def send_command(cmd: str, address: Optional[str] = None, timeout: float = 2.0, **args) -> Any:
+    client = IpcClient(address, timeout)
+    try:
+        return client.request(cmd, **args)
+    finally:
+        client.close()
+
+class _Connection:
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.subscribed = False
+
+    def send(self, msg: Dict[str, Any]) -> bool:
+        data = _encode(msg)
+        with self.lock:
+            try:
+                self.sock.sendall(data)
+                return True
+            except Exception:
+                return False
+
+class IpcServer(threading.Thread):
+    def __init__(self, core, dispatch: Callable[[Callable[[], None]], None], address: Optional[str] = None,
+                 extra_commands: Optional[Dict[str, Callable[..., Any]]] = None):
+        super().__init__(name="ipc-server", daemon=True)
+        self.core = core
+        self.dispatch = dispatch
+        self.address = address or default_address()
+        self.commands = self._core_commands()
+        self.commands.update(extra_commands or {})
+        self._stop_event = threading.Event()
+        self._clients: List[_Connection] = []
+        self._clients_lock = threading.Lock()
+        self._sock = self._bind()
+        self.core.add_listener(self._on_core_event)
+
+    def _bind(self) -> socket.socket:
+        if _is_tcp(self.address):
+            host, _, port = self.address[4:].rpartition(":")
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind((host or "127.0.0.1", int(port or 0)))
+            PORT_FILE.write_text(str(sock.getsockname()[1]))
+        else:
+            if os.path.exists(self.address):
+                try:
+                    connect(self.address, timeout=0.5).close()
+                    raise RuntimeError(f"another instance is listening on {self.address}")
+                except (ConnectionRefusedError, FileNotFoundError, socket.timeout):
+                    os.unlink(self.address)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.bind(self.address)
+            os.chmod(self.address, 0o600)
+        sock.listen(8)
+        sock.settimeout(0.5)
+        return sock
+
+    def _core_commands(self) -> Dict[str, Callable[..., Any]]:
+        core = self.core
+        return {
+            "ping": lambda: "pong",
+            "state": core.state,
+            "play": self._cmd_play,
+            "pause": core.pause,
+            "toggle": core.toggle,
+            "stop": core.stop,
+            "next": core.next_track,
+            "prev": core.prev_track,
+            "seek": self._cmd_seek,
+            "volume": lambda value: core.set_volume(value),
+            "shuffle": lambda on: core.set_shuffle(on),
+            "repeat": lambda mode: core.set_repeat(mode),
+            "enqueue": self._cmd_enqueue,
+            "dequeue": lambda path: core.dequeue(Path(path)),
+            "queue": lambda: [str(p) for p in core.queue],
+            "open": lambda paths, play=True: core.open_paths(paths, play),
+        }
+
+    def _cmd_play(self, index: Optional[int] = None, path: Optional[str] = None):
+        if path is not None:
+            return self.core.play_path(Path(path))
+        if index is not None:
+            return self.core.play_index(int(index))
+        self.core.play()
+        return True
+
+    def _cmd_seek(self, ms: Optional[int] = None, delta: Optional[int] = None):
+        if delta is not None:
+            self.core.seek_by(int(delta))
+        elif ms is not None:
+            self.core.seek(int(ms))
+
+    def _cmd_enqueue(self, paths: List[str]):
+        for p in paths:
+            self.core.enqueue(Path(p))
+        return len(self.core.queue)
+
+    def _call(self, fn: Callable[..., Any], args: Dict[str, Any]) -> Any:
+        done = threading.Event()
+        box: Dict[str, Any] = {}
+
+        def run():
+            try:
+                box["result"] = fn(**args)
+            except Exception as e:
+                box["error"] = f"{type(e).__name__}: {e}"
+            finally:
+                done.set()
+
+        self.dispatch(run)
+        if not done.wait(REQUEST_TIMEOUT):
+            raise IpcError("timed out waiting for the player")
+        if "error" in box:
+            raise IpcError(box["error"])
+        return box.get("result")
+
+    def _handle(self, conn: _Connection, req: Dict[str, Any]) -> Dict[str, Any]:
+        req_id = req.pop("id", None)
+        cmd = req.pop("cmd", None)
+        try:
+            if cmd == "subscribe":
+                conn.subscribed = True
+                return {"id": req_id, "ok": True, "result": None}
+            fn = self.commands.get(cmd)
+            if fn is None:
+                raise IpcError(f"unknown command: {cmd}")
+            return {"id": req_id, "ok": True, "result": self._call(fn, req)}
+        except Exception as e:
+            return {"id": req_id, "ok": False, "error": str(e)}
+
+    def _serve(self, conn: _Connection):
+        try:
+            reader = conn.sock.makefile("r", encoding="utf-8")
+            for line in reader:
+                if self._stop_event.is_set():
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    req = json.loads(line)
+                    if not isinstance(req, dict):
+                        raise ValueError("request must be an object")
+                except ValueError as e:
+                    conn.send({"id": None, "ok": False, "error": f"bad request: {e}"})
+                    continue
+                if not conn.send(self._handle(conn, req)):
+                    break
+        except Exception:
+            pass
+        finally:
+            with self._clients_lock:
+                if conn in self._clients:
+                    self._clients.remove(conn)
+            try:
+                conn.sock.close()
+            except Exception:
+                pass
+
+    def _on_core_event(self, event: str, data: Dict[str, Any]):
+        with self._clients_lock:
+            targets = [c for c in self._clients if c.subscribed]
+        for conn in targets:
+            if not conn.send({"event": event, **data}):
+                try:
+                    conn.sock.shutdown(socket.SHUT_RDWR)
+                except Exception:
+                    pass
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                sock, _ = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            sock.settimeout(None)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO,
+                                struct.pack("ll", 0, int(SEND_TIMEOUT * 1e6)))
+            except (OSError, AttributeError):
+                pass
+            conn = _Connection(sock)
+            with self._clients_lock:
+                self._clients.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), name="ipc-client", daemon=True).start()
+
+    def close(self):
+        self._stop_event.set()
+        self.core.remove_listener(self._on_core_event)
+        try:
+            self._sock.close()
+        except Exception:
+            pass
+        with self._clients_lock:
+            clients = list(self._clients)
+        for conn in clients:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+        try:
+            if _is_tcp(self.address):
+                PORT_FILE.unlink()
+            elif os.path.exists(self.address):
+                os.unlink(self.address)
+        except Exception as e:
+            log_exc_to_file(e)
+
+def _parse_cli_args(items: List[str]) -> Dict[str, Any]:
+    args: Dict[str, Any] = {}
+    paths = []
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep:
+            paths.append(str(Path(item).resolve()) if Path(item).exists() else item)
+            continue
+        try:
+            args[key] = json.loads(value)
+        except ValueError:
+            args[key] = value
+    if paths:
+        args["paths"] = paths
+    return args
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv:
+        print("usage: python ipc.py <command> [key=value ...] [paths ...]")
+        print("commands: state play pause toggle stop next prev seek volume shuffle repeat enqueue open subscribe")
+        return 2
+    cmd, rest = argv[0], argv[1:]
+    try:
+        if cmd == "subscribe":
+            client = IpcClient()
+            for event in client.events():
+                print(json.dumps(event), flush=True)
+            return 0
+        result = send_command(cmd, **_parse_cli_args(rest))
+    except (ConnectionError, FileNotFoundError, socket.timeout):
+        print("No running player found", file=sys.stderr)
+        return 1
+    except IpcError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+    if result is not None:
+        print(json.dumps(result, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+from PyQt5 import QtWidgets, QtCore
+from pathlib import Path
+import time
+from typing import Optional
+from library_index import get_library_index, month_key
+from library_model import LibraryTreeModel, LibraryTableModel, AlbumGridModel
+from smart_playlists import load_smart_playlists, save_smart_playlist, delete_smart_playlist, playlist_tracks
+from thumbnails import THUMBNAIL_SIZE
+from utils import log_exc_to_file
+
+HISTORY_VIEWS = [
+    ("Top this month", "Plays", lambda index: index.top_tracks(month_key(time.time()))),
+    ("Most played", "Plays", lambda index: index.top_tracks()),
+    ("Recently played", "Last played", lambda index: index.recently_played()),
+    ("Recently added", "Added", lambda index: index.recently_added()),
+    ("Most skipped", "Skips", lambda index: index.most_skipped()),
+]
+
+class LibraryBrowserDialog(QtWidgets.QDialog):
+    playRequested = QtCore.pyqtSignal(list)
+    enqueueRequested = QtCore.pyqtSignal(list)
+    playlistRequested = QtCore.pyqtSignal(list)
+    THUMBNAIL_DEBOUNCE_MS = 60
+
+    def __init__(self, parent: QtWidgets.QWidget = None):
+        super().__init__(parent)
+        self.setWindowTitle("Browse Library")
+        self.setModal(False)
+        self.resize(640, 560)
+        self.setWindowFlags(self.windowFlags() & ~QtCore.Qt.WindowContextHelpButtonHint)
+
+        self.model = LibraryTreeModel(parent=self)
+        self.table_model = LibraryTableModel(parent=self)
+        self.grid_model = AlbumGridModel(parent=self)
+        self._table_loaded = False
+        self._grid_loaded = False
+        self._playlists = {}
+        self._build_ui()
+        self.model.modelReset.connect(self._update_status)
+        self.thumbnail_timer = QtCore.QTimer(self)
+        self.thumbnail_timer.setSingleShot(True)
+        self.thumbnail_timer.setInterval(self.THUMBNAIL_DEBOUNCE_MS)
+        self.thumbnail_timer.timeout.connect(self._request_thumbnails)
+        self.grid.verticalScrollBar().valueChanged.connect(lambda _: self.thumbnail_timer.start())
+        self.grid.verticalScrollBar().rangeChanged.connect(lambda *_: self.thumbnail_timer.start())
+        self.grid_model.modelReset.connect(self.thumbnail_timer.start)
+        self.grid_model.modelReset.connect(self._update_status)
+        self.table_model.loaded.connect(self._update_status)
+        self._update_status()
+
+    def _build_ui(self):
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(12, 12, 12, 12)
+        layout.setSpacing(8)
+
+        self.tabs = QtWidgets.QTabWidget()
+        self.tree = QtWidgets.QTreeView()
+        self.tree.setModel(self.model)
+        self.tree.setUniformRowHeights(True)
+        header = self.tree.header()
+        header.setStretchLastSection(False)
+        header.setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        header.setSectionResizeMode(1, QtWidgets.QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(2, QtWidgets.QHeaderView.ResizeToContents)
+        self.tabs.addTab(self.tree, "Artists")
+
+        self.grid = QtWidgets.QListView()
+        self.grid.setViewMode(QtWidgets.QListView.IconMode)
+        self.grid.setResizeMode(QtWidgets.QListView.Adjust)
+        self.grid.setMovement(QtWidgets.QListView.Static)
+        self.grid.setUniformItemSizes(True)
+        self.grid.setWordWrap(True)
+        self.grid.setIconSize(QtCore.QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.grid.setGridSize(QtCore.QSize(THUMBNAIL_SIZE + 24, THUMBNAIL_SIZE + 44))
+        self.grid.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
+        self.grid.setModel(self.grid_model)
+        self.tabs.addTab(self.grid, "Albums")
+
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.table_model)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.setWordWrap(False)
+        self.table.verticalHeader().setVisible(False)
+        self.table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        self.table.horizontalHeader().setSortIndicatorShown(True)
+        self.tabs.addTab(self.table, "Tracks")
+
+        history_page = QtWidgets.QWidget()
+        history_layout = QtWidgets.QVBoxLayout(history_page)
+        history_layout.setContentsMargins(0, 0, 0, 0)
+        self.history_combo = QtWidgets.QComboBox()
+        self.history_combo.addItems([name for name, _, _ in HISTORY_VIEWS])
+        self.history_combo.currentIndexChanged.connect(self._refresh_history)
+        history_layout.addWidget(self.history_combo)
+        self.history_list = QtWidgets.QTreeWidget()
+        self.history_list.setRootIsDecorated(False)
+        self.history_list.setUniformRowHeights(True)
+        self.history_list.setColumnCount(3)
+        self.history_list.header().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        history_layout.addWidget(self.history_list, 1)
+        self.tabs.addTab(history_page, "History")
+
+        playlists_page = QtWidgets.QWidget()
+        playlists_layout = QtWidgets.QVBoxLayout(playlists_page)
+        playlists_layout.setContentsMargins(0, 0, 0, 0)
+        self.playlist_list = QtWidgets.QListWidget()
+        self.playlist_list.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.playlist_list.customContextMenuRequested.connect(self._on_playlist_context_menu)
+        self.playlist_list.itemActivated.connect(lambda item: self._play_playlist(item))
+        playlists_layout.addWidget(self.playlist_list, 1)
+        btns = QtWidgets.QHBoxLayout()
+        new_btn = QtWidgets.QPushButton("New…")
+        new_btn.clicked.connect(lambda: self._edit_playlist(None))
+        edit_btn = QtWidgets.QPushButton("Edit…")
+        edit_btn.clicked.connect(lambda: self._edit_playlist(self.playlist_list.currentItem()))
+        delete_btn = QtWidgets.QPushButton("Delete")
+        delete_btn.clicked.connect(lambda: self._delete_playlist(self.playlist_list.currentItem()))
+        btns.addWidget(new_btn)
+        btns.addWidget(edit_btn)
+        btns.addWidget(delete_btn)
+        btns.addStretch(1)
+        playlists_layout.addLayout(btns)
+        self.tabs.addTab(playlists_page, "Playlists")
+        self.tabs.currentChanged.connect(self._on_tab_changed)
+
+        for view in (self.tree, self.grid, self.table, self.history_list):
+            view.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+            view.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+            view.customContextMenuRequested.connect(self._on_context_menu)
+            view.activated.connect(self._on_activated)
+        layout.addWidget(self.tabs, 1)
+
+        self.status_label = QtWidgets.QLabel()
+        layout.addWidget(self.status_label)
+
+    def _view(self) -> QtWidgets.QAbstractItemView:
+        widget = self.tabs.currentWidget()
+        if widget in (self.tree, self.grid, self.table):
+            return widget
+        return self.history_list if widget is self.history_list.parentWidget() else self.playlist_list
+
+    def _on_tab_changed(self, _index: int):
+        try:
+            if self._view() is self.grid and not self._grid_loaded:
+                self._grid_loaded = True
+                self.grid_model.reload()
+            elif self._view() is self.table and not self._table_loaded:
+                self._table_loaded = True
+                self.table_model.reload()
+                self.table.horizontalHeader().setSortIndicator(self.table_model.ARTIST, QtCore.Qt.AscendingOrder)
+                self.table.setSortingEnabled(True)
+            elif self._view() is self.history_list:
+                self._refresh_history()
+            elif self._view() is self.playlist_list:
+                self.refresh_playlists()
+            self._update_status()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def reload(self, tracks: bool = False):
+        try:
+            self.model.reload()
+            if self._grid_loaded:
+                self.grid_model.reload()
+            if tracks and self._table_loaded:
+                self.table_model.reload()
+            if self._view() is self.playlist_list:
+                self.refresh_playlists()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def shutdown(self):
+        self.table_model.shutdown()
+        self.grid_model.shutdown()
+
+    def _request_thumbnails(self):
+        # Work out the visible rows from the grid geometry (no per-item
+        # hit testing) and ask for them plus one screen either side.
+        n = self.grid_model.rowCount()
+        if not n or not self.grid.isVisible():
+            return
+        grid = self.grid.gridSize()
+        viewport = self.grid.viewport().rect()
+        top = self.grid.visualRect(self.grid_model.index(0)).top()
+        columns = max(1, viewport.width() // grid.width())
+        first_line = max(0, -top // grid.height())
+        last_line = (viewport.height() - top) // grid.height()
+        first, last = first_line * columns, (last_line + 1) * columns - 1
+        self.grid_model.request_thumbnails(first, last, ahead=last - first + 1)
+
+    def tracks_changed(self, updated: list, removed: list):
+        try:
+            if self._table_loaded:
+                self.table_model.apply_changes(updated, removed)
+                self._update_status()
+            if self._view() is self.history_list and self.isVisible():
+                self._refresh_history()
+            elif self._view() is self.playlist_list:
+                self.refresh_playlists()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _refresh_history(self, *_):
+        try:
+            name, label, query = HISTORY_VIEWS[self.history_combo.currentIndex()]
+            index = get_library_index()
+            t0 = time.perf_counter()
+            rows = query(index)
+            tags = {r[0]: (r[1] or Path(r[0]).stem, r[2]) for r in index.library_rows([p for p, _, _ in rows])}
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            self.history_list.clear()
+            self.history_list.setHeaderLabels(["Title", "Artist", label])
+            items = []
+            for path, plays, value in rows:
+                title, artist = tags.get(path, (Path(path).stem, ""))
+                if label in ("Last played", "Added"):
+                    value = time.strftime("%Y-%m-%d %H:%M", time.localtime(value)) if value else ""
+                elif label == "Plays":
+                    value = plays
+                item = QtWidgets.QTreeWidgetItem([title, artist, str(value)])
+                item.setData(0, QtCore.Qt.UserRole, path)
+                item.setTextAlignment(2, QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                items.append(item)
+            self.history_list.addTopLevelItems(items)
+            self.history_list.resizeColumnToContents(1)
+            self.history_list.resizeColumnToContents(2)
+            self.status_label.setText(f"{name}: {len(items)} track(s) in {elapsed_ms:.1f} ms")
+        except Exception as e:
+            log_exc_to_file(e)
+            self.status_label.setText("Could not load play history")
+
+    def refresh_playlists(self):
+        try:
+            current = self.playlist_list.currentItem()
+            current_id = current.data(QtCore.Qt.UserRole) if current else None
+            self._playlists = {p.id: p for p in load_smart_playlists()}
+            self.playlist_list.clear()
+            for playlist in self._playlists.values():
+                item = QtWidgets.QListWidgetItem(f"{playlist.name}  ({playlist.count})")
+                item.setData(QtCore.Qt.UserRole, playlist.id)
+                self.playlist_list.addItem(item)
+                if playlist.id == current_id:
+                    self.playlist_list.setCurrentItem(item)
+            if self._view() is self.playlist_list:
+                self.status_label.setText(f"{len(self._playlists)} smart playlist(s). "
+                                          "Double-click one to play it; right-click to queue or edit it.")
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _playlist_for(self, item: QtWidgets.QListWidgetItem):
+        return self._playlists.get(item.data(QtCore.Qt.UserRole)) if item is not None else None
+
+    def _playlist_paths(self, item: QtWidgets.QListWidgetItem) -> list:
+        playlist = self._playlist_for(item)
+        return playlist_tracks(playlist) if playlist is not None else []
+
+    def _play_playlist(self, item: QtWidgets.QListWidgetItem):
+        try:
+            paths = self._playlist_paths(item)
+            if paths:
+                self.playlistRequested.emit(paths)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _edit_playlist(self, item: Optional[QtWidgets.QListWidgetItem]):
+        from smart_playlist_dialog import SmartPlaylistDialog
+        try:
+            playlist = self._playlist_for(item)
+            dlg = SmartPlaylistDialog(playlist, parent=self)
+            if dlg.exec_() != QtWidgets.QDialog.Accepted:
+                return
+            save_smart_playlist(dlg.name(), dlg.rules(), dlg.match_all(),
+                                playlist.id if playlist is not None else None)
+            self.refresh_playlists()
+        except Exception as e:
+            log_exc_to_file(e)
+            self.status_label.setText("Could not save the smart playlist")
+
+    def _delete_playlist(self, item: Optional[QtWidgets.QListWidgetItem]):
+        playlist = self._playlist_for(item)
+        if playlist is None:
+            return
+        answer = QtWidgets.QMessageBox.question(self, "Delete Smart Playlist", f"Delete \"{playlist.name}\"?")
+        if answer == QtWidgets.QMessageBox.Yes:
+            try:
+                delete_smart_playlist(playlist.id)
+                self.refresh_playlists()
+            except Exception as e:
+                log_exc_to_file(e)
+
+    def _on_playlist_context_menu(self, pos):
+        try:
+            item = self.playlist_list.itemAt(pos)
+            if item is None:
+                return
+            self.playlist_list.setCurrentItem(item)
+            menu = QtWidgets.QMenu(self)
+            play = menu.addAction("Play")
+            enqueue = menu.addAction("Add to queue")
+            menu.addSeparator()
+            edit = menu.addAction("Edit…")
+            delete = menu.addAction("Delete")
+            chosen = menu.exec_(self.playlist_list.viewport().mapToGlobal(pos))
+            if chosen is play:
+                self._play_playlist(item)
+            elif chosen is enqueue:
+                paths = self._playlist_paths(item)
+                if paths:
+                    self.enqueueRequested.emit(paths)
+            elif chosen is edit:
+                self._edit_playlist(item)
+            elif chosen is delete:
+                self._delete_playlist(item)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _update_status(self):
+        if self._view() in (self.history_list, self.playlist_list):
+            return
+        if self._view() is self.grid:
+            n = self.grid_model.rowCount()
+            self.status_label.setText(f"{n} album(s). Double-click an album to play it; right-click for more."
+                                      if n else "The library is still being indexed…")
+            return
+        if self._view() is self.table:
+            if self.table_model.is_loading() and not self.table_model.rowCount():
+                self.status_label.setText("Loading tracks…")
+                return
+            n = self.table_model.rowCount()
+            text = f"{n} track(s). Click a column to sort; earlier sorts break ties."
+        else:
+            n = self.model.artist_count()
+            text = f"{n} artist(s). Double-click a track to play it; right-click for more."
+        self.status_label.setText(text if n else "The library is still being indexed…")
+
+    def _selected_paths(self) -> list:
+        view = self._view()
+        paths = []
+        for index in view.selectionModel().selectedRows(0):
+            if view is self.history_list:
+                paths.append(Path(index.data(QtCore.Qt.UserRole)))
+            else:
+                paths.extend(Path(p) for p in view.model().track_paths(index))
+        return paths
+
+    def _on_activated(self, index: QtCore.QModelIndex):
+        if self._view() is self.grid:
+            paths = self.grid_model.track_paths(index)
+            if paths:
+                self.playRequested.emit([Path(p) for p in paths])
+            return
+        path = index.sibling(index.row(), 0).data(QtCore.Qt.UserRole)
+        if path:
+            self.playRequested.emit([Path(path)])
+
+    def _on_context_menu(self, pos):
+        try:
+            view = self._view()
+            index = view.indexAt(pos)
+            if not index.isValid():
+                return
+            if not view.selectionModel().isSelected(index):
+                view.setCurrentIndex(index)
+            menu = QtWidgets.QMenu(self)
+            play = menu.addAction("Play")
+            enqueue = menu.addAction("Add to queue")
+            chosen = menu.exec_(view.viewport().mapToGlobal(pos))
+            if chosen is None:
+                return
+            paths = self._selected_paths()
+            if not paths:
+                return
+            if chosen is play:
+                self.playRequested.emit(paths)
+            elif chosen is enqueue:
+                self.enqueueRequested.emit(paths)
+        except Exception as e:
+            log_exc_to_file(e)
@@ -0,0 +1,805 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from paths import LIBRARY_INDEX_FILE
+from sort_keys import collation_key, collation_name
+
+SCHEMA = [
+    [
+        """CREATE TABLE IF NOT EXISTS tracks (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL DEFAULT 0,
+            mtime_ns INTEGER NOT NULL DEFAULT 0,
+            content_hash TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_tracks_hash ON tracks(content_hash)",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS loudness (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL DEFAULT 0,
+            mtime_ns INTEGER NOT NULL DEFAULT 0,
+            lufs REAL,
+            true_peak_db REAL,
+            duration_ms INTEGER NOT NULL DEFAULT 0,
+            album TEXT NOT NULL DEFAULT ''
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_loudness_album ON loudness(album)",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS tags (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL DEFAULT 0,
+            mtime_ns INTEGER NOT NULL DEFAULT 0,
+            title TEXT NOT NULL DEFAULT '',
+            artist TEXT NOT NULL DEFAULT '',
+            duration_ms INTEGER NOT NULL DEFAULT 0
+        )""",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS lyric_files (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            size INTEGER NOT NULL DEFAULT 0,
+            mtime_ns INTEGER NOT NULL DEFAULT 0,
+            stem TEXT NOT NULL DEFAULT '' COLLATE NOCASE
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_lyric_files_stem ON lyric_files(stem)",
+        """CREATE TABLE IF NOT EXISTS lyric_lines (
+            id INTEGER PRIMARY KEY,
+            file_id INTEGER NOT NULL REFERENCES lyric_files(id) ON DELETE CASCADE,
+            time_ms INTEGER NOT NULL DEFAULT 0,
+            text TEXT NOT NULL DEFAULT ''
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_lyric_lines_file ON lyric_lines(file_id)",
+        """CREATE VIRTUAL TABLE IF NOT EXISTS lyric_fts USING fts5(
+            text, content='lyric_lines', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS lyric_lines_ai AFTER INSERT ON lyric_lines BEGIN
+            INSERT INTO lyric_fts(rowid, text) VALUES (new.id, new.text);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS lyric_lines_ad AFTER DELETE ON lyric_lines BEGIN
+            INSERT INTO lyric_fts(lyric_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END""",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS browse_tracks (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL DEFAULT 0,
+            mtime_ns INTEGER NOT NULL DEFAULT 0,
+            artist TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+            album TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+            track_no INTEGER NOT NULL DEFAULT 0,
+            title TEXT NOT NULL DEFAULT '',
+            duration_ms INTEGER NOT NULL DEFAULT 0
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_browse_tracks_album ON browse_tracks(artist, album, track_no, title)",
+        """CREATE TABLE IF NOT EXISTS browse_albums (
+            id INTEGER PRIMARY KEY,
+            artist TEXT NOT NULL COLLATE NOCASE,
+            album TEXT NOT NULL COLLATE NOCASE,
+            track_count INTEGER NOT NULL DEFAULT 0,
+            duration_ms INTEGER NOT NULL DEFAULT 0,
+            UNIQUE(artist, album)
+        )""",
+        """CREATE TABLE IF NOT EXISTS browse_artists (
+            id INTEGER PRIMARY KEY,
+            artist TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            album_count INTEGER NOT NULL DEFAULT 0,
+            track_count INTEGER NOT NULL DEFAULT 0,
+            duration_ms INTEGER NOT NULL DEFAULT 0
+        )""",
+    ],
+    [
+        "ALTER TABLE browse_tracks ADD COLUMN title_key BLOB NOT NULL DEFAULT x''",
+        "ALTER TABLE browse_tracks ADD COLUMN artist_key BLOB NOT NULL DEFAULT x''",
+        "ALTER TABLE browse_tracks ADD COLUMN album_key BLOB NOT NULL DEFAULT x''",
+        "ALTER TABLE browse_tracks ADD COLUMN added_at INTEGER NOT NULL DEFAULT 0",
+        "UPDATE browse_tracks SET added_at = CAST(strftime('%s', 'now') AS INTEGER)",
+        """CREATE TABLE IF NOT EXISTS play_counts (
+            path TEXT PRIMARY KEY,
+            plays INTEGER NOT NULL DEFAULT 0,
+            last_played INTEGER NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS index_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )""",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS play_events (
+            id INTEGER PRIMARY KEY,
+            at INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            kind INTEGER NOT NULL,
+            position_ms INTEGER NOT NULL DEFAULT 0
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_play_events_at ON play_events(at)",
+        "ALTER TABLE play_counts ADD COLUMN skips INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE play_counts ADD COLUMN completions INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE play_counts ADD COLUMN first_played INTEGER NOT NULL DEFAULT 0",
+        "UPDATE play_counts SET first_played = last_played",
+        "CREATE INDEX IF NOT EXISTS idx_play_counts_plays ON play_counts(plays DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_play_counts_last ON play_counts(last_played DESC)",
+        """CREATE TABLE IF NOT EXISTS play_monthly (
+            month INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            plays INTEGER NOT NULL DEFAULT 0,
+            skips INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, path)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_play_monthly_top ON play_monthly(month, plays DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_browse_tracks_added ON browse_tracks(added_at DESC)",
+    ],
+    [
+        "ALTER TABLE browse_tracks ADD COLUMN stem TEXT NOT NULL DEFAULT '' COLLATE NOCASE",
+        "UPDATE browse_tracks SET stem = path_stem(path)",
+        "CREATE INDEX IF NOT EXISTS idx_browse_tracks_stem ON browse_tracks(stem)",
+        "CREATE INDEX IF NOT EXISTS idx_browse_tracks_duration ON browse_tracks(duration_ms)",
+        """CREATE TABLE IF NOT EXISTS smart_playlists (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            rules TEXT NOT NULL DEFAULT '[]',
+            match_all INTEGER NOT NULL DEFAULT 1,
+            evaluated_at INTEGER NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS smart_playlist_tracks (
+            playlist_id INTEGER NOT NULL REFERENCES smart_playlists(id) ON DELETE CASCADE,
+            path TEXT NOT NULL REFERENCES browse_tracks(path) ON DELETE CASCADE,
+            PRIMARY KEY (playlist_id, path)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_smart_playlist_tracks_path ON smart_playlist_tracks(path)",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS track_features (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL DEFAULT 0,
+            mtime_ns INTEGER NOT NULL DEFAULT 0,
+            features BLOB NOT NULL DEFAULT x''
+        )""",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS tag_failures (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL DEFAULT 0,
+            mtime_ns INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            reason TEXT NOT NULL DEFAULT '',
+            failed_at INTEGER NOT NULL DEFAULT 0
+        )""",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS audio_cache (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL DEFAULT 0,
+            mtime_ns INTEGER NOT NULL DEFAULT 0,
+            name TEXT NOT NULL,
+            last_used REAL NOT NULL DEFAULT 0
+        )""",
+    ],
+    [
+        """CREATE TABLE IF NOT EXISTS library_roots (
+            root TEXT PRIMARY KEY,
+            online INTEGER NOT NULL DEFAULT 0,
+            track_count INTEGER NOT NULL DEFAULT 0,
+            scanned_at INTEGER NOT NULL DEFAULT 0,
+            scan_ms INTEGER NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS root_tracks (
+            root TEXT NOT NULL REFERENCES library_roots(root) ON DELETE CASCADE,
+            path TEXT NOT NULL,
+            PRIMARY KEY (root, path)
+        ) WITHOUT ROWID""",
+    ],
+    [
+        # Album gain used to pool every album with the same name; rows are
+        # now keyed by album artist (or folder) and album, so re-analyse them.
+        "ALTER TABLE loudness RENAME COLUMN album TO album_key",
+        "DELETE FROM loudness WHERE album_key != ''",
+    ],
+    [
+        "CREATE INDEX IF NOT EXISTS idx_play_events_path ON play_events(path)",
+    ],
+]
+
+LYRICS_SEARCH_LIMIT = 50
+LYRICS_RANK_WINDOW = 2000
+LYRICS_OPTIMIZE_THRESHOLD = 1000
+LYRICS_PREFIX_MIN_CHARS = 2
+BROWSE_COLLATION_KEY = "browse_collation"
+PLAY, SKIP, COMPLETE = range(3)
+SMART_TRACKS_QUERY = "SELECT b.path FROM browse_tracks b LEFT JOIN play_counts p ON p.path = b.path"
+
+def path_stem(path: str) -> str:
+    return Path(path).stem
+
+def month_key(at: float) -> int:
+    t = time.localtime(at)
+    return t.tm_year * 100 + t.tm_mon
+
+def fts_phrase(text: str, prefix: bool = True) -> Optional[str]:
+    words = text.split()
+    if not words:
+        return None
+    phrase = '"' + " ".join(words).replace('"', '""') + '"'
+    # A one-letter prefix expands to most of the vocabulary; match it as a word.
+    return phrase + "*" if prefix and len(words[-1]) >= LYRICS_PREFIX_MIN_CHARS else phrase
+
+def file_identity(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    except Exception:
+        return None
+
+class LibraryIndex:
+    def __init__(self, db_path: Path = LIBRARY_INDEX_FILE):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.create_function("path_stem", 1, path_stem, deterministic=True)
+        self._migrate()
+
+    def _migrate(self):
+        with self._lock, self._conn:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            for i in range(version, len(SCHEMA)):
+                for stmt in SCHEMA[i]:
+                    self._conn.execute(stmt)
+            # Never lower the version: a newer build may have migrated this file.
+            if version < len(SCHEMA):
+                self._conn.execute(f"PRAGMA user_version = {len(SCHEMA)}")
+
+    def _stale_paths(self, query: str, paths: Iterable[Path], require_value: bool = True) -> List[Path]:
+        out = []
+        with self._lock:
+            rows = dict((r[0], r[1:]) for r in self._conn.execute(query))
+        for p in paths:
+            ident = file_identity(p)
+            if ident is None:
+                continue
+            row = rows.get(str(p))
+            if row is None or (require_value and row[2] is None) or (row[0], row[1]) != ident:
+                out.append(p)
+        return out
+
+    def stale_hash_paths(self, paths: Iterable[Path]) -> List[Path]:
+        return self._stale_paths("SELECT path, size, mtime_ns, content_hash FROM tracks", paths)
+
+    def set_hashes(self, hashes: Dict[str, str]):
+        rows = []
+        for path, h in hashes.items():
+            ident = file_identity(Path(path))
+            if ident is None:
+                continue
+            rows.append((path, ident[0], ident[1], h))
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT INTO tracks(path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(path) DO UPDATE SET size=excluded.size, mtime_ns=excluded.mtime_ns,
+                   content_hash=excluded.content_hash""", rows)
+
+    def get_hash(self, path: Path) -> Optional[str]:
+        ident = file_identity(path)
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, content_hash FROM tracks WHERE path = ?",
+                                     (str(path),)).fetchone()
+        if row is None or ident is None or (row[0], row[1]) != ident:
+            return None
+        return row[2]
+
+    def find_by_hash(self, content_hash: str) -> List[Path]:
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM tracks WHERE content_hash = ? ORDER BY path",
+                                      (content_hash,)).fetchall()
+        return [Path(r[0]) for r in rows if Path(r[0]).exists()]
+
+    def duplicate_groups(self) -> List[List[Path]]:
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT content_hash, path FROM tracks WHERE content_hash IN (
+                       SELECT content_hash FROM tracks WHERE content_hash IS NOT NULL
+                       GROUP BY content_hash HAVING COUNT(*) > 1)
+                   ORDER BY content_hash, path""").fetchall()
+        groups: Dict[str, List[Path]] = {}
+        for h, path in rows:
+            p = Path(path)
+            if p.exists():
+                groups.setdefault(h, []).append(p)
+        return [g for g in groups.values() if len(g) > 1]
+
+    def stale_loudness_paths(self, paths: Iterable[Path]) -> List[Path]:
+        return self._stale_paths("SELECT path, size, mtime_ns, lufs FROM loudness", paths, require_value=False)
+
+    def set_loudness(self, results: Iterable[Tuple[str, Optional[float], Optional[float], int, str]]):
+        rows = []
+        for path, lufs, peak_db, duration_ms, album_key in results:
+            ident = file_identity(Path(path))
+            if ident is None:
+                continue
+            rows.append((path, ident[0], ident[1], lufs, peak_db, int(duration_ms or 0), album_key or ""))
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO loudness(path, size, mtime_ns, lufs, true_peak_db, duration_ms, album_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def get_loudness(self, path: Path) -> Optional[Tuple[Optional[float], Optional[float], str]]:
+        with self._lock:
+            row = self._conn.execute("SELECT lufs, true_peak_db, album_key FROM loudness WHERE path = ?",
+                                     (str(path),)).fetchone()
+        return tuple(row) if row else None
+
+    def get_album_loudness_rows(self, album_key: str) -> List[Tuple[Optional[float], Optional[float], int]]:
+        with self._lock:
+            return self._conn.execute("SELECT lufs, true_peak_db, duration_ms FROM loudness WHERE album_key = ?",
+                                      (album_key,)).fetchall()
+
+    def get_tags(self, paths: Iterable[Path], verify: bool = True) -> Dict[str, Tuple[str, str, int]]:
+        # verify=False trusts the stored tags without a stat() per file, for
+        # libraries where each stat is a network round trip.
+        with self._lock:
+            rows = dict((r[0], r[1:]) for r in self._conn.execute(
+                "SELECT path, size, mtime_ns, title, artist, duration_ms FROM tags"))
+        out = {}
+        for p in paths:
+            row = rows.get(str(p))
+            if row is None:
+                continue
+            if not verify or file_identity(p) == (row[0], row[1]):
+                out[str(p)] = (row[2], row[3], row[4])
+        return out
+
+    def set_tags(self, tags: Dict[str, Tuple[str, str, int]]):
+        rows = []
+        for path, (title, artist, duration_ms) in tags.items():
+            ident = file_identity(Path(path))
+            if ident is None:
+                continue
+            rows.append((path, ident[0], ident[1], title or "", artist or "", int(duration_ms or 0)))
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tags(path, size, mtime_ns, title, artist, duration_ms) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def stale_lyric_files(self, paths: Iterable[Path]) -> List[Path]:
+        return self._stale_paths("SELECT path, size, mtime_ns, id FROM lyric_files", paths)
+
+    def set_lyrics(self, files: Iterable[Tuple[str, List[Tuple[int, str]]]]):
+        with self._lock, self._conn:
+            for path, lines in files:
+                ident = file_identity(Path(path))
+                if ident is None:
+                    continue
+                self._conn.execute("DELETE FROM lyric_files WHERE path = ?", (path,))
+                file_id = self._conn.execute(
+                    "INSERT INTO lyric_files(path, size, mtime_ns, stem) VALUES (?, ?, ?, ?)",
+                    (path, ident[0], ident[1], Path(path).stem)).lastrowid
+                self._conn.executemany("INSERT INTO lyric_lines(file_id, time_ms, text) VALUES (?, ?, ?)",
+                                       [(file_id, int(t), text) for t, text in lines if text.strip()])
+
+    def prune_lyric_files(self, keep: Iterable[Path]) -> int:
+        keep_set = {str(p) for p in keep}
+        with self._lock, self._conn:
+            gone = [(r[0],) for r in self._conn.execute("SELECT path FROM lyric_files") if r[0] not in keep_set]
+            self._conn.executemany("DELETE FROM lyric_files WHERE path = ?", gone)
+        return len(gone)
+
+    def search_lyrics(self, text: str, limit: int = LYRICS_SEARCH_LIMIT) -> List[Tuple[str, str, int, str]]:
+        query = fts_phrase(text)
+        if query is None:
+            return []
+        # The query is a single phrase, so its IDF is the same for every hit and
+        # bm25() would only favour shorter lines -- while first counting every
+        # match in the table. Rank the first LYRICS_RANK_WINDOW hits by line
+        # length instead; rarer phrases than that are ranked exactly.
+        with self._lock:
+            return self._conn.execute(
+                """SELECT f.path, f.stem, l.time_ms, l.text FROM (
+                       SELECT rowid FROM lyric_fts WHERE lyric_fts MATCH ? LIMIT ?
+                   ) m
+                   JOIN lyric_lines l ON l.id = m.rowid
+                   JOIN lyric_files f ON f.id = l.file_id
+                   ORDER BY length(l.text), l.id LIMIT ?""",
+                (query, LYRICS_RANK_WINDOW, limit)).fetchall()
+
+    def optimize_lyrics(self):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO lyric_fts(lyric_fts) VALUES ('optimize')")
+
+    def stale_browse_paths(self, paths: Iterable[Path]) -> List[Path]:
+        return self._stale_paths("SELECT path, size, mtime_ns, artist FROM browse_tracks", paths)
+
+    def set_browse_tracks(self, results: Iterable[Tuple[str, str, str, str, int, int]]):
+        rows = []
+        now = int(time.time())
+        for path, title, artist, album, track_no, duration_ms in results:
+            ident = file_identity(Path(path))
+            if ident is None:
+                continue
+            title, artist, album = title or "", artist or "", album or ""
+            rows.append((path, ident[0], ident[1], artist, album, int(track_no or 0), title, int(duration_ms or 0),
+                         collation_key(title), collation_key(artist), collation_key(album), now, path_stem(path)))
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT INTO browse_tracks(path, size, mtime_ns, artist, album, track_no, title, duration_ms,
+                                             title_key, artist_key, album_key, added_at, stem)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(path) DO UPDATE SET size=excluded.size, mtime_ns=excluded.mtime_ns,
+                   artist=excluded.artist, album=excluded.album, track_no=excluded.track_no, title=excluded.title,
+                   duration_ms=excluded.duration_ms, title_key=excluded.title_key,
+                   artist_key=excluded.artist_key, album_key=excluded.album_key""", rows)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM index_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO index_meta(key, value) VALUES (?, ?)", (key, value))
+
+    def rekey_browse_tracks(self) -> int:
+        # Sort keys depend on the collation locale; recompute them all if it changed.
+        name = collation_name()
+        if self.get_meta(BROWSE_COLLATION_KEY) == name:
+            return 0
+        with self._lock:
+            rows = self._conn.execute("SELECT path, title, artist, album FROM browse_tracks").fetchall()
+        keyed = [(collation_key(t), collation_key(a), collation_key(al), p) for p, t, a, al in rows]
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE browse_tracks SET title_key = ?, artist_key = ?, album_key = ? "
+                                   "WHERE path = ?", keyed)
+            self._conn.execute("INSERT OR REPLACE INTO index_meta(key, value) VALUES (?, ?)",
+                               (BROWSE_COLLATION_KEY, name))
+        return len(keyed)
+
+    def library_rows(self, paths: Optional[Iterable[str]] = None) -> List[tuple]:
+        query = """SELECT b.path, b.title, b.artist, b.album, b.duration_ms, COALESCE(p.plays, 0), b.added_at,
+                          b.title_key, b.artist_key, b.album_key
+                   FROM browse_tracks b LEFT JOIN play_counts p ON p.path = b.path"""
+        with self._lock:
+            if paths is None:
+                return self._conn.execute(query).fetchall()
+            keys = list(paths)
+            out = []
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                out.extend(self._conn.execute(f"{query} WHERE b.path IN ({','.join('?' * len(chunk))})", chunk))
+            return out
+
+    def record_events(self, events: Iterable[Tuple[float, int, str, int]]):
+        # One transaction per batch: the raw events plus the per-track and
+        # per-month aggregates they change, folded in Python first.
+        rows = []
+        totals: Dict[str, List[int]] = {}
+        monthly: Dict[Tuple[int, str], List[int]] = {}
+        for at, kind, path, position_ms in events:
+            at = int(at)
+            rows.append((at, path, kind, int(position_ms or 0)))
+            t = totals.setdefault(path, [0, 0, 0, 0, at])
+            m = monthly.setdefault((month_key(at), path), [0, 0])
+            if kind == PLAY:
+                t[0] += 1
+                t[3] = max(t[3], at)
+                t[4] = min(t[4], at)
+                m[0] += 1
+            elif kind == SKIP:
+                t[1] += 1
+                m[1] += 1
+            elif kind == COMPLETE:
+                t[2] += 1
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO play_events(at, path, kind, position_ms) VALUES (?, ?, ?, ?)", rows)
+            self._conn.executemany(
+                """INSERT INTO play_counts(path, plays, skips, completions, last_played, first_played)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(path) DO UPDATE SET plays = plays + excluded.plays, skips = skips + excluded.skips,
+                   completions = completions + excluded.completions,
+                   last_played = max(last_played, excluded.last_played),
+                   first_played = CASE WHEN excluded.first_played = 0 THEN first_played
+                       WHEN first_played = 0 THEN excluded.first_played
+                       ELSE min(first_played, excluded.first_played) END""",
+                [(p, t[0], t[1], t[2], t[3], t[4] if t[0] else 0) for p, t in totals.items()])
+            self._conn.executemany(
+                """INSERT INTO play_monthly(month, path, plays, skips) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(month, path) DO UPDATE SET plays = plays + excluded.plays, skips = skips + excluded.skips""",
+                [(month, p, m[0], m[1]) for (month, p), m in monthly.items()])
+
+    def top_tracks(self, month: Optional[int] = None, limit: int = 100) -> List[Tuple[str, int, int]]:
+        with self._lock:
+            if month is None:
+                return self._conn.execute(
+                    "SELECT path, plays, skips FROM play_counts WHERE plays > 0 ORDER BY plays DESC LIMIT ?",
+                    (limit,)).fetchall()
+            return self._conn.execute(
+                "SELECT path, plays, skips FROM play_monthly WHERE month = ? AND plays > 0 ORDER BY plays DESC LIMIT ?",
+                (month, limit)).fetchall()
+
+    def most_skipped(self, limit: int = 100) -> List[Tuple[str, int, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT path, plays, skips FROM play_counts WHERE skips > 0 ORDER BY skips DESC, plays LIMIT ?",
+                (limit,)).fetchall()
+
+    def recently_played(self, limit: int = 100) -> List[Tuple[str, int, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT path, plays, last_played FROM play_counts WHERE last_played > 0 "
+                "ORDER BY last_played DESC LIMIT ?", (limit,)).fetchall()
+
+    def recently_added(self, limit: int = 100) -> List[Tuple[str, int, int]]:
+        with self._lock:
+            return self._conn.execute(
+                """SELECT b.path, COALESCE(p.plays, 0), b.added_at FROM browse_tracks b
+                   LEFT JOIN play_counts p ON p.path = b.path ORDER BY b.added_at DESC LIMIT ?""",
+                (limit,)).fetchall()
+
+    def prune_browse_tracks(self, keep: Iterable[Path]) -> List[str]:
+        keep_set = {str(p) for p in keep}
+        with self._lock, self._conn:
+            gone = [r[0] for r in self._conn.execute("SELECT path FROM browse_tracks") if r[0] not in keep_set]
+            self._conn.executemany("DELETE FROM browse_tracks WHERE path = ?", [(p,) for p in gone])
+        return gone
+
+    def rebuild_browse_aggregates(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM browse_albums")
+            self._conn.execute("DELETE FROM browse_artists")
+            self._conn.execute(
+                """INSERT INTO browse_albums(artist, album, track_count, duration_ms)
+                   SELECT artist, album, COUNT(*), SUM(duration_ms) FROM browse_tracks GROUP BY artist, album""")
+            self._conn.execute(
+                """INSERT INTO browse_artists(artist, album_count, track_count, duration_ms)
+                   SELECT artist, COUNT(*), SUM(track_count), SUM(duration_ms) FROM browse_albums GROUP BY artist""")
+
+    def browse_artist_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM browse_artists").fetchone()[0]
+
+    def browse_artists(self, after: Optional[str] = None, limit: int = 500) -> List[Tuple[str, int, int, int]]:
+        with self._lock:
+            if after is None:
+                return self._conn.execute(
+                    "SELECT artist, album_count, track_count, duration_ms FROM browse_artists "
+                    "ORDER BY artist LIMIT ?", (limit,)).fetchall()
+            return self._conn.execute(
+                "SELECT artist, album_count, track_count, duration_ms FROM browse_artists "
+                "WHERE artist > ? ORDER BY artist LIMIT ?", (after, limit)).fetchall()
+
+    def browse_albums(self, artist: str) -> List[Tuple[str, int, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT album, track_count, duration_ms FROM browse_albums WHERE artist = ? ORDER BY album",
+                (artist,)).fetchall()
+
+    def browse_album_covers(self) -> List[Tuple[str, str, int, str]]:
+        # One representative track per album (the first by track number) to read its art from.
+        with self._lock:
+            return self._conn.execute(
+                """SELECT a.artist, a.album, a.track_count,
+                          (SELECT b.path FROM browse_tracks b WHERE b.artist = a.artist AND b.album = a.album
+                           ORDER BY b.track_no, b.title LIMIT 1)
+                   FROM browse_albums a ORDER BY a.artist, a.album""").fetchall()
+
+    def browse_album_tracks(self, artist: str, album: str) -> List[Tuple[str, int, str, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT path, track_no, title, duration_ms FROM browse_tracks WHERE artist = ? AND album = ? "
+                "ORDER BY track_no, title", (artist, album)).fetchall()
+
+    def stale_feature_paths(self, paths: Iterable[Path]) -> List[Path]:
+        return self._stale_paths("SELECT path, size, mtime_ns, features FROM track_features", paths)
+
+    def set_features(self, results: Iterable[Tuple[str, bytes]]):
+        # Tracks that could not be analysed keep an empty blob so they are
+        # only retried once the file changes.
+        rows = []
+        for path, features in results:
+            ident = file_identity(Path(path))
+            if ident is None:
+                continue
+            rows.append((path, ident[0], ident[1], features or b""))
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO track_features(path, size, mtime_ns, features) VALUES (?, ?, ?, ?)", rows)
+
+    def feature_rows(self) -> List[Tuple[str, bytes, str, str]]:
+        with self._lock:
+            return self._conn.execute(
+                """SELECT f.path, f.features, COALESCE(b.artist, ''), COALESCE(b.album, '') FROM track_features f
+                   LEFT JOIN browse_tracks b ON b.path = f.path WHERE length(f.features) > 0
+                   ORDER BY f.path""").fetchall()
+
+    def tag_failures(self) -> Dict[str, Tuple[int, int, int]]:
+        with self._lock:
+            return {r[0]: tuple(r[1:]) for r in self._conn.execute(
+                "SELECT path, size, mtime_ns, failures FROM tag_failures")}
+
+    def record_tag_failure(self, path: Path, reason: str) -> Tuple[int, int, int]:
+        # A changed file starts counting afresh, so a fixed file is parsed again.
+        ident = file_identity(path) or (0, 0)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO tag_failures(path, size, mtime_ns, failures, reason, failed_at)
+                   VALUES (?, ?, ?, 1, ?, ?)
+                   ON CONFLICT(path) DO UPDATE SET
+                   failures = CASE WHEN size = excluded.size AND mtime_ns = excluded.mtime_ns
+                                   THEN failures + 1 ELSE 1 END,
+                   size = excluded.size, mtime_ns = excluded.mtime_ns,
+                   reason = excluded.reason, failed_at = excluded.failed_at""",
+                (str(path), ident[0], ident[1], reason, int(time.time())))
+            return ident + (self._conn.execute(
+                "SELECT failures FROM tag_failures WHERE path = ?", (str(path),)).fetchone()[0],)
+
+    def clear_tag_failure(self, path: Path):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tag_failures WHERE path = ?", (str(path),))
+
+    def audio_cache_entries(self) -> List[Tuple[str, int, int, str, float]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT path, size, mtime_ns, name, last_used FROM audio_cache ORDER BY last_used").fetchall()
+
+    def set_audio_cache_entry(self, path: str, size: int, mtime_ns: int, name: str, last_used: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO audio_cache(path, size, mtime_ns, name, last_used) VALUES (?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, name, last_used))
+
+    def touch_audio_cache(self, used: Dict[str, float]):
+        if not used:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE audio_cache SET last_used = ? WHERE path = ?",
+                                   [(t, p) for p, t in used.items()])
+
+    def remove_audio_cache_entries(self, paths: Iterable[str]):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM audio_cache WHERE path = ?", [(p,) for p in paths])
+
+    def set_root_scan(self, root: str, paths: Iterable[Path], scan_ms: int):
+        # Each library root owns a partition of root_tracks holding its last
+        # successful listing, kept while the root is offline.
+        rows = [(root, str(p)) for p in paths]
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO library_roots(root, online, track_count, scanned_at, scan_ms) VALUES (?, 1, ?, ?, ?)
+                   ON CONFLICT(root) DO UPDATE SET online = 1, track_count = excluded.track_count,
+                   scanned_at = excluded.scanned_at, scan_ms = excluded.scan_ms""",
+                (root, len(rows), int(time.time()), int(scan_ms)))
+            self._conn.execute("DELETE FROM root_tracks WHERE root = ?", (root,))
+            self._conn.executemany("INSERT OR IGNORE INTO root_tracks(root, path) VALUES (?, ?)", rows)
+
+    def set_root_offline(self, root: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO library_roots(root, online) VALUES (?, 0)
+                   ON CONFLICT(root) DO UPDATE SET online = 0""", (root,))
+
+    def root_tracks(self, root: str) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT path FROM root_tracks WHERE root = ?", (root,))]
+
+    def root_status(self) -> Dict[str, Tuple[int, int, int, int]]:
+        with self._lock:
+            return {r[0]: tuple(r[1:]) for r in self._conn.execute(
+                "SELECT root, online, track_count, scanned_at, scan_ms FROM library_roots")}
+
+    def remove_root(self, root: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM library_roots WHERE root = ?", (root,))
+
+    def smart_playlists(self, counts: bool = True) -> List[Tuple[int, str, str, int, int, int]]:
+        count = "(SELECT COUNT(*) FROM smart_playlist_tracks t WHERE t.playlist_id = s.id)" if counts else "0"
+        with self._lock:
+            return self._conn.execute(
+                f"""SELECT s.id, s.name, s.rules, s.match_all, s.evaluated_at, {count}
+                    FROM smart_playlists s ORDER BY s.name COLLATE NOCASE, s.id""").fetchall()
+
+    def save_smart_playlist(self, playlist_id: Optional[int], name: str, rules: str, match_all: bool) -> int:
+        with self._lock, self._conn:
+            if playlist_id is None:
+                return self._conn.execute("INSERT INTO smart_playlists(name, rules, match_all) VALUES (?, ?, ?)",
+                                          (name, rules, int(match_all))).lastrowid
+            self._conn.execute("UPDATE smart_playlists SET name = ?, rules = ?, match_all = ? WHERE id = ?",
+                               (name, rules, int(match_all), playlist_id))
+            return playlist_id
+
+    def delete_smart_playlist(self, playlist_id: int):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM smart_playlists WHERE id = ?", (playlist_id,))
+
+    def rebuild_smart_playlist(self, playlist_id: int, where: str, params: Iterable = ()) -> int:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM smart_playlist_tracks WHERE playlist_id = ?", (playlist_id,))
+            self._conn.execute(
+                f"INSERT INTO smart_playlist_tracks(playlist_id, path) "
+                f"SELECT ?, path FROM ({SMART_TRACKS_QUERY} WHERE {where})", (playlist_id, *params))
+            self._conn.execute("UPDATE smart_playlists SET evaluated_at = ? WHERE id = ?",
+                               (int(time.time()), playlist_id))
+            return self._conn.execute("SELECT COUNT(*) FROM smart_playlist_tracks WHERE playlist_id = ?",
+                                      (playlist_id,)).fetchone()[0]
+
+    def refresh_smart_playlist(self, playlist_id: int, where: str, params: Iterable, paths: Iterable[str]) -> bool:
+        # Re-test only the given tracks against the compiled rules and apply
+        # the difference to the stored membership.
+        params = tuple(params)
+        keys = list(paths)
+        changed = False
+        with self._lock, self._conn:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                match = {r[0] for r in self._conn.execute(
+                    f"{SMART_TRACKS_QUERY} WHERE b.path IN ({marks}) AND ({where})", (*chunk, *params))}
+                member = {r[0] for r in self._conn.execute(
+                    f"SELECT path FROM smart_playlist_tracks WHERE playlist_id = ? AND path IN ({marks})",
+                    (playlist_id, *chunk))}
+                if match == member:
+                    continue
+                changed = True
+                self._conn.executemany("DELETE FROM smart_playlist_tracks WHERE playlist_id = ? AND path = ?",
+                                       [(playlist_id, p) for p in member - match])
+                self._conn.executemany("INSERT INTO smart_playlist_tracks(playlist_id, path) VALUES (?, ?)",
+                                       [(playlist_id, p) for p in match - member])
+        return changed
+
+    def smart_playlist_paths(self, playlist_id: int) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                """SELECT b.path FROM smart_playlist_tracks t JOIN browse_tracks b ON b.path = t.path
+                   WHERE t.playlist_id = ? ORDER BY b.artist_key, b.album_key, b.track_no, b.title_key""",
+                (playlist_id,))]
+
+    def remove_paths(self, paths: Iterable[Path]):
+        keys = [(str(p),) for p in paths]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM tracks WHERE path = ?", keys)
+            self._conn.executemany("DELETE FROM loudness WHERE path = ?", keys)
+            self._conn.executemany("DELETE FROM tags WHERE path = ?", keys)
+            self._conn.executemany("DELETE FROM browse_tracks WHERE path = ?", keys)
+            self._conn.executemany("DELETE FROM play_counts WHERE path = ?", keys)
+            self._conn.executemany("DELETE FROM play_monthly WHERE path = ?", keys)
+            self._conn.executemany("DELETE FROM track_features WHERE path = ?", keys)
+            self._conn.executemany("DELETE FROM tag_failures WHERE path = ?", keys)
+            self._conn.executemany("DELETE FROM play_events WHERE path = ?", keys)
+            # The copy itself belongs to AudioCache: a running cache drops it
+            # when the core reports the removal, otherwise the orphan sweep
+            # at the next start finds it without a row.
+            self._conn.executemany("DELETE FROM audio_cache WHERE path = ?", keys)
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+
+_index: Optional[LibraryIndex] = None
+_index_lock = threading.Lock()
+
+def get_library_index() -> LibraryIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LibraryIndex()
+        return _index
@@ -0,0 +1,462 @@
+from PyQt5 import QtCore, QtGui
+import bisect
+import collections
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from library_index import LibraryIndex, get_library_index
+from metadata_utils import human_time
+from thumbnails import ThumbnailLoader, THUMBNAIL_SIZE, cached_thumbnail, has_thumbnail
+from utils import log_exc_to_file
+
+ROOT, ARTIST, ALBUM, TRACK = range(4)
+UNKNOWN_ARTIST = "Unknown Artist"
+UNKNOWN_ALBUM = "Unknown Album"
+
+def _duration_text(ms: int) -> str:
+    if ms < 3600000:
+        return human_time(ms)
+    s = ms // 1000
+    return f"{s // 3600}:{s // 60 % 60:02d}:{s % 60:02d}"
+
+class _Node:
+    __slots__ = ("kind", "parent", "row", "key", "label", "count", "duration_ms", "path", "children")
+
+    def __init__(self, kind: int, parent: Optional["_Node"], row: int, key: str = "", label: str = "",
+                 count: int = 0, duration_ms: int = 0, path: Optional[str] = None):
+        self.kind = kind
+        self.parent = parent
+        self.row = row
+        self.key = key
+        self.label = label
+        self.count = count
+        self.duration_ms = duration_ms
+        self.path = path
+        self.children: Optional[List["_Node"]] = None if kind in (ARTIST, ALBUM) else []
+
+class LibraryTreeModel(QtCore.QAbstractItemModel):
+    COLUMNS = ["Name", "Tracks", "Duration"]
+    ARTIST_PAGE = 500
+
+    def __init__(self, index: Optional[LibraryIndex] = None, parent: QtCore.QObject = None):
+        super().__init__(parent)
+        self._index = index
+        self._root = _Node(ROOT, None, 0)
+        self._artist_total = 0
+        self.reload()
+
+    @property
+    def index_db(self) -> LibraryIndex:
+        return self._index or get_library_index()
+
+    def reload(self):
+        self.beginResetModel()
+        self._root = _Node(ROOT, None, 0)
+        self._artist_total = self.index_db.browse_artist_count()
+        self.endResetModel()
+
+    def artist_count(self) -> int:
+        return self._artist_total
+
+    def _node(self, index: QtCore.QModelIndex) -> _Node:
+        return index.internalPointer() if index.isValid() else self._root
+
+    def index(self, row: int, column: int, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> QtCore.QModelIndex:
+        node = self._node(parent)
+        if node.children is None or not 0 <= row < len(node.children) or not 0 <= column < len(self.COLUMNS):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index: QtCore.QModelIndex = QtCore.QModelIndex()) -> QtCore.QModelIndex:
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        p = index.internalPointer().parent
+        if p is None or p is self._root:
+            return QtCore.QModelIndex()
+        return self.createIndex(p.row, 0, p)
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        children = self._node(parent).children
+        return len(children) if children else 0
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return len(self.COLUMNS)
+
+    def hasChildren(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> bool:
+        node = self._node(parent)
+        if node.kind == ROOT:
+            return self._artist_total > 0
+        return node.kind != TRACK and node.count > 0
+
+    def canFetchMore(self, parent: QtCore.QModelIndex) -> bool:
+        node = self._node(parent)
+        if node.kind == ROOT:
+            return len(node.children) < self._artist_total
+        return node.kind != TRACK and node.children is None
+
+    def fetchMore(self, parent: QtCore.QModelIndex):
+        node = self._node(parent)
+        if node.kind == ROOT:
+            after = node.children[-1].key if node.children else None
+            rows = [_Node(ARTIST, node, len(node.children) + i, artist, artist or UNKNOWN_ARTIST, tracks, duration)
+                    for i, (artist, _albums, tracks, duration) in
+                    enumerate(self.index_db.browse_artists(after, self.ARTIST_PAGE))]
+            if not rows:
+                self._artist_total = len(node.children)
+                return
+        elif node.kind == ARTIST:
+            rows = [_Node(ALBUM, node, i, album, album or UNKNOWN_ALBUM, tracks, duration)
+                    for i, (album, tracks, duration) in enumerate(self.index_db.browse_albums(node.key))]
+        elif node.kind == ALBUM:
+            rows = [_Node(TRACK, node, i, title, f"{no:02d}. {title}" if no else title, 0, duration, path)
+                    for i, (path, no, title, duration) in
+                    enumerate(self.index_db.browse_album_tracks(node.parent.key, node.key))]
+        else:
+            return
+        if node.children is None:
+            node.children = []
+        if not rows:
+            return
+        first = len(node.children)
+        self.beginInsertRows(parent, first, first + len(rows) - 1)
+        node.children.extend(rows)
+        self.endInsertRows()
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node: _Node = index.internalPointer()
+        col = index.column()
+        if role == QtCore.Qt.DisplayRole:
+            if col == 0:
+                return node.label
+            if col == 1:
+                return "" if node.kind == TRACK else str(node.count)
+            return _duration_text(node.duration_ms)
+        if role == QtCore.Qt.TextAlignmentRole and col > 0:
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        if role == QtCore.Qt.ToolTipRole and node.kind == TRACK:
+            return node.path
+        if role == QtCore.Qt.UserRole:
+            return node.path
+        return None
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation, role: int = QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole and 0 <= section < len(self.COLUMNS):
+            return self.COLUMNS[section]
+        return None
+
+    def track_paths(self, index: QtCore.QModelIndex) -> List[str]:
+        node = self._node(index)
+        if node.kind == TRACK:
+            return [node.path]
+        if node.kind == ALBUM:
+            return [r[0] for r in self.index_db.browse_album_tracks(node.parent.key, node.key)]
+        if node.kind == ARTIST:
+            return [r[0] for album, _, _ in self.index_db.browse_albums(node.key)
+                    for r in self.index_db.browse_album_tracks(node.key, album)]
+        return []
+
+class _Descending:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other) -> bool:
+        return self.value == other.value
+
+class LibraryTableModel(QtCore.QAbstractTableModel):
+    loaded = QtCore.pyqtSignal()
+    COLUMNS = ["Title", "Artist", "Album", "Duration", "Plays", "Added"]
+    TITLE, ARTIST, ALBUM, DURATION, PLAYS, ADDED = range(6)
+    INCREMENTAL_LIMIT = 256
+
+    def __init__(self, index: Optional[LibraryIndex] = None, parent: QtCore.QObject = None):
+        super().__init__(parent)
+        self._index = index
+        self._spec: List[Tuple[int, bool]] = []
+        self._loader = None
+        self._reload_again = False
+        self._clear()
+
+    @property
+    def index_db(self) -> LibraryIndex:
+        return self._index or get_library_index()
+
+    def _clear(self):
+        self._paths: List[str] = []
+        self._text: List[List[str]] = [[], [], []]
+        self._keys: List[list] = [[], [], [], [], [], []]
+        self._row_of: Dict[str, int] = {}
+        self._order: List[int] = []
+
+    def _append(self, row: tuple) -> int:
+        path, title, artist, album, duration, plays, added, title_key, artist_key, album_key = row
+        rid = len(self._paths)
+        self._paths.append(path)
+        for column, text in zip(self._text, (title, artist, album)):
+            column.append(text)
+        for column, key in zip(self._keys, (title_key, artist_key, album_key, duration, plays, added)):
+            column.append(key)
+        self._row_of[path] = rid
+        return rid
+
+    def _set(self, rid: int, row: tuple):
+        _path, title, artist, album, duration, plays, added, title_key, artist_key, album_key = row
+        for column, text in zip(self._text, (title, artist, album)):
+            column[rid] = text
+        for column, key in zip(self._keys, (title_key, artist_key, album_key, duration, plays, added)):
+            column[rid] = key
+
+    def is_loading(self) -> bool:
+        return self._loader is not None
+
+    def reload(self):
+        from workers import LibraryRowsWorker
+        try:
+            if self._loader is not None:
+                self._reload_again = True
+                return
+            spec = list(self._spec)
+            w = LibraryRowsWorker(lambda rows: self._prepare(rows, spec), self._index)
+            th = QtCore.QThread(self)
+            w.moveToThread(th)
+            th.started.connect(w.run)
+            w.finished.connect(self._on_rows_loaded)
+            w.finished.connect(th.quit)
+            w.finished.connect(w.deleteLater)
+            th.finished.connect(th.deleteLater)
+            self._loader = w
+            th.start(QtCore.QThread.LowPriority)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    @QtCore.pyqtSlot(object)
+    def _on_rows_loaded(self, prepared):
+        self._loader = None
+        if self._reload_again:
+            self._reload_again = False
+            self.reload()
+            return
+        if prepared is None:
+            return
+        self.beginResetModel()
+        self._paths, self._text, self._keys, self._row_of, self._order, spec = prepared
+        if spec != self._spec:
+            # The user sorted while the rows were loading; redo it from load order.
+            self._order = list(range(len(self._paths)))
+            for column, descending in reversed(self._spec):
+                self._order.sort(key=self._keys[column].__getitem__, reverse=descending)
+        self.endResetModel()
+        self.loaded.emit()
+
+    def shutdown(self):
+        # Loader threads outlive _on_rows_loaded until their event loop quits.
+        for th in self.findChildren(QtCore.QThread):
+            th.quit()
+            th.wait(3000)
+
+    @staticmethod
+    def _prepare(rows: list, spec: List[Tuple[int, bool]]) -> tuple:
+        # Runs on the loader thread: split rows into columns and sort them there.
+        columns = [list(c) for c in zip(*rows)] if rows else [[] for _ in range(10)]
+        paths = columns[0]
+        keys = columns[7:10] + columns[4:7]
+        order = list(range(len(paths)))
+        # Re-apply the sort history oldest first; each pass is stable.
+        for column, descending in reversed(spec):
+            order.sort(key=keys[column].__getitem__, reverse=descending)
+        return paths, columns[1:4], keys, {p: rid for rid, p in enumerate(paths)}, order, spec
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._order)
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        rid = self._order[index.row()]
+        col = index.column()
+        if role == QtCore.Qt.DisplayRole:
+            if col <= self.ALBUM:
+                return self._text[col][rid]
+            value = self._keys[col][rid]
+            if col == self.DURATION:
+                return human_time(value)
+            if col == self.PLAYS:
+                return str(value)
+            return time.strftime("%Y-%m-%d", time.localtime(value)) if value else ""
+        if role == QtCore.Qt.TextAlignmentRole and col in (self.DURATION, self.PLAYS):
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        if role == QtCore.Qt.ToolTipRole or role == QtCore.Qt.UserRole:
+            return self._paths[rid]
+        return None
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation, role: int = QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole and 0 <= section < len(self.COLUMNS):
+            return self.COLUMNS[section]
+        return None
+
+    def sort(self, column: int, order: QtCore.Qt.SortOrder = QtCore.Qt.AscendingOrder):
+        if not 0 <= column < len(self.COLUMNS):
+            return
+        descending = order == QtCore.Qt.DescendingOrder
+        self._spec = [(column, descending)] + [s for s in self._spec if s[0] != column]
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        rids = [self._order[i.row()] for i in persistent]
+        # One stable pass over cached keys: ties keep the previous order, so
+        # earlier sorts act as secondary keys.
+        self._order.sort(key=self._keys[column].__getitem__, reverse=descending)
+        if persistent:
+            position = {rid: pos for pos, rid in enumerate(self._order)}
+            self.changePersistentIndexList(persistent, [self.index(position[rid], i.column())
+                                                        for rid, i in zip(rids, persistent)])
+        self.layoutChanged.emit()
+
+    def _sort_key(self, rid: int) -> tuple:
+        keys = self._keys
+        return tuple(_Descending(keys[c][rid]) if desc else keys[c][rid] for c, desc in self._spec) + (rid,)
+
+    def _insert_sorted(self, rid: int):
+        pos = bisect.bisect_left(self._order, self._sort_key(rid), key=self._sort_key) if self._spec \
+            else len(self._order)
+        self.beginInsertRows(QtCore.QModelIndex(), pos, pos)
+        self._order.insert(pos, rid)
+        self.endInsertRows()
+
+    def _remove(self, rid: int):
+        pos = self._order.index(rid)
+        self.beginRemoveRows(QtCore.QModelIndex(), pos, pos)
+        del self._order[pos]
+        self.endRemoveRows()
+
+    def apply_changes(self, updated: Iterable[str], removed: Iterable[str]):
+        updated, removed = list(updated), list(removed)
+        if self._loader is not None:
+            self._reload_again = True
+            return
+        if len(updated) + len(removed) > self.INCREMENTAL_LIMIT:
+            self.reload()
+            return
+        for path in removed:
+            rid = self._row_of.pop(path, None)
+            if rid is not None:
+                self._remove(rid)
+        for row in self.index_db.library_rows(updated):
+            rid = self._row_of.get(row[0])
+            if rid is None:
+                rid = self._append(row)
+            else:
+                self._remove(rid)
+                self._set(rid, row)
+            self._insert_sorted(rid)
+
+    def track_paths(self, index: QtCore.QModelIndex) -> List[str]:
+        return [self._paths[self._order[index.row()]]] if index.isValid() else []
+
+class AlbumGridModel(QtCore.QAbstractListModel):
+    PIXMAP_LIMIT = 512
+
+    def __init__(self, index: Optional[LibraryIndex] = None, parent: QtCore.QObject = None):
+        super().__init__(parent)
+        self._index = index
+        self._albums: List[Tuple[str, str, int, Optional[str]]] = []
+        self._row_of: Dict[str, int] = {}
+        # QImages are shared through the thumbnail cache; only the few hundred
+        # tiles painted recently keep a GUI-side QPixmap.
+        self._pixmaps: "collections.OrderedDict[str, QtGui.QPixmap]" = collections.OrderedDict()
+        self._placeholder: Optional[QtGui.QPixmap] = None
+        self.loader = ThumbnailLoader(parent=self)
+        self.loader.ready.connect(self._on_thumbnail)
+
+    @property
+    def index_db(self) -> LibraryIndex:
+        return self._index or get_library_index()
+
+    def reload(self):
+        self.loader.cancel_all()
+        self.beginResetModel()
+        self._albums = self.index_db.browse_album_covers()
+        self._row_of = {path: i for i, (_, _, _, path) in enumerate(self._albums) if path}
+        self._pixmaps.clear()
+        self.endResetModel()
+
+    def shutdown(self):
+        self.loader.shutdown()
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._albums)
+
+    def _placeholder_pixmap(self) -> QtGui.QPixmap:
+        if self._placeholder is None:
+            pix = QtGui.QPixmap(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+            pix.fill(QtGui.QColor(48, 48, 48))
+            painter = QtGui.QPainter(pix)
+            painter.setPen(QtGui.QColor(110, 110, 110))
+            font = painter.font()
+            font.setPixelSize(THUMBNAIL_SIZE // 3)
+            painter.setFont(font)
+            painter.drawText(pix.rect(), QtCore.Qt.AlignCenter, "\u266a")
+            painter.end()
+            self._placeholder = pix
+        return self._placeholder
+
+    def _pixmap(self, path: Optional[str]) -> QtGui.QPixmap:
+        pix = self._pixmaps.get(path)
+        if pix is not None:
+            self._pixmaps.move_to_end(path)
+            return pix
+        image = cached_thumbnail(path) if path else None
+        if image is None or image.isNull():
+            return self._placeholder_pixmap()
+        pix = self._pixmaps[path] = QtGui.QPixmap.fromImage(image)
+        if len(self._pixmaps) > self.PIXMAP_LIMIT:
+            self._pixmaps.popitem(last=False)
+        return pix
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        artist, album, count, path = self._albums[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return f"{album or UNKNOWN_ALBUM}\n{artist or UNKNOWN_ARTIST}"
+        if role == QtCore.Qt.DecorationRole:
+            return self._pixmap(path)
+        if role == QtCore.Qt.ToolTipRole:
+            return f"{album or UNKNOWN_ALBUM}\n{artist or UNKNOWN_ARTIST}\n{count} track(s)"
+        if role == QtCore.Qt.UserRole:
+            return path
+        return None
+
+    def request_thumbnails(self, first: int, last: int, ahead: int = 0):
+        # Visible tiles first, then `ahead` tiles past each edge (downwards
+        # first); anything not in this list is cancelled by the loader.
+        n = len(self._albums)
+        if not n:
+            return
+        first, last = max(0, first), min(n - 1, last)
+        rows = list(range(first, last + 1))
+        rows += range(last + 1, min(n, last + 1 + ahead))
+        rows += range(first - 1, max(-1, first - 1 - ahead), -1)
+        self.loader.request(path for path in (self._albums[r][3] for r in rows)
+                            if path and not has_thumbnail(path))
+
+    def _on_thumbnail(self, path: str, _image):
+        row = self._row_of.get(path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
+    def track_paths(self, index: QtCore.QModelIndex) -> List[str]:
+        if not index.isValid():
+            return []
+        artist, album, _, _ = self._albums[index.row()]
+        return [r[0] for r in self.index_db.browse_album_tracks(artist, album)]
@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from library_index import get_library_index
+from metadata_utils import scan_folder_for_songs
+from paths import LIBRARY_ROOTS_FILE, SONGS_DIR
+from utils import log_exc_to_file
+
+ROOTS_ENV = "BEATZ_LIBRARY_ROOTS"
+ROOT_RETRY_MS = 60000
+ONLINE, OFFLINE, SCANNING = "online", "offline", "scanning"
+
+Tags = Dict[str, Tuple[str, str, int]]
+
+def _root_key(path) -> str:
+    # Normalised without touching the filesystem, which may be a dead mount.
+    return os.path.normcase(os.path.abspath(os.path.expanduser(str(path))))
+
+def load_library_roots() -> List[Path]:
+    # songs/ always comes first (imports are copied there), then the roots
+    # saved in library_roots.json, then any from $BEATZ_LIBRARY_ROOTS.
+    roots = [str(SONGS_DIR)]
+    try:
+        if LIBRARY_ROOTS_FILE.exists():
+            roots.extend(str(r) for r in json.loads(LIBRARY_ROOTS_FILE.read_text(encoding="utf-8")))
+    except Exception as e:
+        log_exc_to_file(e)
+    roots.extend(r for r in os.environ.get(ROOTS_ENV, "").split(os.pathsep) if r.strip())
+    out, seen = [], set()
+    for r in roots:
+        key = _root_key(r)
+        if key not in seen:
+            seen.add(key)
+            out.append(Path(os.path.abspath(os.path.expanduser(r))))
+    return out
+
+def save_library_roots(roots: List[Path]):
+    extra = [str(r) for r in roots if _root_key(r) != _root_key(SONGS_DIR)]
+    tmp = LIBRARY_ROOTS_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(extra, indent=2), encoding="utf-8")
+    os.replace(tmp, LIBRARY_ROOTS_FILE)
+
+def is_primary_root(root: Path) -> bool:
+    return _root_key(root) == _root_key(SONGS_DIR)
+
+def under_root(path: Path, root: Path) -> bool:
+    key, prefix = _root_key(path), _root_key(root)
+    return key == prefix or key.startswith(prefix.rstrip(os.sep) + os.sep)
+
+class RootScanner(threading.Thread):
+    """Lists one library root on its own thread.
+
+    A missing or unreachable root reports songs=None and keeps its last
+    listing in the index. An online root also reports the tracks of its
+    last listing that this one no longer has. A daemon thread is used because a dead network
+    mount can block a directory walk indefinitely, and that must neither
+    delay the other roots nor hold up exit.
+    """
+
+    def __init__(self, root: Path, on_done: Callable[[Path, Optional[List[Path]], Tags, List[Path]], None],
+                 verify_tags: bool = True):
+        super().__init__(name=f"root-scan {root.name}", daemon=True)
+        self.root = root
+        self.on_done = on_done
+        self.verify_tags = verify_tags
+
+    def run(self):
+        songs: Optional[List[Path]] = None
+        tags: Tags = {}
+        gone: List[Path] = []
+        t0 = time.perf_counter()
+        try:
+            if self.root.is_dir():
+                songs = scan_folder_for_songs(self.root)
+        except OSError:
+            songs = None
+        except Exception as e:
+            log_exc_to_file(e)
+        try:
+            index = get_library_index()
+            if songs is None:
+                index.set_root_offline(str(self.root))
+            else:
+                listed = {str(p) for p in songs}
+                gone = [Path(p) for p in index.root_tracks(str(self.root)) if p not in listed]
+                index.set_root_scan(str(self.root), songs, int((time.perf_counter() - t0) * 1000))
+                tags = index.get_tags(songs, verify=self.verify_tags)
+        except Exception as e:
+            log_exc_to_file(e)
+        self.on_done(self.root, songs, tags, gone)
@@ -0,0 +1,88 @@
+from PyQt5 import QtWidgets, QtCore
+from pathlib import Path
+from typing import Dict, List, Tuple
+from library_roots import ONLINE, OFFLINE, SCANNING, is_primary_root
+
+STATE_LABELS = {ONLINE: "online", OFFLINE: "offline — retried every minute", SCANNING: "scanning…"}
+
+class LibraryRootsDialog(QtWidgets.QDialog):
+    rootsChanged = QtCore.pyqtSignal(list)
+
+    def __init__(self, roots: List[Path], parent: QtWidgets.QWidget = None):
+        super().__init__(parent)
+        self.setWindowTitle("Library Folders")
+        self.setModal(False)
+        self.resize(620, 320)
+        self.setWindowFlags(self.windowFlags() & ~QtCore.Qt.WindowContextHelpButtonHint)
+        self.roots = list(roots)
+        self._states: Dict[str, str] = {}
+        self._details: Dict[str, Tuple[int, int, int, int]] = {}
+        self._build_ui()
+        self._populate()
+
+    def _build_ui(self):
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(12, 12, 12, 12)
+        layout.setSpacing(8)
+        hint = QtWidgets.QLabel("Every folder is scanned on its own thread; an offline folder does not hold up the others.")
+        hint.setWordWrap(True)
+        layout.addWidget(hint)
+        self.list = QtWidgets.QListWidget()
+        self.list.currentRowChanged.connect(self._update_buttons)
+        layout.addWidget(self.list, 1)
+
+        btns = QtWidgets.QHBoxLayout()
+        add_btn = QtWidgets.QPushButton("Add folder…")
+        add_btn.clicked.connect(self._on_add)
+        self.remove_btn = QtWidgets.QPushButton("Remove")
+        self.remove_btn.clicked.connect(self._on_remove)
+        close_btn = QtWidgets.QPushButton("Close")
+        close_btn.clicked.connect(self.close)
+        btns.addWidget(add_btn)
+        btns.addWidget(self.remove_btn)
+        btns.addStretch(1)
+        btns.addWidget(close_btn)
+        layout.addLayout(btns)
+
+    def _label(self, root: Path) -> str:
+        state = self._states.get(str(root), ONLINE if is_primary_root(root) else SCANNING)
+        text = f"{root}  —  {STATE_LABELS.get(state, state)}"
+        detail = self._details.get(str(root))
+        if detail is not None and state == ONLINE and detail[1]:
+            text += f", {detail[1]} track(s), listed in {detail[3]} ms"
+        if is_primary_root(root):
+            text += "  (imports go here)"
+        return text
+
+    def _populate(self):
+        row = self.list.currentRow()
+        self.list.clear()
+        for root in self.roots:
+            self.list.addItem(self._label(root))
+        self.list.setCurrentRow(min(max(row, 0), self.list.count() - 1))
+        self._update_buttons()
+
+    def _update_buttons(self, *_):
+        row = self.list.currentRow()
+        self.remove_btn.setEnabled(0 <= row < len(self.roots) and not is_primary_root(self.roots[row]))
+
+    def update_status(self, states: Dict[str, str], details: Dict[str, Tuple[int, int, int, int]]):
+        self._states = dict(states)
+        self._details = dict(details)
+        self._populate()
+
+    def _on_add(self):
+        folder = QtWidgets.QFileDialog.getExistingDirectory(self, "Add library folder", str(Path.home()))
+        if not folder or any(Path(folder) == r for r in self.roots):
+            return
+        self.roots.append(Path(folder))
+        self._populate()
+        self.rootsChanged.emit(list(self.roots))
+
+    def _on_remove(self):
+        row = self.list.currentRow()
+        if not (0 <= row < len(self.roots)) or is_primary_root(self.roots[row]):
+            return
+        del self.roots[row]
+        self._populate()
+        self.rootsChanged.emit(list(self.roots))
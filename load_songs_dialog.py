@@ -1,20 +1,29 @@
 from PyQt5 import QtWidgets, QtCore, QtGui
 from pathlib import Path
-import shutil
+import os
 from paths import SONGS_DIR, LYRICS_DIR
 from utils import log_exc_to_file
-from typing import Optional
+from import_utils import collect_import_files, pair_lyrics_by_stem, unique_destination
+from metadata_utils import LYRICS_EXTS
+from workers import ImportWorker, ImportJob
+from dedup import DUPLICATE_SKIP, DUPLICATE_LINK, DUPLICATE_ALLOW
+from typing import List, Optional, Set
 
 class LoadSongsDialog(QtWidgets.QDialog):
     def __init__(self, parent: QtWidgets.QWidget = None):
         super().__init__(parent)
         self.setWindowTitle("Load Songs — Add new track")
         self.setModal(True)
-        self.resize(640, 360)
+        self.resize(640, 520)
         self.setWindowFlags(self.windowFlags() & ~QtCore.Qt.WindowContextHelpButtonHint)
 
         self.music_path: Optional[Path] = None
         self.lyrics_path: Optional[Path] = None
+        self.bulk_paths: List[Path] = []
+        self.saved_batch: List[Path] = []
+
+        self._import_thread: Optional[QtCore.QThread] = None
+        self._import_worker: Optional[ImportWorker] = None
 
         self._build_ui()
         self.setAcceptDrops(True)
@@ -81,6 +90,37 @@ class LoadSongsDialog(QtWidgets.QDialog):
         self.name_input = QtWidgets.QLineEdit()
         grid.addWidget(self.name_input, 6, 1)
 
+        grid.addWidget(QtWidgets.QLabel("BULK IMPORT"), 7, 0, alignment=QtCore.Qt.AlignTop)
+        bulk_layout = QtWidgets.QVBoxLayout()
+        self.bulk_list = QtWidgets.QListWidget()
+        self.bulk_list.setToolTip("Drop several files or whole folders. Lyrics are paired with music by file name.")
+        self.bulk_list.setMinimumHeight(90)
+        bulk_layout.addWidget(self.bulk_list)
+        bulk_controls = QtWidgets.QHBoxLayout()
+        self.bulk_files_btn = QtWidgets.QPushButton("Add Files...")
+        self.bulk_folder_btn = QtWidgets.QPushButton("Add Folder...")
+        self.bulk_clear_btn = QtWidgets.QPushButton("Clear")
+        bulk_controls.addWidget(self.bulk_files_btn)
+        bulk_controls.addWidget(self.bulk_folder_btn)
+        bulk_controls.addWidget(self.bulk_clear_btn)
+        bulk_layout.addLayout(bulk_controls)
+        grid.addLayout(bulk_layout, 7, 1)
+
+        grid.addWidget(QtWidgets.QLabel("DUPLICATES"), 8, 0)
+        self.duplicate_combo = QtWidgets.QComboBox()
+        self.duplicate_combo.addItem("Skip audio already in the library", DUPLICATE_SKIP)
+        self.duplicate_combo.addItem("Link to the existing track instead of copying", DUPLICATE_LINK)
+        self.duplicate_combo.addItem("Import anyway", DUPLICATE_ALLOW)
+        self.duplicate_combo.setToolTip("Duplicates are detected by hashing the audio data, ignoring tags.")
+        grid.addWidget(self.duplicate_combo, 8, 1)
+
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setTextVisible(True)
+        self.progress_bar.hide()
+        layout.addWidget(self.progress_bar)
+
         btn_layout = QtWidgets.QHBoxLayout()
         btn_layout.addStretch(1)
         self.save_btn = QtWidgets.QPushButton("Save")
@@ -100,6 +140,9 @@ class LoadSongsDialog(QtWidgets.QDialog):
         self.lyrics_browse_btn.clicked.connect(self._on_lyrics_browse)
         self.music_clear_btn.clicked.connect(self._on_music_clear)
         self.lyrics_clear_btn.clicked.connect(self._on_lyrics_clear)
+        self.bulk_files_btn.clicked.connect(self._on_bulk_files)
+        self.bulk_folder_btn.clicked.connect(self._on_bulk_folder)
+        self.bulk_clear_btn.clicked.connect(self._on_bulk_clear)
         self.save_btn.clicked.connect(self._on_save)
         self.cancel_btn.clicked.connect(self.reject)
 
@@ -114,7 +157,13 @@ class LoadSongsDialog(QtWidgets.QDialog):
         urls = event.mimeData().urls()
         if not urls:
             return
-        first = Path(urls[0].toLocalFile())
+        dropped = [Path(u.toLocalFile()) for u in urls if u.isLocalFile()]
+        if not dropped:
+            return
+        if len(dropped) > 1 or dropped[0].is_dir() or widget is self.bulk_list or widget is self.bulk_list.viewport():
+            self._add_bulk_paths(dropped)
+            return
+        first = dropped[0]
         if widget is self.music_drop or widget is self.music_drop_label or widget is self.music_path_preview:
             self._set_music_path(first)
             return
@@ -138,6 +187,30 @@ class LoadSongsDialog(QtWidgets.QDialog):
         if f:
             self._set_lyrics_path(Path(f))
 
+    def _on_bulk_files(self):
+        files, _ = QtWidgets.QFileDialog.getOpenFileNames(self, "Select music and lyrics files", str(Path.home()),
+                                                          "Music and lyrics (*.mp3 *.wav *.ogg *.flac *.m4a *.aac *.lrc *.srt *.vtt *.txt);;All files (*)")
+        if files:
+            self._add_bulk_paths([Path(f) for f in files])
+
+    def _on_bulk_folder(self):
+        d = QtWidgets.QFileDialog.getExistingDirectory(self, "Select folder to import", str(Path.home()))
+        if d:
+            self._add_bulk_paths([Path(d)])
+
+    def _on_bulk_clear(self):
+        self.bulk_paths = []
+        self.bulk_list.clear()
+
+    def _add_bulk_paths(self, paths: List[Path]):
+        known = {str(p) for p in self.bulk_paths}
+        for p in paths:
+            if str(p) in known or not p.exists():
+                continue
+            known.add(str(p))
+            self.bulk_paths.append(p)
+            self.bulk_list.addItem(f"📁 {p}" if p.is_dir() else p.name)
+
     def _on_music_clear(self):
         self.music_path = None
         self.music_path_preview.setText("")
@@ -174,6 +247,9 @@ class LoadSongsDialog(QtWidgets.QDialog):
         self.lyrics_drop_label.setText(p.name)
 
     def _on_save(self):
+        if self.bulk_paths:
+            self._save_bulk()
+            return
         if not self.music_path or not self.music_path.exists():
             QtWidgets.QMessageBox.warning(self, "Select music", "Please choose a music file first.")
             return
@@ -198,17 +274,97 @@ class LoadSongsDialog(QtWidgets.QDialog):
             if resp != QtWidgets.QMessageBox.Yes:
                 return
 
+        self.saved_music = music_dest
+        self.saved_lyrics = lyrics_dest
+        self._start_import([(self.music_path, music_dest, self.lyrics_path, lyrics_dest)], overwrite=True)
+
+    def _save_bulk(self):
+        music, lyrics = collect_import_files(self.bulk_paths)
+        if not music:
+            QtWidgets.QMessageBox.warning(self, "Nothing to import", "No supported audio files were found.")
+            return
+        reserved: Set[str] = set()
+        jobs: List[ImportJob] = []
+        for m, lf in pair_lyrics_by_stem(music, lyrics):
+            companions = [(LYRICS_DIR, ext) for ext in LYRICS_EXTS] if lf else []
+            music_dest = unique_destination(SONGS_DIR, m.stem, m.suffix, reserved, companions)
+            lyrics_dest = LYRICS_DIR / f"{music_dest.stem}{lf.suffix}" if lf else None
+            jobs.append((m, music_dest, lf, lyrics_dest))
+        self.saved_music = None
+        self.saved_lyrics = None
+        self._start_import(jobs, overwrite=False)
+
+    def _start_import(self, jobs: List[ImportJob], overwrite: bool):
         try:
             SONGS_DIR.mkdir(exist_ok=True)
             LYRICS_DIR.mkdir(exist_ok=True)
-            shutil.copy2(str(self.music_path), str(music_dest))
-            if self.lyrics_path:
-                shutil.copy2(str(self.lyrics_path), str(lyrics_dest))
         except Exception as e:
             log_exc_to_file(e)
-            QtWidgets.QMessageBox.critical(self, "Save error", f"Failed to save files: {e}")
+            QtWidgets.QMessageBox.critical(self, "Save error", f"Failed to create library folders: {e}")
             return
+        self._set_busy(True)
+        self.progress_bar.setRange(0, len(jobs))
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat(f"%v / {len(jobs)}")
+        self.progress_bar.show()
 
-        self.saved_music = music_dest
-        self.saved_lyrics = lyrics_dest
+        worker = ImportWorker(jobs, overwrite=overwrite, max_workers=min(8, (os.cpu_count() or 2) * 2),
+                              duplicate_policy=self.duplicate_combo.currentData() or DUPLICATE_ALLOW)
+        thread = QtCore.QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(self._on_import_progress)
+        worker.finished.connect(self._on_import_finished)
+        worker.finished.connect(thread.quit)
+        worker.finished.connect(worker.deleteLater)
+        self._import_worker = worker
+        self._import_thread = thread
+        thread.start()
+
+    def _set_busy(self, busy: bool):
+        for w in (self.save_btn, self.music_browse_btn, self.lyrics_browse_btn, self.music_clear_btn,
+                  self.lyrics_clear_btn, self.bulk_files_btn, self.bulk_folder_btn, self.bulk_clear_btn, self.name_input,
+                  self.duplicate_combo):
+            w.setEnabled(not busy)
+        self.setAcceptDrops(not busy)
+
+    @QtCore.pyqtSlot(int, int, str)
+    def _on_import_progress(self, done: int, total: int, name: str):
+        self.progress_bar.setValue(done)
+        self.progress_bar.setFormat(f"%v / {total} — {name}")
+
+    @QtCore.pyqtSlot(list, list, list, list)
+    def _on_import_finished(self, imported: list, errors: list, duplicates: list, cancelled: list):
+        self._import_worker = None
+        # Files copied before a cancel stay in the batch; the caller adds the
+        # batch whether or not the dialog is accepted.
+        self.saved_batch = list(dict.fromkeys(self.saved_batch + [Path(p) for p in imported]))
+        if duplicates:
+            shown = "\n".join(duplicates[:12])
+            more = f"\n… and {len(duplicates) - 12} more" if len(duplicates) > 12 else ""
+            QtWidgets.QMessageBox.information(self, "Duplicates skipped",
+                                              f"{len(duplicates)} file(s) are already in the library:\n{shown}{more}")
+        if errors:
+            shown = "\n".join(errors[:12])
+            more = f"\n… and {len(errors) - 12} more" if len(errors) > 12 else ""
+            QtWidgets.QMessageBox.warning(self, "Import errors", f"{len(errors)} file(s) failed:\n{shown}{more}")
+        if cancelled or not self.saved_batch:
+            self._set_busy(False)
+            if cancelled:
+                self.progress_bar.setFormat(f"Cancelled — {len(imported)} imported, {len(cancelled)} not imported")
+            else:
+                self.progress_bar.hide()
+            return
+        if self.saved_music is not None and self.saved_music not in self.saved_batch:
+            self.saved_music = self.saved_batch[0]
         self.accept()
+
+    def reject(self):
+        if self._import_worker is not None:
+            try:
+                self._import_worker.interrupt()
+                self.progress_bar.setFormat("Cancelling…")
+            except Exception:
+                pass
+            return
+        super().reject()
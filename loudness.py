@@ -0,0 +1,117 @@
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+FILTER_FFT_SIZE = 1 << 18
+FILTER_OVERLAP = 1 << 14
+OVERSAMPLE = 4
+OVERSAMPLE_TAPS = 48
+
+LoudnessResult = Tuple[str, Optional[float], Optional[float], int, str]
+
+def _biquad_response(b, a, w: np.ndarray) -> np.ndarray:
+    z1 = np.exp(-1j * w)
+    z2 = z1 * z1
+    return (b[0] + b[1] * z1 + b[2] * z2) / (a[0] + a[1] * z1 + a[2] * z2)
+
+def k_weighting_response(nfft: int, rate: int) -> np.ndarray:
+    w = 2.0 * np.pi * np.fft.rfftfreq(nfft, d=1.0 / rate) / rate
+
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    K = np.tan(np.pi * f0 / rate)
+    vh = 10.0 ** (gain_db / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + K / q + K * K
+    shelf_b = ((vh + vb * K / q + K * K) / a0, 2.0 * (K * K - vh) / a0, (vh - vb * K / q + K * K) / a0)
+    shelf_a = (1.0, 2.0 * (K * K - 1.0) / a0, (1.0 - K / q + K * K) / a0)
+
+    f0, q = 38.13547087602444, 0.5003270373238773
+    K = np.tan(np.pi * f0 / rate)
+    a0 = 1.0 + K / q + K * K
+    hp_b = (1.0, -2.0, 1.0)
+    hp_a = (1.0, 2.0 * (K * K - 1.0) / a0, (1.0 - K / q + K * K) / a0)
+
+    return _biquad_response(shelf_b, shelf_a, w) * _biquad_response(hp_b, hp_a, w)
+
+def k_weight(samples: np.ndarray, rate: int) -> np.ndarray:
+    n, channels = samples.shape
+    nfft = FILTER_FFT_SIZE
+    step = nfft - FILTER_OVERLAP
+    H = k_weighting_response(nfft, rate)[:, None]
+    padded = np.zeros((FILTER_OVERLAP + n + nfft, channels), dtype=np.float32)
+    padded[FILTER_OVERLAP:FILTER_OVERLAP + n] = samples
+    out = np.empty((n, channels), dtype=np.float32)
+    for start in range(0, n, step):
+        seg = padded[start:start + nfft]
+        y = np.fft.irfft(np.fft.rfft(seg, axis=0) * H, n=nfft, axis=0)
+        count = min(step, n - start)
+        out[start:start + count] = y[FILTER_OVERLAP:FILTER_OVERLAP + count]
+    return out
+
+def _channel_weights(channels: int) -> np.ndarray:
+    g = np.ones(channels)
+    if channels >= 5:
+        g[-2:] = 1.41
+    if channels == 6:
+        g[3] = 0.0
+    return g
+
+def integrated_loudness(samples: np.ndarray, rate: int) -> Optional[float]:
+    hop = int(round(rate * 0.1))
+    n, channels = samples.shape
+    hops = n // hop
+    if hops < 4:
+        return None
+    y = k_weight(samples, rate)[:hops * hop]
+    energy = np.square(y, dtype=np.float64).reshape(hops, hop, channels).sum(axis=1)
+    blocks = (energy[:-3] + energy[1:-2] + energy[2:-1] + energy[3:]) / (4 * hop)
+    weighted = blocks @ _channel_weights(channels)
+    with np.errstate(divide="ignore"):
+        block_lufs = -0.691 + 10.0 * np.log10(weighted)
+    gated = block_lufs > ABSOLUTE_GATE_LUFS
+    if not gated.any():
+        return None
+    relative = -0.691 + 10.0 * np.log10(weighted[gated].mean()) + RELATIVE_GATE_LU
+    gated &= block_lufs > relative
+    if not gated.any():
+        return None
+    return float(-0.691 + 10.0 * np.log10(weighted[gated].mean()))
+
+def _oversample_phases() -> np.ndarray:
+    n = np.arange(OVERSAMPLE_TAPS) - (OVERSAMPLE_TAPS - 1) / 2.0
+    h = np.sinc(n / OVERSAMPLE) * np.kaiser(OVERSAMPLE_TAPS, 8.0)
+    phases = h.reshape(-1, OVERSAMPLE).T
+    return phases / phases.sum(axis=1, keepdims=True)
+
+def true_peak_db(samples: np.ndarray) -> Optional[float]:
+    if samples.size == 0:
+        return None
+    peak = float(np.abs(samples).max())
+    for taps in _oversample_phases():
+        for c in range(samples.shape[1]):
+            peak = max(peak, float(np.abs(np.convolve(samples[:, c], taps, mode="same")).max()))
+    if peak <= 0.0:
+        return None
+    return float(20.0 * np.log10(peak))
+
+def lower_priority():
+    try:
+        os.nice(10)
+    except Exception:
+        pass
+
+def analyze_track(path_str: str) -> LoudnessResult:
+    from pcm_utils import decode_pcm
+    from metadata_utils import get_album_key
+    path = Path(path_str)
+    album_key = get_album_key(path)
+    decoded = decode_pcm(path)
+    if decoded is None:
+        return path_str, None, None, 0, album_key
+    samples, rate = decoded
+    duration_ms = int(len(samples) * 1000 / rate) if rate else 0
+    return path_str, integrated_loudness(samples, rate), true_peak_db(samples), duration_ms, album_key
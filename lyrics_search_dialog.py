@@ -0,0 +1,90 @@
+from PyQt5 import QtWidgets, QtCore
+from pathlib import Path
+import time
+from typing import Callable, Optional
+from library_index import get_library_index
+from metadata_utils import human_time
+from utils import log_exc_to_file
+
+class LyricsSearchDialog(QtWidgets.QDialog):
+    songSelected = QtCore.pyqtSignal(object, int)
+    DEBOUNCE_MS = 150
+
+    def __init__(self, resolve_song: Callable[[str], Optional[Path]], parent: QtWidgets.QWidget = None):
+        super().__init__(parent)
+        self.setWindowTitle("Search Lyrics")
+        self.setModal(False)
+        self.resize(620, 440)
+        self.setWindowFlags(self.windowFlags() & ~QtCore.Qt.WindowContextHelpButtonHint)
+        self.resolve_song = resolve_song
+
+        self._build_ui()
+        self.debounce = QtCore.QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(self.DEBOUNCE_MS)
+        self.debounce.timeout.connect(self._run_search)
+        self.query_input.textChanged.connect(lambda _: self.debounce.start())
+        self.query_input.returnPressed.connect(self._activate_first)
+        self.results.itemActivated.connect(self._on_result_activated)
+
+    def _build_ui(self):
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(12, 12, 12, 12)
+        layout.setSpacing(8)
+
+        self.query_input = QtWidgets.QLineEdit()
+        self.query_input.setPlaceholderText("Type a line from a song…")
+        self.query_input.setClearButtonEnabled(True)
+        layout.addWidget(self.query_input)
+
+        self.results = QtWidgets.QListWidget()
+        self.results.setUniformItemSizes(True)
+        layout.addWidget(self.results, 1)
+
+        self.status_label = QtWidgets.QLabel("Double-click a result to play from that line.")
+        layout.addWidget(self.status_label)
+
+    def _run_search(self):
+        try:
+            text = self.query_input.text().strip()
+            self.results.clear()
+            if not text:
+                self.status_label.setText("Double-click a result to play from that line.")
+                return
+            t0 = time.perf_counter()
+            rows = get_library_index().search_lyrics(text)
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            for _lyric_path, stem, time_ms, line in rows:
+                song = self.resolve_song(stem)
+                item = QtWidgets.QListWidgetItem(f"{stem}  [{human_time(time_ms)}]  {line}")
+                if song is None:
+                    item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEnabled)
+                    item.setToolTip("No matching song in the library")
+                else:
+                    item.setData(QtCore.Qt.UserRole, (song, int(time_ms)))
+                self.results.addItem(item)
+            self.status_label.setText(f"{len(rows)} match(es) in {elapsed_ms:.1f} ms")
+        except Exception as e:
+            log_exc_to_file(e)
+            self.status_label.setText("Search failed")
+
+    def _activate_first(self):
+        if self.debounce.isActive():
+            self.debounce.stop()
+            self._run_search()
+        for i in range(self.results.count()):
+            item = self.results.item(i)
+            if item.flags() & QtCore.Qt.ItemIsEnabled:
+                self._on_result_activated(item)
+                return
+
+    def _on_result_activated(self, item: QtWidgets.QListWidgetItem):
+        data = item.data(QtCore.Qt.UserRole)
+        if data:
+            song, time_ms = data
+            self.songSelected.emit(song, time_ms)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.query_input.setFocus()
+        self.query_input.selectAll()
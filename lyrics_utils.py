@@ -1,6 +1,8 @@
 import re
 from typing import List, Tuple
 
+from metrics import timed
+
 def parse_lrc(text: str) -> List[Tuple[int, str]]:
     pattern = re.compile(r'\[(\d+):(\d+(?:\.\d+)?)\]')
     out = []
@@ -84,6 +86,7 @@ def parse_vtt(text: str) -> List[Tuple[int, str]]:
         out.append((start_ms, lyric))
     return sorted(out, key=lambda x: x[0])
 
+@timed("parse_lyrics_seconds", "Time spent parsing a lyrics file")
 def parse_lyrics_by_suffix(text: str, suffix: str):
     suffix = suffix.lower()
     if suffix == '.lrc':
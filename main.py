@@ -1,21 +1,59 @@
 import sys
-from PyQt5 import QtWidgets
-import qdarktheme
-from music_player import MusicPlayer
-from paths import SONGS_DIR, LYRICS_DIR
+import startup
+from pathlib import Path
+from typing import List
+
+def _launch_paths(argv: List[str]) -> List[str]:
+    return [str(Path(a).resolve()) for a in argv if not a.startswith("-") and Path(a).is_file()]
+
+def _forward_to_running_instance(paths: List[str]) -> bool:
+    from ipc import IpcClient, IpcError
+    try:
+        client = IpcClient(timeout=0.5)
+    except (FileNotFoundError, ConnectionRefusedError, ValueError):
+        # No socket (or port file), or nothing listening on it.
+        return False
+    except OSError as e:
+        print(f"The player is already running but did not accept the connection ({e}).")
+        return True
+    # Connected, so an instance exists. It serves requests from its event
+    # loop, which may still be starting up; a request that times out is
+    # already queued there and must not lead to a second player.
+    try:
+        if paths:
+            client.request("open", paths=paths)
+        try:
+            client.request("raise")
+        except IpcError:
+            if not paths:
+                print("The player is already running headless; use `python ipc.py` to control it.")
+    except (OSError, ValueError, IpcError) as e:
+        print(f"The player is already running but busy ({e}); it will pick up the request when it is ready.")
+    finally:
+        client.close()
+    return True
 
 def main():
+    paths = _launch_paths(sys.argv[1:])
+    if _forward_to_running_instance(paths):
+        sys.exit(0)
+
+    from PyQt5 import QtWidgets
+    from music_player import MusicPlayer
+    from paths import SONGS_DIR, LYRICS_DIR
+    startup.mark("imports")
+
     app = QtWidgets.QApplication(sys.argv)
 
     try:
-        app.setStyleSheet(qdarktheme.load_stylesheet("dark"))
+        app.setStyleSheet(startup.load_stylesheet())
     except Exception:
         pass
 
     SONGS_DIR.mkdir(exist_ok=True)
     LYRICS_DIR.mkdir(exist_ok=True)
 
-    window = MusicPlayer()
+    window = MusicPlayer(open_paths=[Path(p) for p in paths])
     window.show()
 
     sys.exit(app.exec_())
@@ -1,13 +1,23 @@
-from mutagen import File as MutagenFile
+import threading
 from pathlib import Path
 from paths import LYRICS_DIR
-from typing import List, Optional, Tuple, Dict
+from typing import Iterable, Iterator, List, Optional, Tuple, Dict
+from metrics import counter, timed
+from cache_manager import CACHES, LRU, LFU
+from track_store import TRACKS
+from tag_sandbox import TAG_SANDBOX, ART
 
 SUPPORTED_EXT = ('.mp3', '.wav', '.ogg', '.flac', '.m4a', '.aac')
 LYRICS_EXTS = ('.lrc', '.srt', '.vtt', '.vit', '.txt')
 
-_metadata_cache: Dict[str, Tuple[str, str, int]] = {}
-_art_cache: Dict[str, Optional[bytes]] = {}
+METADATA_CACHE_BUDGET = 8 << 20
+ART_CACHE_BUDGET = 48 << 20
+
+_metadata_cache = CACHES.create("metadata", METADATA_CACHE_BUDGET, LRU)
+_art_cache = CACHES.create("art", ART_CACHE_BUDGET, LFU)
+_metadata_dirty: Dict[str, Tuple[str, str, int]] = {}
+_dirty_lock = threading.Lock()
+_track_hits = counter("cache_hits_total", "Cache lookups served from memory", cache="tracks")
 
 def human_time(ms: int) -> str:
     if ms is None or ms <= 0:
@@ -35,62 +45,111 @@ def read_text_file(path: Path) -> Optional[str]:
         except Exception:
             return None
 
+@timed("get_metadata_seconds", "Time spent in get_metadata, cache hits included")
 def get_metadata(path: Path) -> Tuple[str, str, int]:
-    key = str(path)
-    if key in _metadata_cache:
-        return _metadata_cache[key]
-    title = path.name
-    artist = ""
-    duration = 0
+    tid = TRACKS.lookup(path)
+    if tid is not None:
+        tags = TRACKS.tags(tid)
+        if tags is not None:
+            _track_hits.inc()
+            return tags
+    tags = _metadata_cache.get_or_load(str(path), lambda: _read_metadata(path))
+    if tid is not None:
+        TRACKS.set_tags(tid, *tags)
+    return tags
+
+def cached_metadata(path: Path) -> Optional[Tuple[str, str, int]]:
+    # Like get_metadata, but never parses the file, for views built on the
+    # GUI thread; load_metadata_many fills in the rest in the background.
+    tid = TRACKS.lookup(path)
+    if tid is not None:
+        tags = TRACKS.tags(tid)
+        if tags is not None:
+            return tags
+    return _metadata_cache.get(str(path))
+
+def load_metadata_many(paths: Iterable[Path], interrupted=lambda: False) -> int:
+    loaded = 0
+    for path, tags in TAG_SANDBOX.parse_many(paths):
+        if interrupted():
+            break
+        result = _metadata_tuple(path, tags)
+        _metadata_cache.put(str(path), result)
+        tid = TRACKS.lookup(path)
+        if tid is not None:
+            TRACKS.set_tags(tid, *result)
+        with _dirty_lock:
+            _metadata_dirty[str(path)] = result
+        loaded += 1
+    return loaded
+
+def _metadata_tuple(path: Path, tags: Optional[dict]) -> Tuple[str, str, int]:
+    tags = tags or {}
+    return tags.get('title', path.name), tags.get('artist', ''), int(tags.get('length', 0) * 1000)
+
+def _read_metadata(path: Path) -> Tuple[str, str, int]:
+    result = _metadata_tuple(path, TAG_SANDBOX.parse(path))
+    with _dirty_lock:
+        _metadata_dirty[str(path)] = result
+    return result
+
+def read_metadata_from(path: Path, copy: Path) -> Tuple[str, str, int]:
+    # Tags of `path`, read from an identical local copy of it.
+    return _metadata_tuple(path, TAG_SANDBOX.parse(copy))
+
+def prime_metadata_cache(entries: Dict[str, Tuple[str, str, int]]):
+    for key, (title, artist, duration) in entries.items():
+        tid = TRACKS.add(key)
+        if not TRACKS.has_tags(tid):
+            TRACKS.set_tags(tid, title, artist, duration)
+
+def take_dirty_metadata() -> Dict[str, Tuple[str, str, int]]:
+    global _metadata_dirty
+    with _dirty_lock:
+        out, _metadata_dirty = _metadata_dirty, {}
+    return out
+
+def get_album_key(path: Path) -> str:
+    # Groups tracks for album gain: albums called "Greatest Hits" by two
+    # artists are different albums. Without an album artist tag the folder
+    # stands in for it, which also keeps compilations together.
+    tags = TAG_SANDBOX.parse(path) or {}
+    album = tags.get('album', '').strip()
+    if not album:
+        return ''
+    owner = tags.get('albumartist', '').strip().casefold() or str(path.parent)
+    return f"{owner}\x1f{album.casefold()}"
+
+def _track_number(value: str) -> int:
     try:
-        m = MutagenFile(str(path), easy=True)
-        if m:
-            title = m.get('title', [title])[0]
-            artist = m.get('artist', [''])[0]
-            info = getattr(m, "info", None)
-            if info:
-                length = getattr(info, "length", None)
-                if length:
-                    duration = int(length * 1000)
-    except Exception:
-        pass
-    _metadata_cache[key] = (title, artist, duration)
-    return title, artist, duration
+        return int(str(value).split("/")[0].strip() or 0)
+    except ValueError:
+        return 0
+
+def _browse_tags(path: Path, tags: Optional[dict]) -> Tuple[str, str, str, int, int]:
+    tags = tags or {}
+    title = tags.get('title', path.stem)
+    artist = tags.get('albumartist', tags.get('artist', ''))
+    album = tags.get('album', '')
+    track_no = _track_number(tags.get('tracknumber', '0'))
+    duration = int(tags.get('length', 0) * 1000)
+    return title, artist.strip(), album.strip(), track_no, duration
+
+def read_browse_tags(path: Path) -> Tuple[str, str, str, int, int]:
+    return _browse_tags(path, TAG_SANDBOX.parse(path))
 
+def read_browse_tags_many(paths: Iterable[Path]) -> Iterator[Tuple[Path, Tuple[str, str, str, int, int]]]:
+    for path, tags in TAG_SANDBOX.parse_many(paths):
+        yield path, _browse_tags(path, tags)
+
+@timed("extract_embedded_art_seconds", "Time spent in extract_embedded_art, cache hits included")
 def extract_embedded_art(path: Path):
-    key = str(path)
-    if key in _art_cache:
-        return _art_cache[key]
-    data = None
-    try:
-        m = MutagenFile(str(path))
-        if not m:
-            data = None
-        else:
-            try:
-                if hasattr(m, "tags") and m.tags is not None:
-                    for v in m.tags.values():
-                        d = getattr(v, "data", None)
-                        if d:
-                            data = d
-                            break
-            except Exception:
-                pass
-            if data is None:
-                try:
-                    pics = getattr(m, "pictures", None)
-                    if pics:
-                        if isinstance(pics, (list, tuple)) and pics:
-                            data = pics[0].data
-                        elif hasattr(pics, "data"):
-                            data = pics.data
-                except Exception:
-                    pass
-    except Exception:
-        data = None
-    _art_cache[key] = data
-    return data
+    return _art_cache.get_or_load(str(path), lambda: _read_embedded_art(path))
+
+def _read_embedded_art(path: Path) -> Optional[bytes]:
+    return TAG_SANDBOX.parse(path, ART)
 
+@timed("find_lyrics_file_seconds", "Time spent locating a lyrics file")
 def find_lyrics_file(song_path: Path) -> Optional[Path]:
     base = song_path.stem
     for ext in LYRICS_EXTS:
@@ -103,9 +162,11 @@ def find_lyrics_file(song_path: Path) -> Optional[Path]:
                 return f
     return None
 
-def clear_caches_for_path(path: Path):
+def invalidate_path(path: Path):
     key = str(path)
-    if key in _metadata_cache:
-        del _metadata_cache[key]
-    if key in _art_cache:
-        del _art_cache[key]
+    CACHES.invalidate(key)
+    tid = TRACKS.lookup(key)
+    if tid is not None:
+        TRACKS.clear_tags(tid)
+    with _dirty_lock:
+        _metadata_dirty.pop(key, None)
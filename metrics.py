@@ -0,0 +1,239 @@
+import bisect
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+METRICS_FLAG = "--metrics"
+METRICS_ENV = "BEATZ_METRICS"
+METRICS_PORT_ENV = "BEATZ_METRICS_PORT"
+DEFAULT_PORT = 9464
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def metrics_requested(argv: Optional[List[str]] = None) -> bool:
+    argv = sys.argv if argv is None else argv
+    return METRICS_FLAG in argv or os.environ.get(METRICS_ENV, "") not in ("", "0")
+
+ENABLED = metrics_requested()
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class _NullMetric:
+    def inc(self, n: float = 1):
+        pass
+
+    def dec(self, n: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+_NULL = _NullMetric()
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, labels: Labels):
+        self.name = name
+        self.labels = labels
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, n: float = 1):
+        with self._lock:
+            self.value += n
+
+    def sample(self) -> Dict[str, Any]:
+        return {"value": self.value}
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, n: float = 1):
+        self.inc(-n)
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = float(value)
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, labels: Labels, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.labels = labels
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def sample(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": self.max,
+        }
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[Tuple[str, Labels], Any] = {}
+        self._help: Dict[str, str] = {}
+
+    def _get(self, cls, name: str, help_text: str, labels: Dict[str, str]):
+        if not ENABLED:
+            return _NULL
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(name, key[1])
+                    self._metrics[key] = metric
+                    if help_text:
+                        self._help.setdefault(name, help_text)
+        return metric
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str = "", **labels) -> Gauge:
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str = "", **labels) -> Histogram:
+        return self._get(Histogram, name, help_text, labels)
+
+    def metrics(self) -> List[Any]:
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda m: (m.name, m.labels))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [{"name": m.name, "type": m.kind, "labels": dict(m.labels), **m.sample()} for m in self.metrics()]
+
+    def to_json(self) -> str:
+        return json.dumps({"enabled": ENABLED, "metrics": self.snapshot()}, indent=2)
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+        seen = set()
+        for m in self.metrics():
+            if m.name not in seen:
+                seen.add(m.name)
+                if m.name in self._help:
+                    lines.append(f"# HELP {m.name} {self._help[m.name]}")
+                lines.append(f"# TYPE {m.name} {m.kind}")
+            if m.kind == "histogram":
+                cumulative = 0
+                for bound, c in zip(m.buckets + (float("inf"),), m.counts):
+                    cumulative += c
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{m.name}_bucket{_fmt_labels(m.labels + (('le', le),))} {cumulative}")
+                lines.append(f"{m.name}_sum{_fmt_labels(m.labels)} {m.sum}")
+                lines.append(f"{m.name}_count{_fmt_labels(m.labels)} {m.count}")
+            else:
+                lines.append(f"{m.name}{_fmt_labels(m.labels)} {m.value}")
+        return "\n".join(lines) + "\n"
+
+def _fmt_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    inner = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels)
+    return "{" + inner + "}"
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+def timed(name: str, help_text: str = "", **labels) -> Callable:
+    def decorator(fn: Callable) -> Callable:
+        if not ENABLED:
+            return fn
+        hist = histogram(name, help_text, **labels)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - t0)
+        return wrapper
+    return decorator
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") in ("", "/metrics"):
+            body, ctype = REGISTRY.to_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, ctype = REGISTRY.to_json(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+_server: Optional[ThreadingHTTPServer] = None
+
+def start_exporter(port: Optional[int] = None) -> Optional[int]:
+    global _server
+    if not ENABLED:
+        return None
+    if _server is None:
+        port = int(os.environ.get(METRICS_PORT_ENV, DEFAULT_PORT)) if port is None else port
+        _server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return _server.server_address[1]
+
+def exporter_port() -> Optional[int]:
+    return _server.server_address[1] if _server is not None else None
+
+def stop_exporter():
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
@@ -2,8 +2,9 @@ import sys
 import os
 import random
 import traceback
+from collections import deque
 from pathlib import Path
-from typing import List, Optional, Tuple, Dict
+from typing import Deque, List, Optional, Tuple, Dict
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 try:
@@ -11,23 +12,46 @@ try:
 except Exception:
     pass
 
-import vlc
-import qdarktheme
-import qtawesome as qta
-
 from utils import log_exc_to_file
 from paths import SONGS_DIR, LYRICS_DIR, EQ_PRESETS_FILE
-from audio_engine import AudioEngine
-from metadata_utils import get_metadata, human_time, scan_folder_for_songs, read_text_file, extract_embedded_art, find_lyrics_file, clear_caches_for_path
+from audio_engine import AudioEngine, render_destinations
+from metadata_utils import SUPPORTED_EXT, get_metadata, cached_metadata, human_time, scan_folder_for_songs, read_text_file, extract_embedded_art, find_lyrics_file, invalidate_path, prime_metadata_cache, take_dirty_metadata
+from player_core import PlaybackCore, REPEAT_NONE, REPEAT_ONE
+from tag_sandbox import TAG_SANDBOX
+from audio_cache import AudioCache, audio_cache_budget, simulated_latency
+from library_roots import (RootScanner, load_library_roots, save_library_roots, is_primary_root, under_root,
+                           ROOT_RETRY_MS, ONLINE, OFFLINE, SCANNING)
+from ipc import IpcServer
 from lyrics_utils import parse_lyrics_by_suffix
-from workers import LyricsWorker, ArtWorker
-from equalizer_window import EqualizerWindow
-from load_songs_dialog import LoadSongsDialog
+from workers import LyricsWorker, ArtWorker, MetadataWorker, HashWorker, LoudnessWorker, FeatureWorker, WaveformWorker, RenderWorker, LyricsIndexWorker, BrowseIndexWorker
+from waveform_slider import WaveformSlider
+from library_index import get_library_index
+from replay_gain import gain_for_track, REPLAY_GAIN_TRACK, REPLAY_GAIN_LABELS
+from startup import FAST_START, mark, write_timeline, load_stylesheet
+from play_history import HistoryStore
+from session import SessionStore, load_session, make_snapshot, restore_snapshot, session_tracks
+from metrics import timed, start_exporter, stop_exporter
+import profiler
+
+SIMILAR_COUNT = 10
+AUTO_DJ_MIN_QUEUE = 2
+AUTO_DJ_BATCH = 3
+AUTO_DJ_RECENT = 50
+AUTO_DJ_DELAY_MS = 1000
+
+def _icon(name: str):
+    import qtawesome as qta
+    return qta.icon(name, color='white')
 
 class MusicPlayer(QtWidgets.QMainWindow):
-    def __init__(self):
+    _dispatch_requested = QtCore.pyqtSignal(object)
+
+    def __init__(self, open_paths: Optional[List[Path]] = None):
         super().__init__()
         self.songs_dir = SONGS_DIR
+        self.library_roots = load_library_roots()
+        self._root_states: Dict[str, str] = {}
+        self.library_roots_dialog = None
         self.setWindowTitle("🎧 Music Player")
         self.resize(980, 560)
 
@@ -37,25 +61,58 @@ class MusicPlayer(QtWidgets.QMainWindow):
             log_exc_to_file(e)
             raise
 
-        self.all_songs: List[Path] = []
-        self.playlist: List[Path] = []
-        self.queue: List[Path] = []
-        self.current_index: Optional[int] = None
-        self.is_playing = False
-        self.repeat_mode = 0
-        self.shuffle = False
+        self._dispatch_requested.connect(self._run_dispatched, QtCore.Qt.QueuedConnection)
+        budget = audio_cache_budget()
+        self.audio_cache = AudioCache(budget, latency=simulated_latency()) if budget else None
+        self.core = PlaybackCore(self.audio, self._dispatch_requested.emit, gain_for=self._replay_gain_for,
+                                 resolve=self.audio_cache.resolve if self.audio_cache else None)
+        self.core.add_listener(self._on_core_event)
+        if self.audio_cache is not None:
+            self.audio_cache.follow(self.core)
+            self.audio_cache.start()
+        self.ipc_server: Optional[IpcServer] = None
 
         self._lyrics_threads: List[QtCore.QThread] = []
         self._art_threads: List[QtCore.QThread] = []
 
         self._lyrics_workers: Dict[str, LyricsWorker] = {}
         self._art_workers: Dict[str, ArtWorker] = {}
+        self._waveform_workers: Dict[str, WaveformWorker] = {}
+        self._waveform_threads: List[QtCore.QThread] = []
 
         self.lyrics_timeline: List[Tuple[int, str]] = []
         self.current_lyric_index: int = -1
         self._current_track_path: Optional[Path] = None
 
-        self.equalizer_window: Optional[EqualizerWindow] = None
+        self.equalizer_window = None
+        self.diagnostics_dialog = None
+        self.lyrics_search_dialog = None
+        self._stem_map: Optional[Dict[str, Path]] = None
+        self._lyrics_index_thread: Optional[QtCore.QThread] = None
+        self._lyrics_index_worker: Optional[LyricsIndexWorker] = None
+        self._lyrics_index_rerun = False
+        self.library_browser = None
+        self._browse_index_thread: Optional[QtCore.QThread] = None
+        self._browse_index_worker: Optional[BrowseIndexWorker] = None
+        self._browse_index_rerun = False
+        self._removed_paths: List[Path] = []
+        self._profile_timer: Optional[QtCore.QTimer] = None
+        self._metadata_thread: Optional[QtCore.QThread] = None
+        self._metadata_worker: Optional[MetadataWorker] = None
+        self._metadata_pending: Dict[str, Path] = {}
+        self._hash_thread: Optional[QtCore.QThread] = None
+        self._hash_worker: Optional[HashWorker] = None
+        self._loudness_thread: Optional[QtCore.QThread] = None
+        self._loudness_worker: Optional[LoudnessWorker] = None
+        self._loudness_rerun = False
+        self._feature_thread: Optional[QtCore.QThread] = None
+        self._feature_worker: Optional[FeatureWorker] = None
+        self._feature_rerun = False
+        self.auto_dj = False
+        self._recent_tracks: Deque[Path] = deque(maxlen=AUTO_DJ_RECENT)
+        self._render_thread: Optional[QtCore.QThread] = None
+        self._render_worker: Optional[RenderWorker] = None
+        self.replay_gain_mode = REPLAY_GAIN_TRACK
 
         self._build_ui()
 
@@ -69,21 +126,37 @@ class MusicPlayer(QtWidgets.QMainWindow):
         self.search_completer.activated.connect(self._on_completer_selected)
 
         self._connect_signals()
-
-        try:
-            events = self.audio.event_manager()
-            if events is not None:
-                events.event_attach(vlc.EventType.MediaPlayerEndReached, self._vlc_end_callback)
-        except Exception as e:
-            log_exc_to_file(e)
+        self._start_ipc_server()
+        self._start_metrics_exporter()
+        if profiler.profiling_requested():
+            self._toggle_profiling()
+
+        self.session = SessionStore(self._capture_session, self._dispatch_requested.emit, lambda: self.core.is_playing)
+        self.history = HistoryStore(self._on_history_flushed)
+        self.core.add_listener(self.history.listener)
+        self.history.start()
+        self._session_restored = self._restore_session(play=not open_paths)
+        self.core.add_listener(self.session.touch)
+        self.session.start()
+
+        self.root_retry_timer = QtCore.QTimer(self)
+        self.root_retry_timer.setInterval(ROOT_RETRY_MS)
+        self.root_retry_timer.timeout.connect(self._retry_offline_roots)
+        self.root_retry_timer.start()
 
         self.ui_timer = QtCore.QTimer(self)
         self.ui_timer.setInterval(200)
         self.ui_timer.timeout.connect(self._update_ui)
         self.ui_timer.start()
 
-        self._load_all_songs()
-        QtCore.QTimer.singleShot(350, self._auto_load_and_play_random)
+        if FAST_START:
+            QtCore.QTimer.singleShot(0, lambda: self._finish_startup(open_paths))
+        else:
+            self._load_all_songs()
+            QtCore.QTimer.singleShot(350, lambda: self._start_playback(open_paths))
+        QtCore.QTimer.singleShot(4000, self._start_lyrics_indexing)
+        QtCore.QTimer.singleShot(4500, self._start_browse_indexing)
+        QtCore.QTimer.singleShot(5000, self._start_loudness_analysis)
 
     def _build_ui(self):
         central = QtWidgets.QWidget()
@@ -124,7 +197,7 @@ class MusicPlayer(QtWidgets.QMainWindow):
         seek_layout = QtWidgets.QHBoxLayout()
         self.time_label = QtWidgets.QLabel("00:00")
         seek_layout.addWidget(self.time_label)
-        self.seek_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
+        self.seek_slider = WaveformSlider(QtCore.Qt.Horizontal)
         self.seek_slider.setRange(0, 1000)
         seek_layout.addWidget(self.seek_slider, stretch=1)
         self.total_label = QtWidgets.QLabel("00:00")
@@ -150,9 +223,14 @@ class MusicPlayer(QtWidgets.QMainWindow):
         self.repeat_btn = QtWidgets.QPushButton("🔁 Repeat: None")
         self.eq_btn = QtWidgets.QPushButton("🎚️ Equalizer")
         self.queue_btn = QtWidgets.QPushButton("🎶 Queue")
+        self.duplicates_btn = QtWidgets.QPushButton("🧬 Duplicates")
+        self.gain_btn = QtWidgets.QPushButton("📶 Gain: Track")
+        self.gain_btn.setToolTip("Loudness normalisation (ReplayGain, -18 LUFS reference)")
         opts_layout.addWidget(self.shuffle_btn)
         opts_layout.addWidget(self.repeat_btn)
         opts_layout.addWidget(self.eq_btn)
+        opts_layout.addWidget(self.gain_btn)
+        opts_layout.addWidget(self.duplicates_btn)
         opts_layout.addStretch(1)
         opts_layout.addWidget(self.queue_btn)
         mid.addLayout(opts_layout)
@@ -193,7 +271,9 @@ class MusicPlayer(QtWidgets.QMainWindow):
         self.status.showMessage("🎧 Ready to play some tunes!")
 
         try:
-            QtWidgets.QApplication.instance().setStyleSheet(qdarktheme.load_stylesheet("dark"))
+            app = QtWidgets.QApplication.instance()
+            if not app.styleSheet():
+                app.setStyleSheet(load_stylesheet())
         except Exception:
             pass
 
@@ -234,48 +314,288 @@ class MusicPlayer(QtWidgets.QMainWindow):
         QtWidgets.QShortcut(QtGui.QKeySequence("Space"), self, activated=self._on_play_pause)
         QtWidgets.QShortcut(QtGui.QKeySequence("Right"), self, activated=lambda: self.seek_by(5000))
         QtWidgets.QShortcut(QtGui.QKeySequence("Left"), self, activated=lambda: self.seek_by(-5000))
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+D"), self, activated=self._open_diagnostics)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+P"), self, activated=self._toggle_profiling)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+L"), self, activated=self._open_lyrics_search)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+B"), self, activated=self._open_library_browser)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+J"), self, activated=self._toggle_auto_dj)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+L"), self, activated=self._open_library_roots)
 
         self._on_volume_change(self.volume_slider.value())
 
         self.eq_btn.clicked.connect(self._open_equalizer)
+        self.duplicates_btn.clicked.connect(self._find_duplicates)
+        self.gain_btn.clicked.connect(self._on_toggle_replay_gain)
+
+    def _start_ipc_server(self):
+        try:
+            self.ipc_server = IpcServer(self.core, self._dispatch_requested.emit,
+                                        extra_commands={"raise": self._raise_window, "open": self._open_paths})
+            self.ipc_server.start()
+        except Exception as e:
+            log_exc_to_file(e)
+            self.ipc_server = None
+
+    def _start_metrics_exporter(self):
+        try:
+            start_exporter()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _toggle_profiling(self):
+        try:
+            if profiler.active():
+                if self._profile_timer is not None:
+                    self._profile_timer.stop()
+                    self._profile_timer = None
+                folder = profiler.stop()
+                self.status.showMessage(f"Profile saved to {folder}" if folder else "Profile capture failed")
+                return
+            profiler.start()
+            self._profile_timer = QtCore.QTimer(self)
+            self._profile_timer.setInterval(int(profiler.HEARTBEAT_INTERVAL * 1000))
+            self._profile_timer.timeout.connect(profiler.beat)
+            self._profile_timer.start()
+            self.status.showMessage("Profiling… press Ctrl+Shift+P again to save the capture")
+        except Exception as e:
+            log_exc_to_file(e)
+
+    @QtCore.pyqtSlot(object)
+    def _run_dispatched(self, fn):
+        try:
+            fn()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _open_paths(self, paths, play: bool = True) -> bool:
+        files = [Path(p) for p in paths]
+        for p in files:
+            invalidate_path(p)
+        opened = self.core.open_paths(files, play)
+        if opened:
+            self.status.showMessage(f"Opened {len(files)} file(s)")
+        return opened
+
+    def _raise_window(self):
+        self.showNormal()
+        self.raise_()
+        self.activateWindow()
+
+    def _on_core_event(self, event: str, data: dict):
+        if event == "track":
+            self._on_track_loaded(data["path"])
+            self._recent_tracks.append(data["path"])
+            if self.auto_dj and len(self.core.queue) < AUTO_DJ_MIN_QUEUE:
+                QtCore.QTimer.singleShot(AUTO_DJ_DELAY_MS, self._continue_auto_dj)
+        elif event == "audio_started":
+            mark("first_audio")
+        elif event == "state":
+            icon = 'fa5s.pause' if data.get("playing") else 'fa5s.play'
+            self.play_btn.setIcon(_icon(icon))
+        elif event in ("queue", "playlist"):
+            self._refresh_playlist_view()
+        elif event == "songs_added":
+            self._stem_map = None
+            self._on_songs_added(data["paths"], data["appended"])
+        elif event == "library":
+            self._stem_map = None
+        elif event == "removed":
+            self._removed_paths.extend(data["paths"])
+        elif event == "mode":
+            self.shuffle_btn.setChecked(self.core.shuffle)
+            self.shuffle_btn.setToolTip("Shuffle On" if self.core.shuffle else "Shuffle Off")
+            if self.core.repeat_mode == REPEAT_NONE:
+                self.repeat_btn.setText("🔁 Repeat: None")
+            elif self.core.repeat_mode == REPEAT_ONE:
+                self.repeat_btn.setText("🔂 Repeat: One")
+            else:
+                self.repeat_btn.setText("🔁 Repeat: All")
+        elif event == "volume":
+            if self.volume_slider.value() != data["volume"]:
+                self.volume_slider.blockSignals(True)
+                self.volume_slider.setValue(data["volume"])
+                self.volume_slider.blockSignals(False)
+
+    def _finish_startup(self, open_paths: Optional[List[Path]] = None):
+        self._load_all_songs()
+        self._start_playback(open_paths)
+
+    def _start_playback(self, open_paths: Optional[List[Path]] = None):
+        if open_paths:
+            self._open_paths(open_paths)
+        elif not self._session_restored:
+            self._auto_load_and_play_random()
+
+    def _capture_session(self) -> dict:
+        return make_snapshot(self.core, eq=self.audio.equalizer_bands(), replay_gain=self.replay_gain_mode,
+                             auto_dj=self.auto_dj)
+
+    def _restore_session(self, play: bool = True) -> bool:
+        try:
+            snap = load_session()
+            if not snap:
+                return False
+            self.replay_gain_mode = int(snap.get("replay_gain", self.replay_gain_mode)) % len(REPLAY_GAIN_LABELS)
+            self.gain_btn.setText(f"📶 Gain: {REPLAY_GAIN_LABELS[self.replay_gain_mode]}")
+            self.audio.set_equalizer_bands(snap.get("eq"))
+            self.auto_dj = bool(snap.get("auto_dj", False))
+            prime_metadata_cache(get_library_index().get_tags(session_tracks(snap), verify=self.audio_cache is None))
+            return restore_snapshot(self.core, snap, play=play)
+        except Exception as e:
+            log_exc_to_file(e)
+            return False
+
+    def showEvent(self, event: QtGui.QShowEvent):
+        super().showEvent(event)
+        mark("window_shown")
 
     def _load_all_songs(self):
-        self.all_songs = scan_folder_for_songs(self.songs_dir)
-        self.playlist = list(self.all_songs)
+        # songs/ is local and listed here; every other library root is
+        # listed on its own thread and merged in when its scan finishes.
+        songs = scan_folder_for_songs(self.songs_dir)
+        try:
+            prime_metadata_cache(get_library_index().get_tags(songs, verify=self.audio_cache is None))
+        except Exception as e:
+            log_exc_to_file(e)
+        self.core.set_library(songs, keep_playlist=self._session_restored)
+        self._scan_library_roots(self.library_roots)
         self._refresh_playlist_view()
-        model = QtCore.QStringListModel([p.stem for p in self.all_songs])
+        self._completer_model = QtCore.QStringListModel([p.stem for p in self.core.all_songs])
         try:
-            self.search_completer.setModel(model)
+            self.search_completer.setModel(self._completer_model)
         except Exception:
             pass
+        mark("library_ready")
+        QtCore.QTimer.singleShot(0, self._save_metadata_cache)
+
+    def _save_metadata_cache(self):
+        try:
+            dirty = take_dirty_metadata()
+            if dirty:
+                get_library_index().set_tags(dirty)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _add_songs(self, paths: List[Path]):
+        for p in paths:
+            invalidate_path(p)
+        self.core.add_songs(paths)
+
+    def _on_songs_added(self, added: List[Path], appended: List[Path]):
+        for p in appended:
+            item = QtWidgets.QListWidgetItem(self._track_label(p))
+            item.setData(QtCore.Qt.UserRole, self.core.tracks.lookup(p))
+            self.playlist_widget.addItem(item)
+        self._start_metadata_loading()
+        if added:
+            try:
+                self._completer_model.setStringList([p.stem for p in self.core.all_songs])
+            except Exception:
+                pass
+            self.status.showMessage(f"Imported {len(added)} track(s)")
+            self._start_loudness_analysis()
+            self._start_lyrics_indexing()
+            self._start_browse_indexing()
+
+    def _scan_library_roots(self, roots: List[Path]):
+        for root in roots:
+            if is_primary_root(root) or self._root_states.get(str(root)) == SCANNING:
+                continue
+            self._root_states[str(root)] = SCANNING
+            RootScanner(root, self._on_root_scanned, verify_tags=self.audio_cache is None).start()
+        self._update_library_roots_dialog()
+
+    def _on_root_scanned(self, root: Path, songs: Optional[List[Path]], tags: dict, gone: List[Path]):
+        self._dispatch_requested.emit(lambda: self._root_scanned(root, songs, tags, gone))
+
+    def _root_scanned(self, root: Path, songs: Optional[List[Path]], tags: dict, gone: List[Path]):
+        if not any(str(r) == str(root) for r in self.library_roots):
+            return  # Removed while it was being scanned.
+        if songs is None:
+            self._root_states[str(root)] = OFFLINE
+            self.status.showMessage(f"Library folder offline: {root}")
+        else:
+            self._root_states[str(root)] = ONLINE
+            prime_metadata_cache(tags)
+            removed = self.core.remove_songs(gone) if gone else 0
+            added = self.core.add_songs(songs, to_playlist=not self._session_restored)
+            self.status.showMessage(f"{root}: {len(songs)} track(s), {len(added)} new, {removed} removed"
+                                    if removed else f"{root}: {len(songs)} track(s), {len(added)} new")
+            if removed:
+                self._start_browse_indexing()
+        self._update_library_roots_dialog()
+
+    def _retry_offline_roots(self):
+        self._scan_library_roots([r for r in self.library_roots if self._root_states.get(str(r)) == OFFLINE])
+
+    def _offline_roots(self) -> List[str]:
+        return [str(r) for r in self.library_roots if self._root_states.get(str(r)) in (OFFLINE, SCANNING)]
+
+    def _open_library_roots(self):
+        try:
+            if not self.library_roots_dialog:
+                from library_roots_dialog import LibraryRootsDialog
+                self.library_roots_dialog = LibraryRootsDialog(self.library_roots, parent=self)
+                self.library_roots_dialog.rootsChanged.connect(self._set_library_roots)
+            self._update_library_roots_dialog()
+            self.library_roots_dialog.show()
+            self.library_roots_dialog.raise_()
+            self.library_roots_dialog.activateWindow()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _update_library_roots_dialog(self):
+        if self.library_roots_dialog is None:
+            return
+        try:
+            self.library_roots_dialog.update_status(self._root_states, get_library_index().root_status())
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _set_library_roots(self, roots: List[Path]):
+        try:
+            old = {str(r): r for r in self.library_roots}
+            self.library_roots = list(roots)
+            save_library_roots(self.library_roots)
+            for key, root in old.items():
+                if any(str(r) == key for r in roots):
+                    continue
+                self._root_states.pop(key, None)
+                get_library_index().remove_root(key)
+                removed = self.core.remove_songs([p for p in self.core.all_songs if under_root(p, root)
+                                                  and not any(under_root(p, r) for r in roots)])
+                self.status.showMessage(f"Removed {removed} track(s) from {root}")
+            self._scan_library_roots([r for r in roots if str(r) not in old])
+            self._start_browse_indexing()
+        except Exception as e:
+            log_exc_to_file(e)
 
     def _auto_load_and_play_random(self):
-        if not self.playlist:
+        if not self.core.playlist:
             self.status.showMessage("No songs found in songs/ — create the folder and add files.")
             return
-        idx = random.randrange(0, len(self.playlist))
-        self.current_index = idx
-        self.load_track(self.current_index)
-        QtCore.QTimer.singleShot(250, self._safe_play)
+        self.core.play_index(random.randrange(0, len(self.core.playlist)))
 
     def _on_load_songs(self):
+        from load_songs_dialog import LoadSongsDialog
         dlg = LoadSongsDialog(self)
-        if dlg.exec_() == QtWidgets.QDialog.Accepted:
+        accepted = dlg.exec_() == QtWidgets.QDialog.Accepted
+        saved_batch: List[Path] = getattr(dlg, "saved_batch", [])
+        if saved_batch:
+            self._add_songs(saved_batch)
+        if accepted:
             saved_music: Path = getattr(dlg, "saved_music", None)
             saved_lyrics: Optional[Path] = getattr(dlg, "saved_lyrics", None)
             if saved_music:
-                clear_caches_for_path(saved_music)
                 if saved_lyrics:
-                    clear_caches_for_path(saved_lyrics)
-                self._load_all_songs()
+                    invalidate_path(saved_lyrics)
+                    self._start_lyrics_indexing()
                 try:
-                    idx = self.playlist.index(saved_music)
+                    idx = self.core.playlist.index(saved_music)
                 except ValueError:
-                    idx = next((i for i, p in enumerate(self.playlist) if p.name == saved_music.name), None)
+                    idx = next((i for i, p in enumerate(self.core.playlist) if p.name == saved_music.name), None)
                 if idx is not None:
-                    self.current_index = idx
-                    self.load_track(self.current_index)
-                    QtCore.QTimer.singleShot(120, self._safe_play)
+                    self.core.play_index(idx)
 
     def _on_search(self):
         term = self.search_input.text().strip().lower()
@@ -285,30 +605,79 @@ class MusicPlayer(QtWidgets.QMainWindow):
             item.setHidden(not visible)
 
     def _on_completer_selected(self, text: str):
-        for p in self.all_songs:
+        for p in self.core.all_songs:
             if text.lower() in p.stem.lower():
                 self.play_item(p)
                 break
 
     def _refresh_playlist_view(self):
+        tracks = self.core.tracks
         self.playlist_widget.clear()
-        for p in self.playlist:
-            t, a, _ = get_metadata(p)
-            item = QtWidgets.QListWidgetItem(f"{t} — {a}" if a else t)
-            item.setData(QtCore.Qt.UserRole, p)
+        for tid in self.core.playlist.ids:
+            item = QtWidgets.QListWidgetItem(self._track_label(tracks.path(tid)))
+            item.setData(QtCore.Qt.UserRole, tid)
             self.playlist_widget.addItem(item)
         self.queue_widget.clear()
-        for q in self.queue:
-            t, a, _ = get_metadata(q)
-            it = QtWidgets.QListWidgetItem(f"{t} — {a}" if a else t)
-            it.setData(QtCore.Qt.UserRole, q)
+        for tid in self.core.queue.ids:
+            it = QtWidgets.QListWidgetItem(self._track_label(tracks.path(tid)))
+            it.setData(QtCore.Qt.UserRole, tid)
             self.queue_widget.addItem(it)
+        self._start_metadata_loading()
+
+    def _track_label(self, path: Path) -> str:
+        # Lists never parse on the GUI thread: unknown tracks show their file
+        # name until the metadata worker has read them.
+        tags = cached_metadata(path)
+        if tags is None:
+            self._metadata_pending[str(path)] = path
+            return path.name
+        t, a, _ = tags
+        return f"{t} — {a}" if a else t
+
+    def _start_metadata_loading(self):
+        try:
+            if self._metadata_worker is not None or not self._metadata_pending:
+                return
+            mw = MetadataWorker(list(self._metadata_pending.values()))
+            self._metadata_pending = {}
+            mthread = QtCore.QThread(self)
+            mw.moveToThread(mthread)
+            mthread.started.connect(mw.run)
+            mw.finished.connect(self._on_metadata_loaded)
+            mw.finished.connect(mthread.quit)
+            mw.finished.connect(mw.deleteLater)
+            mthread.finished.connect(mthread.deleteLater)
+            self._metadata_worker = mw
+            self._metadata_thread = mthread
+            mthread.start()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    @QtCore.pyqtSlot(int)
+    def _on_metadata_loaded(self, loaded: int):
+        self._metadata_worker = None
+        self._metadata_thread = None
+        if loaded:
+            self._save_metadata_cache()
+            # Relabel in place, so selection and scroll position survive.
+            tracks = self.core.tracks
+            for view in (self.playlist_widget, self.queue_widget):
+                for i in range(view.count()):
+                    item = view.item(i)
+                    tid = item.data(QtCore.Qt.UserRole)
+                    if tid is not None:
+                        item.setText(self._track_label(tracks.path(tid)))
+        self._start_metadata_loading()
+
+    def _item_path(self, item: QtWidgets.QListWidgetItem) -> Optional[Path]:
+        tid = item.data(QtCore.Qt.UserRole)
+        return None if tid is None else self.core.tracks.path(tid)
 
     def _toggle_playlist_view(self):
         self.playlist_widget.setVisible(not self.playlist_widget.isVisibleTo(self))
 
     def _show_queue_info(self):
-        QtWidgets.QMessageBox.information(self, "Queue", f"{len(self.queue)} track(s) in queue.")
+        QtWidgets.QMessageBox.information(self, "Queue", f"{len(self.core.queue)} track(s) in queue.")
 
     def _on_playlist_context(self, pos):
         item = self.playlist_widget.itemAt(pos)
@@ -316,24 +685,20 @@ class MusicPlayer(QtWidgets.QMainWindow):
             return
         menu = QtWidgets.QMenu()
         add_to_queue = menu.addAction("Add to queue")
+        queue_similar = menu.addAction("Queue similar tracks")
         remove = menu.addAction("Remove from playlist")
+        menu.addSeparator()
+        export = menu.addAction("Export playlist with EQ...")
+        export.setEnabled(self._render_worker is None)
         action = menu.exec_(self.playlist_widget.mapToGlobal(pos))
-        if action == add_to_queue:
-            path = item.data(QtCore.Qt.UserRole)
-            self.queue.append(path)
-            self._refresh_playlist_view()
+        if action == export:
+            self._export_playlist()
+        elif action == add_to_queue:
+            self.core.enqueue(self._item_path(item))
+        elif action == queue_similar:
+            self._queue_similar(self._item_path(item))
         elif action == remove:
-            path = item.data(QtCore.Qt.UserRole)
-            if path in self.playlist:
-                idx = self.playlist.index(path)
-                del self.playlist[idx]
-                if self.current_index is not None:
-                    if idx < self.current_index:
-                        self.current_index -= 1
-                    elif idx == self.current_index:
-                        self.stop()
-                        self.current_index = None
-                self._refresh_playlist_view()
+            self.core.remove_from_playlist(self._item_path(item))
 
     def _on_queue_context(self, pos):
         item = self.queue_widget.itemAt(pos)
@@ -344,22 +709,21 @@ class MusicPlayer(QtWidgets.QMainWindow):
         remove = menu.addAction("Remove from queue")
         action = menu.exec_(self.queue_widget.mapToGlobal(pos))
         if action == play_now:
-            path = item.data(QtCore.Qt.UserRole)
+            path = self._item_path(item)
             self.play_item(path)
         elif action == remove:
-            path = item.data(QtCore.Qt.UserRole)
-            if path in self.queue:
-                self.queue.remove(path)
-                self._refresh_playlist_view()
+            self.core.dequeue(self._item_path(item))
 
     def load_track(self, index: int):
         try:
-            if index is None or index < 0 or index >= len(self.playlist):
-                return
-            path = self.playlist[index]
-            self._current_track_path = path
+            self.core.load(index)
+        except Exception as e:
+            log_exc_to_file(e)
 
-            self.audio.set_media(str(path))
+    @timed("track_loaded_ui_seconds", "Time to refresh the UI for a newly loaded track")
+    def _on_track_loaded(self, path: Path):
+        try:
+            self._current_track_path = path
 
             title, artist, duration = get_metadata(path)
             self.title_label.setText(title)
@@ -422,6 +786,8 @@ class MusicPlayer(QtWidgets.QMainWindow):
             self._art_threads.append(athread)
             athread.start()
 
+            QtCore.QTimer.singleShot(0, lambda: self._load_waveform(path))
+
             QtCore.QTimer.singleShot(1600, self._ensure_lyrics_loaded)
             QtCore.QTimer.singleShot(1600, self._ensure_art_loaded)
 
@@ -499,6 +865,39 @@ class MusicPlayer(QtWidgets.QMainWindow):
             except Exception:
                 pass
 
+    def _load_waveform(self, path: Path):
+        try:
+            if path != self._current_track_path:
+                return
+            from waveform import load_peaks
+            peaks = load_peaks(path)
+            self.seek_slider.set_peaks(peaks)
+            if peaks is not None or str(path) in self._waveform_workers:
+                return
+            ww = WaveformWorker(path)
+            wthread = QtCore.QThread()
+            ww.moveToThread(wthread)
+            wthread.started.connect(ww.run)
+            ww.finished.connect(self._on_waveform_ready)
+            ww.finished.connect(wthread.quit)
+            ww.finished.connect(ww.deleteLater)
+            wthread.finished.connect(wthread.deleteLater)
+            self._waveform_workers[str(path)] = ww
+            self._waveform_threads.append(wthread)
+            wthread.start(QtCore.QThread.LowPriority)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    @QtCore.pyqtSlot(str, bool)
+    def _on_waveform_ready(self, path_str: str, ok: bool):
+        try:
+            self._waveform_workers.pop(path_str, None)
+            if ok and self._current_track_path is not None and path_str == str(self._current_track_path):
+                from waveform import load_peaks
+                self.seek_slider.set_peaks(load_peaks(self._current_track_path))
+        except Exception as e:
+            log_exc_to_file(e)
+
     def _fade_artwork(self, pixmap: QtGui.QPixmap):
         try:
             self.art_opacity_effect.setOpacity(0.0)
@@ -524,135 +923,51 @@ class MusicPlayer(QtWidgets.QMainWindow):
 
     def _on_play_pause(self):
         try:
-            if self.audio.is_playing():
-                self.audio.pause()
-                self.is_playing = False
-                self.play_btn.setIcon(qta.icon('fa5s.play', color='white'))
-                self.status.showMessage("Paused")
-            else:
-                if (self.audio.player.get_media() is None and self.playlist):
-                    if self.current_index is None:
-                        self.current_index = 0
-                    self.load_track(self.current_index)
-                self.audio.play()
-                self.is_playing = True
-                self.play_btn.setIcon(qta.icon('fa5s.pause', color='white'))
-                self.status.showMessage("Playing")
+            self.core.toggle()
+            self.status.showMessage("Playing" if self.core.is_playing else "Paused")
         except Exception as e:
             log_exc_to_file(e)
 
     def stop(self):
         try:
-            self.audio.stop()
-            self.is_playing = False
-            self.play_btn.setIcon(qta.icon('fa5s.play', color='white'))
+            self.core.stop()
         except Exception as e:
             log_exc_to_file(e)
 
     def next_track(self):
         try:
-            if self.queue:
-                next_path = self.queue.pop(0)
-                if next_path in self.playlist:
-                    self.current_index = self.playlist.index(next_path)
-                else:
-                    self.playlist.append(next_path)
-                    self.current_index = len(self.playlist) - 1
-                self._refresh_playlist_view()
-                self.load_track(self.current_index)
-                QtCore.QTimer.singleShot(80, self._safe_play)
-                return
-
-            if not self.playlist:
-                return
-
-            if self.shuffle:
-                self.current_index = random.randrange(0, len(self.playlist))
-            else:
-                if self.current_index is None:
-                    self.current_index = 0
-                else:
-                    self.current_index += 1
-
-            if self.current_index >= len(self.playlist):
-                if self.repeat_mode == 2:
-                    self.current_index = 0
-                else:
-                    self.stop()
-                    self.current_index = len(self.playlist) - 1
-                    return
-            self.load_track(self.current_index)
-            QtCore.QTimer.singleShot(80, self._safe_play)
+            self.core.next_track()
         except Exception as e:
             log_exc_to_file(e)
 
     def prev_track(self):
         try:
-            if not self.playlist:
-                return
-            cur_time = self.audio.get_time() or 0
-            if cur_time > 3000:
-                self.audio.set_time(0)
-                return
-            if self.current_index is None:
-                self.current_index = 0
-            else:
-                self.current_index -= 1
-            if self.current_index < 0:
-                self.current_index = 0
-            self.load_track(self.current_index)
-            QtCore.QTimer.singleShot(80, self._safe_play)
+            self.core.prev_track()
         except Exception as e:
             log_exc_to_file(e)
 
     def play_item(self, path: Path):
         try:
-            if path in self.playlist:
-                self.current_index = self.playlist.index(path)
-                self.load_track(self.current_index)
-                QtCore.QTimer.singleShot(80, self._safe_play)
-            else:
-                self.playlist.append(path)
-                self.current_index = len(self.playlist) - 1
-                self.load_track(self.current_index)
-                QtCore.QTimer.singleShot(80, self._safe_play)
-            self._refresh_playlist_view()
-        except Exception as e:
-            log_exc_to_file(e)
-
-    def _safe_play(self):
-        try:
-            self.audio.play()
-            self.is_playing = True
-            self.play_btn.setIcon(qta.icon('fa5s.pause', color='white'))
+            self.core.play_path(path)
         except Exception as e:
             log_exc_to_file(e)
 
     def seek_by(self, ms_delta: int):
         try:
-            cur = self.audio.get_time() or 0
-            new = max(0, cur + ms_delta)
-            self.audio.set_time(new)
+            self.core.seek_by(ms_delta)
         except Exception as e:
             log_exc_to_file(e)
 
     def _on_toggle_shuffle(self):
-        self.shuffle = self.shuffle_btn.isChecked()
-        self.shuffle_btn.setToolTip("Shuffle On" if self.shuffle else "Shuffle Off")
-        self.status.showMessage("Shuffle enabled" if self.shuffle else "Shuffle disabled")
+        self.core.set_shuffle(self.shuffle_btn.isChecked())
+        self.status.showMessage("Shuffle enabled" if self.core.shuffle else "Shuffle disabled")
 
     def _on_toggle_repeat(self):
-        self.repeat_mode = (self.repeat_mode + 1) % 3
-        if self.repeat_mode == 0:
-            self.repeat_btn.setText("🔁 Repeat: None")
-        elif self.repeat_mode == 1:
-            self.repeat_btn.setText("🔂 Repeat: One")
-        else:
-            self.repeat_btn.setText("🔁 Repeat: All")
+        self.core.set_repeat(self.core.repeat_mode + 1)
 
     def _on_volume_change(self, val):
         try:
-            self.audio.audio_set_volume(int(val))
+            self.core.set_volume(int(val))
         except Exception:
             pass
         self.status.showMessage(f"Volume: {val}%")
@@ -661,7 +976,7 @@ class MusicPlayer(QtWidgets.QMainWindow):
         try:
             muted = self.audio.audio_get_mute()
             self.audio.audio_toggle_mute()
-            self.mute_btn.setIcon(qta.icon('fa5s.volume-off' if not muted else 'fa5s.volume-up', color='white'))
+            self.mute_btn.setIcon(_icon('fa5s.volume-off' if not muted else 'fa5s.volume-up'))
         except Exception as e:
             log_exc_to_file(e)
 
@@ -673,19 +988,18 @@ class MusicPlayer(QtWidgets.QMainWindow):
             pos = self.seek_slider.value() / float(max_val)
             length = self.audio.get_length()
             if length and length > 0:
-                ms = int(length * pos)
-                self.audio.set_time(ms)
+                self.core.seek(int(length * pos))
         except Exception as e:
             log_exc_to_file(e)
 
     def _on_playlist_doubleclick(self, item):
-        path = item.data(QtCore.Qt.UserRole)
+        path = self._item_path(item)
         if path:
             self.play_item(path)
 
     def _on_queue_doubleclick(self, item):
-        path = item.data(QtCore.Qt.UserRole)
-        if path in self.queue:
+        path = self._item_path(item)
+        if path in self.core.queue:
             self.play_item(path)
 
     def _on_lyrics_doubleclick(self, item):
@@ -693,25 +1007,11 @@ class MusicPlayer(QtWidgets.QMainWindow):
             idx = self.lyrics_view.row(item)
             if 0 <= idx < len(self.lyrics_timeline):
                 t_ms, _ = self.lyrics_timeline[idx]
-                self.audio.set_time(t_ms)
-        except Exception as e:
-            log_exc_to_file(e)
-
-    def _vlc_end_callback(self, event):
-        QtCore.QMetaObject.invokeMethod(self, "_handle_end_of_track", QtCore.Qt.QueuedConnection)
-
-    @QtCore.pyqtSlot()
-    def _handle_end_of_track(self):
-        try:
-            if self.repeat_mode == 1:
-                if self.current_index is not None and 0 <= self.current_index < len(self.playlist):
-                    self.load_track(self.current_index)
-                    QtCore.QTimer.singleShot(150, self._safe_play)
-                return
-            self.next_track()
+                self.core.seek(t_ms)
         except Exception as e:
             log_exc_to_file(e)
 
+    @timed("update_ui_seconds", "Time spent in the periodic UI refresh")
     def _update_ui(self):
         try:
             if self.audio:
@@ -736,8 +1036,8 @@ class MusicPlayer(QtWidgets.QMainWindow):
                         blended = int(current + (target - current) * 0.4)
                         self.seek_slider.setValue(blended)
                 else:
-                    if not self.is_playing:
-                        self.play_btn.setIcon(qta.icon('fa5s.play', color='white'))
+                    if not self.core.is_playing:
+                        self.play_btn.setIcon(_icon('fa5s.play'))
 
                 self._update_lyrics_scroll(pos)
         except Exception as e:
@@ -828,20 +1128,37 @@ class MusicPlayer(QtWidgets.QMainWindow):
             if not action:
                 return
 
-            matched_path = next((p for p in self.all_songs if song_name.lower() == p.stem.lower()), None)
+            matched_path = next((p for p in self.core.all_songs if song_name.lower() == p.stem.lower()), None)
             if not matched_path:
                 return
 
             if action == add_action:
-                self.queue.append(matched_path)
-                self._refresh_playlist_view()
+                self.core.enqueue(matched_path)
                 self.status.showMessage(f"Added to queue: {song_name}")
 
         except Exception as e:
             log_exc_to_file(e)
 
     def closeEvent(self, event):
+        write_timeline()
+        if profiler.active():
+            self._toggle_profiling()
         try:
+            self.session.flush()
+            self.history.flush()
+        except Exception as e:
+            log_exc_to_file(e)
+        self._save_metadata_cache()
+        try:
+            if self.ipc_server is not None:
+                try:
+                    self.ipc_server.close()
+                except Exception:
+                    pass
+            try:
+                stop_exporter()
+            except Exception:
+                pass
             try:
                 self.audio.stop()
             except Exception:
@@ -860,11 +1177,31 @@ class MusicPlayer(QtWidgets.QMainWindow):
                     w.interrupt()
                 except Exception:
                     pass
-            for th in self._lyrics_threads + self._art_threads:
+            for w in (self._metadata_worker, self._hash_worker, self._loudness_worker, self._feature_worker, self._render_worker,
+                      self._lyrics_index_worker, self._browse_index_worker):
+                if w is not None:
+                    try:
+                        w.interrupt()
+                    except Exception:
+                        pass
+            for w in list(self._waveform_workers.values()):
+                try:
+                    w.interrupt()
+                except Exception:
+                    pass
+            extra_threads = [th for th in (self._hash_thread, self._loudness_thread, self._feature_thread,
+                                           self._render_thread, self._lyrics_index_thread, self._browse_index_thread)
+                             if th is not None]
+            for th in self._lyrics_threads + self._art_threads + self._waveform_threads + extra_threads:
                 try:
                     th.quit()
                 except Exception:
                     pass
+            if self.library_browser is not None:
+                self.library_browser.shutdown()
+            TAG_SANDBOX.shutdown()
+            if self.audio_cache is not None:
+                self.audio_cache.stop()
         except Exception as e:
             log_exc_to_file(e)
         event.accept()
@@ -872,9 +1209,338 @@ class MusicPlayer(QtWidgets.QMainWindow):
     def _open_equalizer(self):
         try:
             if not self.equalizer_window:
+                from equalizer_window import EqualizerWindow
                 self.equalizer_window = EqualizerWindow(self, parent=self)
             self.equalizer_window.show()
             self.equalizer_window.raise_()
             self.equalizer_window.activateWindow()
         except Exception as e:
             log_exc_to_file(e)
+
+    def _open_lyrics_search(self):
+        try:
+            if not self.lyrics_search_dialog:
+                from lyrics_search_dialog import LyricsSearchDialog
+                self.lyrics_search_dialog = LyricsSearchDialog(self._song_for_stem, parent=self)
+                self.lyrics_search_dialog.songSelected.connect(self._play_from_lyrics)
+            self.lyrics_search_dialog.show()
+            self.lyrics_search_dialog.raise_()
+            self.lyrics_search_dialog.activateWindow()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _song_for_stem(self, stem: str) -> Optional[Path]:
+        for ext in SUPPORTED_EXT:
+            candidate = self.songs_dir / f"{stem}{ext}"
+            if self.core.tracks.lookup(candidate) is not None:
+                return candidate
+        if self._stem_map is None:
+            self._stem_map = {p.stem.lower(): p for p in self.core.all_songs}
+        return self._stem_map.get(stem.lower())
+
+    def _play_from_lyrics(self, song: Path, time_ms: int):
+        try:
+            self.core.play_path(song, start_ms=time_ms)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _start_lyrics_indexing(self):
+        try:
+            if self._lyrics_index_worker is not None:
+                self._lyrics_index_rerun = True
+                return
+            w = LyricsIndexWorker()
+            th = QtCore.QThread(self)
+            w.moveToThread(th)
+            th.started.connect(w.run)
+            w.finished.connect(self._on_lyrics_indexed)
+            w.finished.connect(th.quit)
+            w.finished.connect(w.deleteLater)
+            th.finished.connect(th.deleteLater)
+            self._lyrics_index_worker = w
+            self._lyrics_index_thread = th
+            th.start(QtCore.QThread.LowPriority)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    @QtCore.pyqtSlot(int, int)
+    def _on_lyrics_indexed(self, indexed: int, removed: int):
+        self._lyrics_index_worker = None
+        self._lyrics_index_thread = None
+        if (indexed or removed) and self.library_browser is not None:
+            self.library_browser.refresh_playlists()
+        if self._lyrics_index_rerun:
+            self._lyrics_index_rerun = False
+            QtCore.QTimer.singleShot(0, self._start_lyrics_indexing)
+
+    def _open_library_browser(self):
+        try:
+            if not self.library_browser:
+                from library_browser_dialog import LibraryBrowserDialog
+                self.library_browser = LibraryBrowserDialog(parent=self)
+                self.library_browser.playRequested.connect(lambda paths: self.core.open_paths(paths))
+                self.library_browser.enqueueRequested.connect(self._enqueue_paths)
+                self.library_browser.playlistRequested.connect(self._play_smart_playlist)
+            self.library_browser.show()
+            self.library_browser.raise_()
+            self.library_browser.activateWindow()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _enqueue_paths(self, paths: List[Path]):
+        for p in paths:
+            self.core.enqueue(p)
+        self.status.showMessage(f"Added {len(paths)} track(s) to the queue")
+
+    def _play_smart_playlist(self, paths: List[Path]):
+        if self.core.set_playlist(paths):
+            self.status.showMessage(f"Playing smart playlist ({len(paths)} track(s))")
+
+    def _on_history_flushed(self, paths: List[str]):
+        self._dispatch_requested.emit(lambda: self._history_changed(paths))
+
+    def _history_changed(self, paths: List[str]):
+        if self.library_browser is not None:
+            self.library_browser.tracks_changed(paths, [])
+
+    def _start_browse_indexing(self):
+        try:
+            if self._browse_index_worker is not None:
+                self._browse_index_rerun = True
+                return
+            if not self.core.all_songs and not self._removed_paths:
+                return
+            w = BrowseIndexWorker(list(self.core.all_songs), self._offline_roots(), self._removed_paths)
+            self._removed_paths = []
+            th = QtCore.QThread(self)
+            w.moveToThread(th)
+            th.started.connect(w.run)
+            w.finished.connect(self._on_browse_indexed)
+            w.finished.connect(th.quit)
+            w.finished.connect(w.deleteLater)
+            th.finished.connect(th.deleteLater)
+            self._browse_index_worker = w
+            self._browse_index_thread = th
+            th.start(QtCore.QThread.LowPriority)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    @QtCore.pyqtSlot(list, list, bool)
+    def _on_browse_indexed(self, updated: list, removed: list, rekeyed: bool):
+        self._browse_index_worker = None
+        self._browse_index_thread = None
+        if (updated or removed or rekeyed) and self.library_browser is not None:
+            self.library_browser.reload(tracks=rekeyed)
+            if not rekeyed:
+                self.library_browser.tracks_changed(updated, removed)
+        if self._browse_index_rerun:
+            self._browse_index_rerun = False
+            QtCore.QTimer.singleShot(0, self._start_browse_indexing)
+
+    def _open_diagnostics(self):
+        try:
+            if not self.diagnostics_dialog:
+                from diagnostics_dialog import DiagnosticsDialog
+                self.diagnostics_dialog = DiagnosticsDialog(parent=self)
+            self.diagnostics_dialog.show()
+            self.diagnostics_dialog.raise_()
+            self.diagnostics_dialog.activateWindow()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _find_duplicates(self):
+        try:
+            if self._hash_worker is not None:
+                return
+            self.duplicates_btn.setEnabled(False)
+            self.status.showMessage("Hashing library for duplicates...")
+            hw = HashWorker(list(self.core.all_songs))
+            hthread = QtCore.QThread(self)
+            hw.moveToThread(hthread)
+            hthread.started.connect(hw.run)
+            hw.finished.connect(self._on_duplicates_ready)
+            hw.finished.connect(hthread.quit)
+            hw.finished.connect(hw.deleteLater)
+            hthread.finished.connect(hthread.deleteLater)
+            self._hash_worker = hw
+            self._hash_thread = hthread
+            hthread.start()
+        except Exception as e:
+            log_exc_to_file(e)
+            self.duplicates_btn.setEnabled(True)
+
+    @QtCore.pyqtSlot(list)
+    def _on_duplicates_ready(self, groups: list):
+        self._hash_worker = None
+        self._hash_thread = None
+        self.duplicates_btn.setEnabled(True)
+        try:
+            if not groups:
+                self.status.showMessage("No duplicate tracks found")
+                QtWidgets.QMessageBox.information(self, "Duplicates", "No duplicate tracks found.")
+                return
+            extra = sum(len(g) - 1 for g in groups)
+            self.status.showMessage(f"{len(groups)} duplicate group(s), {extra} redundant file(s)")
+            box = QtWidgets.QMessageBox(self)
+            box.setWindowTitle("Duplicates")
+            box.setIcon(QtWidgets.QMessageBox.Information)
+            box.setText(f"Found {len(groups)} group(s) of identical audio ({extra} redundant file(s)).")
+            box.setDetailedText("\n\n".join("\n".join(str(p) for p in g) for g in groups))
+            box.exec_()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _replay_gain_for(self, path: Path) -> float:
+        try:
+            return gain_for_track(get_library_index(), path, self.replay_gain_mode)
+        except Exception as e:
+            log_exc_to_file(e)
+            return 0.0
+
+    def _on_toggle_replay_gain(self):
+        self.replay_gain_mode = (self.replay_gain_mode + 1) % len(REPLAY_GAIN_LABELS)
+        label = REPLAY_GAIN_LABELS[self.replay_gain_mode]
+        self.gain_btn.setText(f"📶 Gain: {label}")
+        if self._current_track_path is not None:
+            gain = self._replay_gain_for(self._current_track_path)
+            self.audio.set_gain(gain)
+            self.status.showMessage(f"Loudness normalisation: {label} ({gain:+.1f} dB)")
+        else:
+            self.status.showMessage(f"Loudness normalisation: {label}")
+
+    def _start_loudness_analysis(self):
+        try:
+            if self._loudness_worker is not None:
+                self._loudness_rerun = True
+                return
+            if not self.core.all_songs:
+                return
+            lw = LoudnessWorker(list(self.core.all_songs))
+            lthread = QtCore.QThread(self)
+            lw.moveToThread(lthread)
+            lthread.started.connect(lw.run)
+            lw.progress.connect(self._on_loudness_progress)
+            lw.finished.connect(self._on_loudness_finished)
+            lw.finished.connect(lthread.quit)
+            lw.finished.connect(lw.deleteLater)
+            lthread.finished.connect(lthread.deleteLater)
+            self._loudness_worker = lw
+            self._loudness_thread = lthread
+            lthread.start(QtCore.QThread.LowPriority)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    @QtCore.pyqtSlot(int, int)
+    def _on_loudness_progress(self, done: int, total: int):
+        self.gain_btn.setToolTip(f"Loudness normalisation (ReplayGain, -18 LUFS reference)\nAnalysing: {done}/{total}")
+
+    @QtCore.pyqtSlot(int)
+    def _on_loudness_finished(self, analyzed: int):
+        self._loudness_worker = None
+        self._loudness_thread = None
+        self.gain_btn.setToolTip("Loudness normalisation (ReplayGain, -18 LUFS reference)")
+        if self._loudness_rerun:
+            self._loudness_rerun = False
+            QtCore.QTimer.singleShot(0, self._start_loudness_analysis)
+        else:
+            # Both jobs saturate a process pool, so similarity analysis waits its turn.
+            QtCore.QTimer.singleShot(0, self._start_feature_analysis)
+
+    def _start_feature_analysis(self):
+        try:
+            if self._feature_worker is not None:
+                self._feature_rerun = True
+                return
+            if not self.core.all_songs:
+                return
+            fw = FeatureWorker(list(self.core.all_songs))
+            fthread = QtCore.QThread(self)
+            fw.moveToThread(fthread)
+            fthread.started.connect(fw.run)
+            fw.finished.connect(self._on_feature_finished)
+            fw.finished.connect(fthread.quit)
+            fw.finished.connect(fw.deleteLater)
+            fthread.finished.connect(fthread.deleteLater)
+            self._feature_worker = fw
+            self._feature_thread = fthread
+            fthread.start(QtCore.QThread.LowPriority)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    @QtCore.pyqtSlot(int)
+    def _on_feature_finished(self, analyzed: int):
+        self._feature_worker = None
+        self._feature_thread = None
+        if self._feature_rerun:
+            self._feature_rerun = False
+            QtCore.QTimer.singleShot(0, self._start_feature_analysis)
+
+    def _similar_tracks(self, path: Path, count: int) -> List[Path]:
+        exclude = set(self._recent_tracks) | set(self.core.queue)
+        try:
+            from similarity import get_similarity_index
+            hits = get_similarity_index().similar(path, count, exclude)
+        except Exception as e:
+            log_exc_to_file(e)
+            return []
+        return [Path(p) for p, _ in hits if Path(p).exists()]
+
+    def _queue_similar(self, path: Path):
+        paths = self._similar_tracks(path, SIMILAR_COUNT)
+        if not paths:
+            self.status.showMessage("No similar tracks yet — audio analysis may still be running")
+            return
+        self._enqueue_paths(paths)
+
+    def _toggle_auto_dj(self):
+        self.auto_dj = not self.auto_dj
+        self.session.touch()
+        self.status.showMessage("Auto-DJ on: the queue continues with similar tracks" if self.auto_dj else "Auto-DJ off")
+        if self.auto_dj and len(self.core.queue) < AUTO_DJ_MIN_QUEUE:
+            self._continue_auto_dj()
+
+    def _continue_auto_dj(self):
+        path = self.core.current_path
+        if not self.auto_dj or path is None or len(self.core.queue) >= AUTO_DJ_MIN_QUEUE:
+            return
+        for p in self._similar_tracks(path, AUTO_DJ_BATCH):
+            self.core.enqueue(p)
+
+    def _export_playlist(self):
+        try:
+            if not self.core.playlist or self._render_worker is not None:
+                return
+            out_dir = QtWidgets.QFileDialog.getExistingDirectory(self, "Export playlist to folder", str(Path.home()))
+            if not out_dir:
+                return
+            fmt, ok = QtWidgets.QInputDialog.getItem(self, "Export format", "Format:", ["wav", "flac"], 0, False)
+            if not ok:
+                return
+            tracks = list(self.core.playlist)
+            jobs = [(str(p), str(d), self._replay_gain_for(p))
+                    for p, d in zip(tracks, render_destinations(tracks, Path(out_dir), fmt))]
+            rw = RenderWorker(jobs, self.audio.equalizer_bands(), fmt)
+            rthread = QtCore.QThread(self)
+            rw.moveToThread(rthread)
+            rthread.started.connect(rw.run)
+            rw.progress.connect(self._on_export_progress)
+            rw.finished.connect(self._on_export_finished)
+            rw.finished.connect(rthread.quit)
+            rw.finished.connect(rw.deleteLater)
+            rthread.finished.connect(rthread.deleteLater)
+            self._render_worker = rw
+            self._render_thread = rthread
+            rthread.start(QtCore.QThread.LowPriority)
+            self.status.showMessage(f"Exporting {len(jobs)} track(s)...")
+        except Exception as e:
+            log_exc_to_file(e)
+
+    @QtCore.pyqtSlot(int, int, str)
+    def _on_export_progress(self, done: int, total: int, name: str):
+        self.status.showMessage(f"Exporting {done}/{total}: {name}")
+
+    @QtCore.pyqtSlot(int, int, float)
+    def _on_export_finished(self, ok: int, total: int, multiple: float):
+        self._render_worker = None
+        self._render_thread = None
+        self.status.showMessage(f"Exported {ok}/{total} track(s) at {multiple:.1f}x real time")
@@ -2,5 +2,16 @@ from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent
 SONGS_DIR = BASE_DIR / "songs"
+LIBRARY_ROOTS_FILE = BASE_DIR / "library_roots.json"
 LYRICS_DIR = BASE_DIR / "lyrics"
 EQ_PRESETS_FILE = BASE_DIR / "eq_presets.json"
+LIBRARY_INDEX_FILE = BASE_DIR / "library.db"
+WAVEFORM_DIR = BASE_DIR / "waveforms"
+FEATURES_DIR = BASE_DIR / "features"
+AUDIO_CACHE_DIR = BASE_DIR / "audio-cache"
+THEME_CACHE_FILE = BASE_DIR / "theme-dark.qss"
+STARTUP_LOG_FILE = BASE_DIR / "startup.log"
+SESSION_FILE = BASE_DIR / "session.json"
+LOG_DIR = BASE_DIR / "logs"
+LOG_FILE = LOG_DIR / "beatz.log"
+PROFILE_DIR = BASE_DIR / "profiles"
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import wave
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+DECODE_RATE = 48000
+
+def read_wav(path: Path) -> Tuple[np.ndarray, int]:
+    with wave.open(str(path), "rb") as w:
+        channels = w.getnchannels()
+        width = w.getsampwidth()
+        rate = w.getframerate()
+        raw = w.readframes(w.getnframes())
+    if width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        data = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = (b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8
+        data = ints.astype(np.float32) / 8388608.0
+    elif width == 4:
+        data = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"unsupported sample width: {width}")
+    return data.reshape(-1, channels), rate
+
+def decode_pcm(path: Path, samplerate: int = DECODE_RATE) -> Optional[Tuple[np.ndarray, int]]:
+    if path.suffix.lower() == ".wav":
+        try:
+            return read_wav(path)
+        except Exception:
+            pass
+    from audio_engine import transcode_to_wav
+    fd, tmp = tempfile.mkstemp(suffix=".wav", prefix="beatz-decode-")
+    os.close(fd)
+    try:
+        if not transcode_to_wav(str(path), tmp, samplerate=samplerate):
+            return None
+        return read_wav(Path(tmp))
+    except Exception:
+        return None
+    finally:
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
@@ -0,0 +1,66 @@
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from library_index import COMPLETE, PLAY, SKIP, get_library_index
+from smart_playlists import STATS, refresh_smart_playlists
+from utils import log_exc_to_file
+
+FLUSH_DELAY = 2.0
+MAX_BUFFER = 512
+EVENT_KINDS = {"played": PLAY, "skipped": SKIP, "completed": COMPLETE}
+
+class HistoryStore(threading.Thread):
+    # Playback events land in a list under a lock and are written by this
+    # thread in one transaction, so a track switch never waits on SQLite.
+    def __init__(self, on_flush: Optional[Callable[[List[str]], None]] = None,
+                 delay: float = FLUSH_DELAY, max_buffer: int = MAX_BUFFER):
+        super().__init__(name="play-history", daemon=True)
+        self.on_flush = on_flush
+        self.delay = delay
+        self.max_buffer = max_buffer
+        self._lock = threading.Lock()
+        self._buffer: List[Tuple[float, int, str, int]] = []
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+
+    def listener(self, event: str, data: dict):
+        kind = EVENT_KINDS.get(event)
+        if kind is not None and data.get("path") is not None:
+            self.record(kind, data["path"], data.get("position") or 0)
+
+    def record(self, kind: int, path: Path, position_ms: int = 0):
+        with self._lock:
+            self._buffer.append((time.time(), kind, str(path), int(position_ms)))
+            full = len(self._buffer) >= self.max_buffer
+        if full:
+            self._wake.set()
+
+    def _flush_buffer(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        paths = sorted({path for _, _, path, _ in batch})
+        try:
+            get_library_index().record_events(batch)
+            refresh_smart_playlists(paths, STATS)
+        except Exception as e:
+            log_exc_to_file(e)
+            return
+        if self.on_flush is not None:
+            self.on_flush(paths)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(self.delay)
+            self._wake.clear()
+            self._flush_buffer()
+
+    def flush(self):
+        self._stop_event.set()
+        self._wake.set()
+        if self.is_alive():
+            self.join(timeout=1.0)
+        self._flush_buffer()
@@ -0,0 +1,385 @@
+import bisect
+import random
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from metadata_utils import SUPPORTED_EXT
+from metrics import timed
+from track_store import TRACKS, TrackList, TrackStore
+from utils import log_exc_to_file
+
+REPEAT_NONE = 0
+REPEAT_ONE = 1
+REPEAT_ALL = 2
+BULK_INSERT = 256
+
+Listener = Callable[[str, Dict[str, Any]], None]
+
+class PlaybackCore:
+    def __init__(self, audio, dispatch: Callable[[Callable[[], None]], None],
+                 gain_for: Optional[Callable[[Path], float]] = None, tracks: Optional[TrackStore] = None,
+                 resolve: Optional[Callable[[Path], Path]] = None):
+        self.audio = audio
+        self.dispatch = dispatch
+        self.gain_for = gain_for
+        self.resolve = resolve
+        self.tracks = TRACKS if tracks is None else tracks
+        self.all_songs = TrackList(self.tracks)
+        self.playlist = TrackList(self.tracks)
+        self.queue = TrackList(self.tracks)
+        self.current_index: Optional[int] = None
+        self.current_path: Optional[Path] = None
+        self.is_playing = False
+        self.repeat_mode = REPEAT_NONE
+        self.shuffle = False
+        self.volume = 80
+        self._start_ms = 0
+        self._play_counted = False
+        self._completed = False
+        self._listeners: List[Listener] = []
+
+        try:
+            import vlc
+            events = self.audio.event_manager()
+            if events is not None:
+                events.event_attach(vlc.EventType.MediaPlayerEndReached, self._vlc_end_callback)
+                events.event_attach(vlc.EventType.MediaPlayerPlaying, self._vlc_playing_callback)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def add_listener(self, fn: Listener):
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn: Listener):
+        try:
+            self._listeners.remove(fn)
+        except ValueError:
+            pass
+
+    def _emit(self, event: str, **data):
+        for fn in list(self._listeners):
+            try:
+                fn(event, data)
+            except Exception as e:
+                log_exc_to_file(e)
+
+    def _vlc_end_callback(self, event):
+        self.dispatch(self.handle_end_of_track)
+
+    def _vlc_playing_callback(self, event):
+        self.dispatch(lambda: self._emit("audio_started"))
+
+    def remove_songs(self, paths: Iterable[Path]) -> int:
+        # Drops tracks from the library, playlist and queue, e.g. when their
+        # library root is removed. The current track keeps playing.
+        gone = {self.tracks.lookup(p) for p in paths} - {None}
+        if not gone:
+            return 0
+        before = len(self.all_songs)
+        removed = [self.tracks.path(t) for t in self.all_songs.ids if t in gone]
+        self.all_songs = TrackList(self.tracks, ids=[t for t in self.all_songs.ids if t not in gone])
+        self.playlist = TrackList(self.tracks, ids=[t for t in self.playlist.ids if t not in gone])
+        self.queue = TrackList(self.tracks, ids=[t for t in self.queue.ids if t not in gone])
+        if self.current_path is not None and self.current_path in self.playlist:
+            self.current_index = self.playlist.index(self.current_path)
+        else:
+            self.current_index = None
+        self._emit("removed", paths=removed)
+        self._emit("library", count=len(self.all_songs))
+        self._emit("playlist")
+        self._emit("queue")
+        return before - len(self.all_songs)
+
+    def set_library(self, songs: List[Path], keep_playlist: bool = False):
+        self.all_songs = TrackList(self.tracks, songs)
+        if not keep_playlist:
+            self.playlist = self.all_songs.copy()
+        if self.current_path is not None and self.current_path in self.playlist:
+            self.current_index = self.playlist.index(self.current_path)
+        else:
+            self.current_index = None
+        self._emit("library", count=len(self.all_songs))
+
+    def add_songs(self, paths: Iterable[Path], to_playlist: bool = True) -> List[Path]:
+        batch = set()
+        added = []
+        appended = []
+        for p in paths:
+            if p.suffix.lower() not in SUPPORTED_EXT:
+                continue
+            tid = self.tracks.add(p)
+            if tid in batch or self.all_songs.has_id(tid):
+                continue
+            batch.add(tid)
+            added.append(p)
+            if to_playlist and not self.playlist.has_id(tid):
+                self.playlist.append_id(tid)
+                appended.append(p)
+        if len(added) > BULK_INSERT:
+            # A whole library root arriving at once: one sort beats insort's
+            # per-track shifting of the id array.
+            self.all_songs = TrackList(self.tracks, sorted(list(self.all_songs) + added))
+        else:
+            for p in added:
+                bisect.insort(self.all_songs, p)
+        if added:
+            self._emit("songs_added", paths=added, appended=appended)
+        return added
+
+    def _gain(self, path: Path) -> float:
+        if self.gain_for is None:
+            return 0.0
+        try:
+            return self.gain_for(path)
+        except Exception as e:
+            log_exc_to_file(e)
+            return 0.0
+
+    def _media_path(self, path: Path) -> Path:
+        # The file actually handed to VLC, e.g. a local copy of a network file.
+        if self.resolve is None:
+            return path
+        try:
+            return self.resolve(path)
+        except Exception as e:
+            log_exc_to_file(e)
+            return path
+
+    @timed("load_track_seconds", "Time to load a track, listeners included")
+    def load(self, index: Optional[int], start_ms: int = 0) -> bool:
+        if index is None or index < 0 or index >= len(self.playlist):
+            return False
+        path = self.playlist[index]
+        if self._play_counted and not self._completed:
+            self._emit("skipped", path=self.current_path, position=self.position())
+        self._play_counted = False
+        self._completed = False
+        self.current_index = index
+        self.current_path = path
+        self._start_ms = max(0, int(start_ms))
+        self.audio.set_media(str(self._media_path(path)), gain_db=self._gain(path), start_ms=start_ms)
+        self._emit("track", path=path, index=index)
+        return True
+
+    def play(self):
+        if self.audio.player.get_media() is None and self.playlist:
+            if self.current_index is None:
+                self.current_index = 0
+            self.load(self.current_index)
+        self.audio.play()
+        self.is_playing = True
+        self._emit("state", playing=True)
+        if not self._play_counted and self.current_path is not None:
+            self._play_counted = True
+            self._emit("played", path=self.current_path)
+
+    def pause(self):
+        if self.audio.is_playing():
+            self.audio.pause()
+        self.is_playing = False
+        self._emit("state", playing=False)
+
+    def toggle(self):
+        if self.audio.is_playing():
+            self.pause()
+        else:
+            self.play()
+
+    def stop(self):
+        self.audio.stop()
+        self.is_playing = False
+        self._emit("state", playing=False)
+
+    def position(self) -> int:
+        pos = self.audio.get_time() or 0
+        return pos if pos > 0 else self._start_ms
+
+    def seek(self, ms: int):
+        self._start_ms = max(0, int(ms))
+        self.audio.set_time(self._start_ms)
+        self._emit("seek", position=max(0, int(ms)))
+
+    def seek_by(self, ms_delta: int):
+        self.seek((self.audio.get_time() or 0) + ms_delta)
+
+    def set_volume(self, volume: int):
+        self.volume = max(0, min(100, int(volume)))
+        self.audio.audio_set_volume(self.volume)
+        self._emit("volume", volume=self.volume)
+
+    def set_shuffle(self, on: bool):
+        self.shuffle = bool(on)
+        self._emit("mode", shuffle=self.shuffle, repeat=self.repeat_mode)
+
+    def set_repeat(self, mode: int):
+        self.repeat_mode = int(mode) % 3
+        self._emit("mode", shuffle=self.shuffle, repeat=self.repeat_mode)
+
+    def play_index(self, index: int, start_ms: int = 0) -> bool:
+        if not self.load(index, start_ms=start_ms):
+            return False
+        self.play()
+        return True
+
+    def play_path(self, path: Path, start_ms: int = 0) -> bool:
+        if path in self.playlist:
+            return self.play_index(self.playlist.index(path), start_ms)
+        self.playlist.append(path)
+        self._emit("playlist")
+        return self.play_index(len(self.playlist) - 1, start_ms)
+
+    def open_paths(self, paths: Iterable[Path], play: bool = True) -> bool:
+        files = [Path(p) for p in paths]
+        if not files:
+            return False
+        self.add_songs(files)
+        first, rest = (files[0], files[1:]) if play else (None, files)
+        for p in rest:
+            self.queue.append(p)
+        if rest:
+            self._emit("queue")
+        if first is not None:
+            self.play_path(first)
+        return True
+
+    def set_playlist(self, paths: Iterable[Path], play: bool = True) -> bool:
+        files = [Path(p) for p in paths if Path(p).suffix.lower() in SUPPORTED_EXT]
+        if not files:
+            return False
+        self.add_songs(files)
+        self.playlist = TrackList(self.tracks, files)
+        if self.current_path is not None and self.current_path in self.playlist:
+            self.current_index = self.playlist.index(self.current_path)
+        else:
+            self.current_index = None
+        self._emit("playlist")
+        return self.play_index(0) if play else True
+
+    def enqueue(self, path: Path):
+        self.queue.append(path)
+        self._emit("queue")
+
+    def dequeue(self, path: Path):
+        if path in self.queue:
+            self.queue.remove(path)
+            self._emit("queue")
+
+    def remove_from_playlist(self, path: Path):
+        if path not in self.playlist:
+            return
+        idx = self.playlist.index(path)
+        del self.playlist[idx]
+        if self.current_index is not None:
+            if idx < self.current_index:
+                self.current_index -= 1
+            elif idx == self.current_index:
+                self.stop()
+                self.current_index = None
+        self._emit("playlist")
+
+    def next_track(self) -> bool:
+        if self.queue:
+            next_path = self.queue.pop(0)
+            self._emit("queue")
+            if next_path in self.playlist:
+                return self.play_index(self.playlist.index(next_path))
+            self.playlist.append(next_path)
+            self._emit("playlist")
+            return self.play_index(len(self.playlist) - 1)
+
+        if not self.playlist:
+            return False
+
+        if self.shuffle:
+            index = random.randrange(0, len(self.playlist))
+        elif self.current_index is None:
+            index = 0
+        else:
+            index = self.current_index + 1
+
+        if index >= len(self.playlist):
+            if self.repeat_mode == REPEAT_ALL:
+                index = 0
+            else:
+                self.stop()
+                self.current_index = len(self.playlist) - 1
+                return False
+        return self.play_index(index)
+
+    def upcoming(self, count: int) -> List[Path]:
+        # The tracks next_track() will play, as far as they are predictable:
+        # the queue, then (without shuffle) the rest of the playlist.
+        out = list(self.queue[:count])
+        if len(out) < count and not self.shuffle and self.playlist:
+            index = -1 if self.current_index is None else self.current_index
+            n = len(self.playlist)
+            for step in range(1, min(n, count - len(out)) + 1):
+                nxt = index + step
+                if nxt >= n:
+                    if self.repeat_mode != REPEAT_ALL:
+                        break
+                    nxt %= n
+                out.append(self.playlist[nxt])
+        return out
+
+    def prev_track(self) -> bool:
+        if not self.playlist:
+            return False
+        if (self.audio.get_time() or 0) > 3000:
+            self.seek(0)
+            return True
+        index = 0 if self.current_index is None else max(0, self.current_index - 1)
+        return self.play_index(index)
+
+    def handle_end_of_track(self):
+        try:
+            if self._play_counted and not self._completed:
+                self._completed = True
+                self._emit("completed", path=self.current_path)
+            if self.repeat_mode == REPEAT_ONE:
+                if self.current_index is not None and 0 <= self.current_index < len(self.playlist):
+                    self.play_index(self.current_index)
+                return
+            self.next_track()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def restore(self, playlist: List[Path], queue: List[Path], index: Optional[int], position_ms: int = 0,
+                shuffle: bool = False, repeat: int = REPEAT_NONE, volume: Optional[int] = None, play: bool = False):
+        self.playlist = TrackList(self.tracks, playlist)
+        self.queue = TrackList(self.tracks, queue)
+        self.shuffle = bool(shuffle)
+        self.repeat_mode = int(repeat) % 3
+        if volume is not None:
+            self.set_volume(volume)
+        self._emit("playlist")
+        self._emit("queue")
+        self._emit("mode", shuffle=self.shuffle, repeat=self.repeat_mode)
+        if self.load(index, start_ms=position_ms) and play:
+            self.play()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "playlist": list(self.playlist),
+            "queue": list(self.queue),
+            "current_index": self.current_index,
+            "position_ms": self.position() if self.current_path is not None else 0,
+            "playing": self.is_playing,
+            "shuffle": self.shuffle,
+            "repeat": self.repeat_mode,
+            "volume": self.volume,
+        }
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.current_path) if self.current_path else None,
+            "index": self.current_index,
+            "playing": bool(self.audio.is_playing()),
+            "position": self.audio.get_time(),
+            "length": self.audio.get_length(),
+            "volume": self.volume,
+            "shuffle": self.shuffle,
+            "repeat": self.repeat_mode,
+            "queue": [str(p) for p in self.queue],
+            "playlist_length": len(self.playlist),
+        }
@@ -0,0 +1,178 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from paths import PROFILE_DIR
+from utils import log_exc_to_file
+
+PROFILE_FLAG = "--profile"
+PROFILE_ENV = "BEATZ_PROFILE"
+STALL_THRESHOLD = 0.05
+HEARTBEAT_INTERVAL = 0.01
+TRACEMALLOC_FRAMES = 25
+TOP_N = 60
+
+def profiling_requested(argv: Optional[List[str]] = None) -> bool:
+    argv = sys.argv if argv is None else argv
+    return PROFILE_FLAG in argv or os.environ.get(PROFILE_ENV, "") not in ("", "0")
+
+class StallWatchdog(threading.Thread):
+    def __init__(self, thread_id: int, threshold: float = STALL_THRESHOLD, interval: float = HEARTBEAT_INTERVAL):
+        super().__init__(name="stall-watchdog", daemon=True)
+        self.thread_id = thread_id
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls: List[Dict] = []
+        self._last_beat = time.monotonic()
+        self._stop_event = threading.Event()
+
+    def beat(self):
+        self._last_beat = time.monotonic()
+
+    def run(self):
+        current: Optional[Dict] = None
+        next_sample = 0.0
+        while not self._stop_event.wait(self.interval):
+            last = self._last_beat
+            blocked = time.monotonic() - last
+            if blocked < self.threshold + self.interval:
+                if current is not None:
+                    current["duration_ms"] = round((last - current["_start"]) * 1000, 1)
+                    current = None
+                continue
+            if current is None:
+                current = {"_start": last, "at": time.time() - blocked, "duration_ms": None, "samples": []}
+                self.stalls.append(current)
+                next_sample = 0.0
+            if blocked >= next_sample:
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    current["samples"].append({"after_ms": round(blocked * 1000, 1),
+                                               "stack": traceback.format_stack(frame)})
+                next_sample = blocked + self.threshold
+
+    def stop(self) -> List[Dict]:
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout=1.0)
+        for stall in self.stalls:
+            if stall["duration_ms"] is None:
+                stall["duration_ms"] = round((time.monotonic() - stall["_start"]) * 1000, 1)
+        return [{k: v for k, v in s.items() if k != "_start"} for s in self.stalls]
+
+class ProfileSession:
+    def __init__(self, root: Path = PROFILE_DIR, stall_threshold: float = STALL_THRESHOLD):
+        self.folder = root / time.strftime("%Y%m%d-%H%M%S")
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._worker_profiles: List[cProfile.Profile] = []
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._heap_start = tracemalloc.take_snapshot()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        self.watchdog = StallWatchdog(threading.get_ident(), stall_threshold)
+        self.watchdog.start()
+
+    def add_worker_profile(self, prof: cProfile.Profile):
+        with self._lock:
+            self._worker_profiles.append(prof)
+
+    def _write_stats(self, profiles: List[cProfile.Profile], name: str):
+        if not profiles:
+            return
+        stats = pstats.Stats(profiles[0])
+        for prof in profiles[1:]:
+            stats.add(prof)
+        stats.dump_stats(str(self.folder / f"{name}.prof"))
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(TOP_N)
+        (self.folder / f"{name}-top.txt").write_text(out.getvalue(), encoding="utf-8")
+
+    def finish(self) -> Path:
+        self.profile.disable()
+        stalls = self.watchdog.stop()
+        heap_end = tracemalloc.take_snapshot()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self._write_stats([self.profile], "gui")
+        with self._lock:
+            workers = list(self._worker_profiles)
+        self._write_stats(workers, "workers")
+        heap_end.dump(str(self.folder / "heap.snapshot"))
+        diff = heap_end.compare_to(self._heap_start, "lineno")
+        (self.folder / "tracemalloc-top.txt").write_text("\n".join(str(d) for d in diff[:TOP_N]) + "\n", encoding="utf-8")
+        lines = []
+        for stall in stalls:
+            lines.append(f"=== stall of {stall['duration_ms']} ms at {time.strftime('%H:%M:%S', time.localtime(stall['at']))}")
+            for sample in stall["samples"]:
+                lines.append(f"--- blocked for {sample['after_ms']} ms")
+                lines.extend(s.rstrip("\n") for s in sample["stack"])
+        (self.folder / "stalls.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        summary = {
+            "started": self.started,
+            "duration_s": round(time.time() - self.started, 3),
+            "stall_threshold_ms": self.watchdog.threshold * 1000,
+            "stalls": len(stalls),
+            "worst_stall_ms": max((s["duration_ms"] for s in stalls), default=0),
+            "worker_tasks": len(workers),
+        }
+        (self.folder / "summary.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        return self.folder
+
+_session: Optional[ProfileSession] = None
+
+def active() -> bool:
+    return _session is not None
+
+def start() -> ProfileSession:
+    global _session
+    if _session is None:
+        _session = ProfileSession()
+    return _session
+
+def stop() -> Optional[Path]:
+    global _session
+    session, _session = _session, None
+    if session is None:
+        return None
+    try:
+        return session.finish()
+    except Exception as e:
+        log_exc_to_file(e)
+        return None
+
+def beat():
+    if _session is not None:
+        _session.watchdog.beat()
+
+def profiled(fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        session = _session
+        if session is None:
+            return fn(*args, **kwargs)
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            prof.disable()
+            session.add_worker_profile(prof)
+    return wrapper
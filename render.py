@@ -0,0 +1,84 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from audio_engine import OfflineRenderer, RENDER_FORMATS, EQ_BAND_COUNT, render_destinations
+from metadata_utils import scan_folder_for_songs, SUPPORTED_EXT
+from paths import EQ_PRESETS_FILE
+from utils import log_exc_to_file
+
+def load_preset(name: str) -> Optional[List[float]]:
+    if not EQ_PRESETS_FILE.exists():
+        return None
+    try:
+        data = json.loads(EQ_PRESETS_FILE.read_text(encoding="utf-8"))
+        vals = data.get(name) if isinstance(data, dict) else None
+        if isinstance(vals, list):
+            return [float(v) for v in vals]
+    except Exception as e:
+        log_exc_to_file(e)
+        print(f"Could not read {EQ_PRESETS_FILE.name}: {e}", file=sys.stderr)
+    return None
+
+def collect_inputs(inputs: List[str]) -> List[Path]:
+    out: List[Path] = []
+    for raw in inputs:
+        p = Path(raw)
+        if p.is_dir():
+            out.extend(scan_folder_for_songs(p))
+        elif p.suffix.lower() == ".m3u" and p.exists():
+            for line in p.read_text(encoding="utf-8", errors="replace").splitlines():
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    entry = Path(line)
+                    out.append(entry if entry.is_absolute() else p.parent / entry)
+        elif p.suffix.lower() in SUPPORTED_EXT:
+            out.append(p)
+    return out
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Render tracks offline with the equalizer applied, faster than real time.")
+    parser.add_argument("out_dir", help="folder for the rendered files")
+    parser.add_argument("inputs", nargs="+", help="audio files, folders or .m3u playlists")
+    parser.add_argument("--format", choices=sorted(RENDER_FORMATS), default="wav")
+    parser.add_argument("--preset", help="name of a saved equalizer preset")
+    parser.add_argument("--bands", help=f"comma-separated gains in dB for the {EQ_BAND_COUNT} EQ bands")
+    parser.add_argument("--jobs", type=int, default=None, help="parallel render instances (default: CPU count)")
+    parser.add_argument("--samplerate", type=int, default=44100)
+    args = parser.parse_args(argv)
+
+    bands = None
+    if args.preset:
+        bands = load_preset(args.preset)
+        if bands is None:
+            print(f"Unknown preset: {args.preset}", file=sys.stderr)
+            return 2
+    if args.bands:
+        bands = [float(v) for v in args.bands.split(",")]
+
+    tracks = collect_inputs(args.inputs)
+    if not tracks:
+        print("No input tracks found.", file=sys.stderr)
+        return 2
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    jobs = [(str(t), str(d), 0.0) for t, d in zip(tracks, render_destinations(tracks, out_dir, args.format))]
+
+    def progress(res, done, total):
+        status = "ok" if res.ok else "FAILED"
+        print(f"[{done}/{total}] {status} {Path(res.src).name} ({res.duration_ms / 1000.0:.0f}s in {res.elapsed:.1f}s)")
+
+    renderer = OfflineRenderer(bands=bands, fmt=args.format, samplerate=args.samplerate)
+    start = time.monotonic()
+    results, multiple = renderer.render_many(jobs, workers=args.jobs, progress=progress)
+    ok = sum(1 for r in results if r.ok)
+    audio = sum(r.duration_ms for r in results if r.ok) / 1000.0
+    print(f"Rendered {ok}/{len(results)} track(s): {audio:.0f}s of audio in {time.monotonic() - start:.1f}s "
+          f"({multiple:.1f}x real time)")
+    return 0 if ok == len(results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import math
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+REFERENCE_LUFS = -18.0
+TRUE_PEAK_CEILING_DB = -1.0
+
+REPLAY_GAIN_OFF = 0
+REPLAY_GAIN_TRACK = 1
+REPLAY_GAIN_ALBUM = 2
+REPLAY_GAIN_LABELS = {REPLAY_GAIN_OFF: "Off", REPLAY_GAIN_TRACK: "Track", REPLAY_GAIN_ALBUM: "Album"}
+
+def replay_gain_db(lufs: Optional[float], peak_db: Optional[float], reference: float = REFERENCE_LUFS) -> float:
+    if lufs is None:
+        return 0.0
+    gain = reference - lufs
+    if peak_db is not None:
+        gain = min(gain, TRUE_PEAK_CEILING_DB - peak_db)
+    return gain
+
+def album_loudness(tracks: Iterable[Tuple[Optional[float], Optional[float], int]]) -> Tuple[Optional[float], Optional[float]]:
+    energy = 0.0
+    weight = 0.0
+    peak = None
+    for lufs, peak_db, duration_ms in tracks:
+        if lufs is None:
+            continue
+        w = max(1, duration_ms or 1)
+        energy += w * 10.0 ** (lufs / 10.0)
+        weight += w
+        if peak_db is not None:
+            peak = peak_db if peak is None else max(peak, peak_db)
+    if weight <= 0.0:
+        return None, peak
+    return 10.0 * math.log10(energy / weight), peak
+
+def gain_for_track(index, path: Path, mode: int) -> float:
+    if mode == REPLAY_GAIN_OFF:
+        return 0.0
+    row = index.get_loudness(path)
+    if not row:
+        return 0.0
+    lufs, peak_db, album_key = row
+    if mode == REPLAY_GAIN_ALBUM and album_key:
+        lufs, peak_db = album_loudness(index.get_album_loudness_rows(album_key))
+    return replay_gain_db(lufs, peak_db)
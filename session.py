@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from paths import SESSION_FILE, SONGS_DIR
+from utils import log_exc_to_file
+
+SESSION_VERSION = 1
+SAVE_DELAY = 2.0
+CHECKPOINT_INTERVAL = 15.0
+
+def encode_track(path: Path) -> str:
+    try:
+        return Path(path).relative_to(SONGS_DIR).as_posix()
+    except ValueError:
+        return str(path)
+
+def decode_track(track_id: str) -> Path:
+    p = Path(track_id)
+    return p if p.is_absolute() else SONGS_DIR / p
+
+def make_snapshot(core, **extra) -> Dict[str, Any]:
+    state = core.snapshot()
+    snap = {
+        "version": SESSION_VERSION,
+        "playlist": [encode_track(p) for p in state["playlist"]],
+        "queue": [encode_track(p) for p in state["queue"]],
+        "current_index": state["current_index"],
+        "position_ms": int(state["position_ms"] or 0),
+        "playing": bool(state["playing"]),
+        "shuffle": bool(state["shuffle"]),
+        "repeat": int(state["repeat"]),
+        "volume": int(state["volume"]),
+    }
+    snap.update(extra)
+    return snap
+
+def load_session(path: Path = SESSION_FILE) -> Optional[Dict[str, Any]]:
+    try:
+        snap = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log_exc_to_file(e)
+        return None
+    if not isinstance(snap, dict) or snap.get("version") != SESSION_VERSION:
+        return None
+    return snap
+
+def session_tracks(snap: Dict[str, Any]) -> List[Path]:
+    return [decode_track(t) for t in snap.get("playlist", [])]
+
+def restore_snapshot(core, snap: Dict[str, Any], play: bool = True) -> bool:
+    playlist = session_tracks(snap)
+    index = snap.get("current_index")
+    if index is not None and not (0 <= index < len(playlist) and playlist[index].exists()):
+        index = None
+    core.restore(playlist, [decode_track(t) for t in snap.get("queue", [])], index,
+                 position_ms=int(snap.get("position_ms") or 0), shuffle=snap.get("shuffle", False),
+                 repeat=snap.get("repeat", 0), volume=snap.get("volume"),
+                 play=play and bool(snap.get("playing")))
+    return bool(playlist)
+
+class SessionStore(threading.Thread):
+    def __init__(self, capture: Callable[[], Dict[str, Any]], dispatch: Callable[[Callable[[], None]], None],
+                 is_active: Callable[[], bool], path: Path = SESSION_FILE,
+                 delay: float = SAVE_DELAY, checkpoint: float = CHECKPOINT_INTERVAL):
+        super().__init__(name="session-store", daemon=True)
+        self.capture = capture
+        self.dispatch = dispatch
+        self.is_active = is_active
+        self.path = path
+        self.delay = delay
+        self.checkpoint = checkpoint
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._dirty_since: Optional[float] = None
+        self._capturing = False
+        self._captured: Optional[Dict[str, Any]] = None
+        self._last_capture = time.monotonic()
+        self._last_text: Optional[str] = None
+
+    def touch(self, *_):
+        with self._lock:
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+        self._wake.set()
+
+    def _capture_now(self):
+        try:
+            snap = self.capture()
+        except Exception as e:
+            log_exc_to_file(e)
+            snap = None
+        with self._lock:
+            self._captured = snap
+            self._capturing = False
+        self._wake.set()
+
+    def _write(self, snap: Dict[str, Any]):
+        text = json.dumps(snap, separators=(",", ":"))
+        if text == self._last_text:
+            return
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.write(text)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, self.path)
+            self._last_text = text
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(0.5)
+            self._wake.clear()
+            now = time.monotonic()
+            with self._lock:
+                snap, self._captured = self._captured, None
+                due = not self._capturing and (
+                    (self._dirty_since is not None and now - self._dirty_since >= self.delay)
+                    or (now - self._last_capture >= self.checkpoint and self.is_active()))
+                if due:
+                    self._capturing = True
+                    self._dirty_since = None
+                    self._last_capture = now
+            if snap is not None:
+                self._write(snap)
+            if due:
+                self.dispatch(self._capture_now)
+
+    def flush(self):
+        self._stop_event.set()
+        self._wake.set()
+        if self.is_alive():
+            self.join(timeout=1.0)
+        try:
+            self._write(self.capture())
+        except Exception as e:
+            log_exc_to_file(e)
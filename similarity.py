@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from paths import FEATURES_DIR
+
+FEATURE_RATE = 22050
+FEATURE_SECONDS = 60.0
+FRAME_SIZE = 2048
+HOP_SIZE = 512
+BAND_EDGES = (40, 120, 250, 500, 1000, 2000, 4000, 8000, 11025)
+MIN_BPM, MAX_BPM = 60.0, 200.0
+PRIOR_BPM = 120.0
+AUDIO_DIMS = 9 + len(BAND_EDGES) - 1
+TAG_DIMS = 8
+ARTIST_WEIGHT = 1.5
+ALBUM_WEIGHT = 0.75
+
+FeatureResult = Tuple[str, bytes]
+MANIFEST = "index.json"
+
+def _frames(mono: np.ndarray) -> np.ndarray:
+    count = 1 + (len(mono) - FRAME_SIZE) // HOP_SIZE
+    return np.lib.stride_tricks.as_strided(
+        mono, shape=(count, FRAME_SIZE), strides=(mono.strides[0] * HOP_SIZE, mono.strides[0]))
+
+def estimate_tempo(mag: np.ndarray, rate: int) -> Tuple[float, float]:
+    # Spectral flux as the onset envelope; its autocorrelation peaks at the
+    # beat period and its multiples, so lags are weighted towards PRIOR_BPM.
+    flux = np.maximum(np.diff(np.log1p(mag), axis=0), 0.0).sum(axis=1)
+    flux -= flux.mean()
+    n = len(flux)
+    spectrum = np.fft.rfft(flux, n=2 * n)
+    ac = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+    if ac[0] <= 0:
+        return 0.0, 0.0
+    fps = rate / HOP_SIZE
+    lo = max(1, int(60.0 * fps / MAX_BPM))
+    hi = min(n - 1, int(np.ceil(60.0 * fps / MIN_BPM)))
+    if hi <= lo:
+        return 0.0, 0.0
+    lags = np.arange(lo, hi + 1)
+    prior = np.exp(-0.5 * np.log2(60.0 * fps / lags / PRIOR_BPM) ** 2)
+    lag = int(lags[np.argmax(ac[lo:hi + 1] * prior)])
+    return float(60.0 * fps / lag), float(ac[lag] / ac[0])
+
+def audio_features(samples: np.ndarray, rate: int) -> Optional[np.ndarray]:
+    mono = samples.mean(axis=1) if samples.ndim == 2 else samples
+    span = int(FEATURE_SECONDS * rate)
+    if len(mono) > span:
+        start = (len(mono) - span) // 2
+        mono = mono[start:start + span]
+    mono = np.ascontiguousarray(mono, dtype=np.float32)
+    if len(mono) < FRAME_SIZE * 8:
+        return None
+    frames = _frames(mono)
+    mag = np.abs(np.fft.rfft(frames * np.hanning(FRAME_SIZE).astype(np.float32), axis=1))
+    power = mag * mag
+    total = power.sum(axis=1) + 1e-12
+    freqs = np.fft.rfftfreq(FRAME_SIZE, d=1.0 / rate)
+    nyquist = rate / 2.0
+
+    centroid = (power @ freqs) / total / nyquist
+    cumulative = np.cumsum(power, axis=1)
+    rolloff = freqs[np.argmax(cumulative >= 0.85 * cumulative[:, -1:], axis=1)] / nyquist
+    flatness = np.exp(np.log(mag + 1e-9).mean(axis=1)) / (mag.mean(axis=1) + 1e-9)
+    rms_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    zcr = np.mean(np.abs(np.diff(np.signbit(mono).astype(np.int8)))) * rate / nyquist
+    bpm, pulse = estimate_tempo(mag, rate)
+
+    band_energy = []
+    for lo, hi in zip(BAND_EDGES[:-1], BAND_EDGES[1:]):
+        mask = (freqs >= lo) & (freqs < min(hi, nyquist))
+        band_energy.append(power[:, mask].sum() if mask.any() else 0.0)
+    bands = np.log10(np.asarray(band_energy) / total.sum() + 1e-9)
+
+    head = [np.log2(bpm) if bpm else 0.0, pulse,
+            centroid.mean(), centroid.std(), rolloff.mean(), flatness.mean(),
+            rms_db.mean(), rms_db.std(), zcr]
+    return np.asarray(head + list(bands), dtype=np.float32)
+
+def analyze_features(path_str: str) -> FeatureResult:
+    # Runs in the analysis process pool; failures return an empty vector so
+    # the track is not retried until the file changes.
+    from pcm_utils import decode_pcm
+    decoded = decode_pcm(Path(path_str), samplerate=FEATURE_RATE)
+    if decoded is None:
+        return path_str, b""
+    vector = audio_features(*decoded)
+    return path_str, b"" if vector is None else vector.tobytes()
+
+def _hash_tag(text: str) -> Tuple[int, float]:
+    digest = hashlib.blake2b(text.strip().lower().encode("utf-8"), digest_size=4).digest()
+    return digest[0] % TAG_DIMS, 1.0 if digest[1] & 1 else -1.0
+
+def build_feature_matrix(rows: Iterable[Tuple[str, bytes, str, str]], directory: Path = FEATURES_DIR) -> int:
+    # Audio features are z-scored across the library so no single unit
+    # dominates, artist/album are feature-hashed into a few extra columns, and
+    # every row is L2-normalised so cosine similarity is a plain dot product.
+    paths, blobs, tags = [], [], []
+    for path, blob, artist, album in rows:
+        if len(blob) == AUDIO_DIMS * 4:
+            paths.append(path)
+            blobs.append(blob)
+            tags.append((artist, album))
+    matrix = np.zeros((len(paths), AUDIO_DIMS + TAG_DIMS), dtype=np.float32)
+    if paths:
+        audio = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(-1, AUDIO_DIMS)
+        std = audio.std(axis=0)
+        matrix[:, :AUDIO_DIMS] = (audio - audio.mean(axis=0)) / np.where(std > 1e-6, std, 1.0)
+        for row, (artist, album) in enumerate(tags):
+            for text, weight in ((artist, ARTIST_WEIGHT), (album, ALBUM_WEIGHT)):
+                if text:
+                    col, sign = _hash_tag(text)
+                    matrix[row, AUDIO_DIMS + col] += sign * weight
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1.0)
+    # Each build gets a fresh file name: a matrix that is still memory-mapped
+    # cannot be replaced on Windows, so old generations are removed lazily.
+    directory.mkdir(exist_ok=True)
+    name = f"matrix-{os.urandom(6).hex()}.npy"
+    np.save(str(directory / name), matrix)
+    tmp = directory / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps({"matrix": name, "rows": len(paths), "paths": paths}), encoding="utf-8")
+    os.replace(tmp, directory / MANIFEST)
+    for old in directory.glob("matrix-*.npy"):
+        if old.name != name:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+    return len(paths)
+
+class SimilarityIndex:
+    """Nearest-neighbour lookups over the memory-mapped feature matrix."""
+
+    def __init__(self, directory: Path = FEATURES_DIR):
+        self.manifest = directory / MANIFEST
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._paths: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._stamp = None
+
+    def _file_stamp(self):
+        try:
+            st = self.manifest.stat()
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        self._matrix, self._paths, self._rows, self._stamp = None, [], {}, stamp
+        if stamp is None:
+            return
+        try:
+            meta = json.loads(self.manifest.read_text(encoding="utf-8"))
+            matrix = np.load(str(self.manifest.parent / meta["matrix"]), mmap_mode="r")
+        except Exception:
+            return
+        paths = meta.get("paths", [])
+        if matrix.ndim != 2 or matrix.shape[0] != len(paths) or meta.get("rows") != len(paths):
+            return
+        self._matrix, self._paths = matrix, paths
+        self._rows = {p: i for i, p in enumerate(paths)}
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return len(self._paths)
+
+    def __contains__(self, path) -> bool:
+        with self._lock:
+            self._load()
+            return str(path) in self._rows
+
+    def similar(self, path, k: int = 20, exclude: Iterable = ()) -> List[Tuple[str, float]]:
+        with self._lock:
+            self._load()
+            matrix, paths, rows = self._matrix, self._paths, self._rows
+        row = rows.get(str(path))
+        if matrix is None or row is None:
+            return []
+        scores = matrix @ np.asarray(matrix[row])
+        skip = [row] + [r for r in (rows.get(str(p)) for p in exclude) if r is not None]
+        scores[skip] = -np.inf
+        k = min(k, len(paths) - len(set(skip)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(paths[i], float(scores[i])) for i in top]
+
+_similarity_index: Optional[SimilarityIndex] = None
+_similarity_index_lock = threading.Lock()
+
+def get_similarity_index() -> SimilarityIndex:
+    global _similarity_index
+    with _similarity_index_lock:
+        if _similarity_index is None:
+            _similarity_index = SimilarityIndex()
+        return _similarity_index
@@ -0,0 +1,123 @@
+from PyQt5 import QtWidgets, QtCore
+from typing import List, Optional
+from smart_playlists import FIELDS, OPERATORS, TEXT, FLAG, Rule, SmartPlaylist
+
+class RuleRow(QtWidgets.QWidget):
+    removeRequested = QtCore.pyqtSignal(object)
+
+    def __init__(self, rule: Optional[Rule] = None, parent: QtWidgets.QWidget = None):
+        super().__init__(parent)
+        layout = QtWidgets.QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.field_combo = QtWidgets.QComboBox()
+        for key, field in FIELDS.items():
+            self.field_combo.addItem(field.label, key)
+        self.op_combo = QtWidgets.QComboBox()
+        self.text_input = QtWidgets.QLineEdit()
+        self.number_input = QtWidgets.QDoubleSpinBox()
+        self.number_input.setRange(0, 1e7)
+        self.number_input.setDecimals(0)
+        remove_btn = QtWidgets.QPushButton("Remove")
+        remove_btn.clicked.connect(lambda: self.removeRequested.emit(self))
+        layout.addWidget(self.field_combo)
+        layout.addWidget(self.op_combo)
+        layout.addWidget(self.text_input, 1)
+        layout.addWidget(self.number_input, 1)
+        layout.addWidget(remove_btn)
+        self.field_combo.currentIndexChanged.connect(self._on_field_changed)
+        self._on_field_changed()
+        if rule is not None:
+            self.field_combo.setCurrentIndex(max(0, self.field_combo.findData(rule.field)))
+            self.op_combo.setCurrentIndex(max(0, self.op_combo.findData(rule.op)))
+            if FIELDS[rule.field].kind == TEXT:
+                self.text_input.setText(str(rule.value or ""))
+            else:
+                self.number_input.setValue(float(rule.value or 0))
+
+    def _kind(self) -> str:
+        return FIELDS[self.field_combo.currentData()].kind
+
+    def _on_field_changed(self, *_):
+        kind = self._kind()
+        self.op_combo.clear()
+        for op, label in OPERATORS[kind]:
+            self.op_combo.addItem(label, op)
+        self.text_input.setVisible(kind == TEXT)
+        self.number_input.setVisible(kind not in (TEXT, FLAG))
+
+    def rule(self) -> Rule:
+        kind = self._kind()
+        if kind == TEXT:
+            value = self.text_input.text().strip()
+        elif kind == FLAG:
+            value = None
+        else:
+            value = self.number_input.value()
+        return Rule(self.field_combo.currentData(), self.op_combo.currentData(), value)
+
+class SmartPlaylistDialog(QtWidgets.QDialog):
+    def __init__(self, playlist: Optional[SmartPlaylist] = None, parent: QtWidgets.QWidget = None):
+        super().__init__(parent)
+        self.setWindowTitle("Edit Smart Playlist" if playlist else "New Smart Playlist")
+        self.resize(560, 320)
+        self.setWindowFlags(self.windowFlags() & ~QtCore.Qt.WindowContextHelpButtonHint)
+        self.rows: List[RuleRow] = []
+        self._build_ui()
+        if playlist is not None:
+            self.name_input.setText(playlist.name)
+            self.match_combo.setCurrentIndex(0 if playlist.match_all else 1)
+            for rule in playlist.rules:
+                self._add_row(rule)
+        if not self.rows:
+            self._add_row()
+
+    def _build_ui(self):
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(12, 12, 12, 12)
+        layout.setSpacing(8)
+
+        top = QtWidgets.QHBoxLayout()
+        self.name_input = QtWidgets.QLineEdit()
+        self.name_input.setPlaceholderText("Playlist name")
+        self.match_combo = QtWidgets.QComboBox()
+        self.match_combo.addItems(["Match all rules", "Match any rule"])
+        top.addWidget(self.name_input, 1)
+        top.addWidget(self.match_combo)
+        layout.addLayout(top)
+
+        self.rules_layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(self.rules_layout)
+        add_btn = QtWidgets.QPushButton("Add rule")
+        add_btn.clicked.connect(lambda: self._add_row())
+        layout.addWidget(add_btn, 0, QtCore.Qt.AlignLeft)
+        layout.addStretch(1)
+
+        btns = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
+        btns.accepted.connect(self._on_accept)
+        btns.rejected.connect(self.reject)
+        layout.addWidget(btns)
+
+    def _add_row(self, rule: Optional[Rule] = None):
+        row = RuleRow(rule, self)
+        row.removeRequested.connect(self._remove_row)
+        self.rows.append(row)
+        self.rules_layout.addWidget(row)
+
+    def _remove_row(self, row: RuleRow):
+        self.rows.remove(row)
+        row.deleteLater()
+
+    def _on_accept(self):
+        if not self.name_input.text().strip():
+            self.name_input.setFocus()
+            return
+        self.accept()
+
+    def name(self) -> str:
+        return self.name_input.text().strip()
+
+    def match_all(self) -> bool:
+        return self.match_combo.currentIndex() == 0
+
+    def rules(self) -> List[Rule]:
+        return [row.rule() for row in self.rows]
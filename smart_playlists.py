@@ -0,0 +1,151 @@
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from library_index import get_library_index
+from utils import log_exc_to_file
+
+TEXT, NUMBER, AGE, FLAG = "text", "number", "age", "flag"
+TAGS, STATS, LYRICS = "tags", "stats", "lyrics"
+DAY = 86400
+AGE_REFRESH = 3600
+
+class Field(NamedTuple):
+    label: str
+    sql: str
+    kind: str
+    source: str
+    scale: int = 1
+
+FIELDS: Dict[str, Field] = {
+    "artist": Field("Artist", "b.artist", TEXT, TAGS),
+    "album": Field("Album", "b.album", TEXT, TAGS),
+    "title": Field("Title", "b.title", TEXT, TAGS),
+    "duration": Field("Duration (seconds)", "b.duration_ms", NUMBER, TAGS, 1000),
+    "added": Field("Added", "b.added_at", AGE, TAGS),
+    "plays": Field("Plays", "COALESCE(p.plays, 0)", NUMBER, STATS),
+    "skips": Field("Skips", "COALESCE(p.skips, 0)", NUMBER, STATS),
+    "last_played": Field("Last played", "COALESCE(p.last_played, 0)", AGE, STATS),
+    "has_lyrics": Field("Has lyrics", "EXISTS (SELECT 1 FROM lyric_files l WHERE l.stem = b.stem)", FLAG, LYRICS),
+}
+
+OPERATORS: Dict[str, List[Tuple[str, str]]] = {
+    TEXT: [("is", "is"), ("is_not", "is not"), ("contains", "contains")],
+    NUMBER: [("lt", "less than"), ("gt", "more than"), ("eq", "equal to")],
+    AGE: [("within", "in the last (days)"), ("before", "not in the last (days)")],
+    FLAG: [("yes", "yes"), ("no", "no")],
+}
+
+class Rule(NamedTuple):
+    field: str
+    op: str
+    value: Any = None
+
+class SmartPlaylist(NamedTuple):
+    id: int
+    name: str
+    rules: List[Rule]
+    match_all: bool
+    evaluated_at: int
+    count: int
+
+    def sources(self) -> set:
+        return {FIELDS[r.field].source for r in self.rules if r.field in FIELDS}
+
+    def is_relative(self) -> bool:
+        return any(FIELDS[r.field].kind == AGE for r in self.rules if r.field in FIELDS)
+
+def _like_pattern(text: str) -> str:
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def compile_rule(rule: Rule, now: float) -> Tuple[str, List[Any]]:
+    field = FIELDS[rule.field]
+    if field.kind == TEXT:
+        text = str(rule.value or "")
+        if rule.op == "is":
+            return f"{field.sql} = ?", [text]
+        if rule.op == "is_not":
+            return f"{field.sql} <> ?", [text]
+        if rule.op == "contains":
+            return f"{field.sql} LIKE ? ESCAPE '\\'", [_like_pattern(text)]
+    elif field.kind == NUMBER:
+        value = float(rule.value or 0) * field.scale
+        sign = {"lt": "<", "gt": ">", "eq": "="}.get(rule.op)
+        if sign is not None:
+            return f"{field.sql} {sign} ?", [value]
+    elif field.kind == AGE:
+        since = int(now - float(rule.value or 0) * DAY)
+        if rule.op == "within":
+            return f"{field.sql} >= ?", [since]
+        if rule.op == "before":
+            return f"{field.sql} < ?", [since]
+    elif field.kind == FLAG:
+        return (field.sql if rule.op == "yes" else f"NOT {field.sql}"), []
+    raise ValueError(f"Unsupported rule: {rule}")
+
+def compile_rules(rules: Iterable[Rule], match_all: bool = True, now: Optional[float] = None) -> Tuple[str, List[Any]]:
+    # Each rule becomes a parameterised SQL term over browse_tracks/play_counts,
+    # so SQLite can answer it from the artist, duration, added_at and stem indexes.
+    now = time.time() if now is None else now
+    terms, params = [], []
+    for rule in rules:
+        sql, args = compile_rule(rule, now)
+        terms.append(f"({sql})")
+        params.extend(args)
+    if not terms:
+        return "1", []
+    return (" AND " if match_all else " OR ").join(terms), params
+
+def encode_rules(rules: Iterable[Rule]) -> str:
+    return json.dumps([list(r) for r in rules])
+
+def decode_rules(text: str) -> List[Rule]:
+    try:
+        return [Rule(*r) for r in json.loads(text) if r and r[0] in FIELDS]
+    except Exception as e:
+        log_exc_to_file(e)
+        return []
+
+def load_smart_playlists(counts: bool = True) -> List[SmartPlaylist]:
+    return [SmartPlaylist(pid, name, decode_rules(rules), bool(match_all), evaluated_at, count)
+            for pid, name, rules, match_all, evaluated_at, count in get_library_index().smart_playlists(counts)]
+
+def save_smart_playlist(name: str, rules: List[Rule], match_all: bool = True,
+                        playlist_id: Optional[int] = None) -> int:
+    where, params = compile_rules(rules, match_all)
+    index = get_library_index()
+    playlist_id = index.save_smart_playlist(playlist_id, name, encode_rules(rules), match_all)
+    index.rebuild_smart_playlist(playlist_id, where, params)
+    return playlist_id
+
+def delete_smart_playlist(playlist_id: int):
+    get_library_index().delete_smart_playlist(playlist_id)
+
+def playlist_tracks(playlist: SmartPlaylist) -> List[Path]:
+    # "Added in the last N days" drifts with the clock rather than with the
+    # library, so such playlists are re-evaluated once they are an hour old.
+    index = get_library_index()
+    if playlist.is_relative() and time.time() - playlist.evaluated_at >= AGE_REFRESH:
+        index.rebuild_smart_playlist(playlist.id, *compile_rules(playlist.rules, playlist.match_all))
+    return [Path(p) for p in index.smart_playlist_paths(playlist.id)]
+
+def refresh_smart_playlists(paths: Optional[Iterable[str]], source: Optional[str] = None) -> List[int]:
+    # Re-test only the changed tracks, and only in playlists whose rules read
+    # what changed; paths=None re-evaluates those playlists in full.
+    index = get_library_index()
+    keys = None if paths is None else [str(p) for p in paths]
+    changed = []
+    for playlist in load_smart_playlists(counts=False):
+        if source is not None and source not in playlist.sources():
+            continue
+        try:
+            where, params = compile_rules(playlist.rules, playlist.match_all)
+            if keys is None:
+                index.rebuild_smart_playlist(playlist.id, where, params)
+                changed.append(playlist.id)
+            elif keys and index.refresh_smart_playlist(playlist.id, where, params, keys):
+                changed.append(playlist.id)
+        except Exception as e:
+            log_exc_to_file(e)
+    return changed
@@ -0,0 +1,29 @@
+import locale
+import threading
+import unicodedata
+
+_lock = threading.Lock()
+_collation = None
+
+def collation_name() -> str:
+    global _collation
+    with _lock:
+        if _collation is None:
+            try:
+                _collation = locale.setlocale(locale.LC_COLLATE, "")
+            except locale.Error:
+                _collation = locale.setlocale(locale.LC_COLLATE, "C")
+        return _collation
+
+def _xfrm(text: str) -> bytes:
+    return locale.strxfrm(text).encode("utf-8", "surrogatepass")
+
+def collation_key(text: str) -> bytes:
+    # strxfrm output compares like strcoll() does, and its UTF-8 bytes keep that
+    # order under memcmp, so keys sort the same in Python and as SQLite BLOBs.
+    # The accent-stripped form goes first so "Éclair" files next to "eclair"
+    # even under the C locale; the full form after a NUL breaks ties.
+    collation_name()
+    folded = unicodedata.normalize("NFKC", text or "").casefold().replace("\x00", "")
+    base = "".join(c for c in unicodedata.normalize("NFKD", folded) if not unicodedata.combining(c))
+    return _xfrm(base) + b"\x00" + _xfrm(folded)
@@ -0,0 +1,152 @@
+import ctypes
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from utils import log_exc_to_file
+
+TAP_RATE = 44100
+TAP_CHANNELS = 2
+FFT_SIZE = 2048
+BAND_COUNT = 32
+MIN_FREQ = 30.0
+ANALYSIS_HZ = 60.0
+SYNC_INTERVAL = 0.25
+ERROR_LOG_INTERVAL = 10.0
+FLOOR_DB = -90.0
+
+class PcmRing:
+    def __init__(self, capacity_frames: int = 1 << 16, channels: int = TAP_CHANNELS):
+        self.capacity = capacity_frames
+        self.channels = channels
+        self.frame_bytes = 2 * channels
+        self.data = np.zeros(capacity_frames * channels, dtype=np.int16)
+        self._base = self.data.ctypes.data
+        self.write_pos = 0
+        self.callback_ns = 0
+        self.callback_calls = 0
+
+    def write(self, ptr: int, count: int):
+        t0 = time.perf_counter_ns()
+        if ptr and count > 0:
+            fb = self.frame_bytes
+            cap = self.capacity
+            if count > cap:
+                ptr += (count - cap) * fb
+                self.write_pos += count - cap
+                count = cap
+            pos = self.write_pos % cap
+            first = min(count, cap - pos)
+            ctypes.memmove(self._base + pos * fb, ptr, first * fb)
+            if count > first:
+                ctypes.memmove(self._base, ptr + first * fb, (count - first) * fb)
+            self.write_pos += count
+        self.callback_ns += time.perf_counter_ns() - t0
+        self.callback_calls += 1
+
+    def read_latest(self, out: np.ndarray) -> bool:
+        frames = len(out) // self.channels
+        end = self.write_pos
+        if end < frames:
+            return False
+        start = (end - frames) % self.capacity
+        first = min(frames, self.capacity - start)
+        ch = self.channels
+        out[:first * ch] = self.data[start * ch:(start + first) * ch]
+        if frames > first:
+            out[first * ch:] = self.data[:(frames - first) * ch]
+        return self.write_pos - end < self.capacity - frames
+
+class SpectrumFrame:
+    __slots__ = ("bands", "levels", "peaks", "serial")
+
+    def __init__(self, bands: np.ndarray, levels: Tuple[float, ...], peaks: Tuple[float, ...], serial: int):
+        self.bands = bands
+        self.levels = levels
+        self.peaks = peaks
+        self.serial = serial
+
+def _band_edges(rate: int, nfft: int, count: int) -> np.ndarray:
+    freqs = np.geomspace(MIN_FREQ, rate / 2.0, count + 1)
+    bins = np.clip(np.round(freqs * nfft / rate).astype(int), 1, nfft // 2)
+    return np.maximum.accumulate(np.maximum(bins[:-1], np.arange(1, count + 1)))
+
+def _db(x) -> np.ndarray:
+    return 20.0 * np.log10(np.maximum(x, 1e-9))
+
+class SpectrumAnalyzer(threading.Thread):
+    def __init__(self, ring: PcmRing, sync: Optional[Callable[[], None]] = None, rate: int = TAP_RATE):
+        super().__init__(name="spectrum-analyzer", daemon=True)
+        self.ring = ring
+        self.sync = sync
+        self.rate = rate
+        self.latest: Optional[SpectrumFrame] = None
+        self.callback_us = 0.0
+        self.callback_load = 0.0
+        self.analysis_us = 0.0
+        self._stop_event = threading.Event()
+        self._pcm = np.zeros(FFT_SIZE * ring.channels, dtype=np.int16)
+        self._window = np.hanning(FFT_SIZE).astype(np.float32)
+        self._norm = 2.0 / self._window.sum()
+        self._edges = _band_edges(rate, FFT_SIZE, BAND_COUNT)
+        self._smoothed = np.full(BAND_COUNT, FLOOR_DB, dtype=np.float32)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _update_cost(self, elapsed: float):
+        calls = self.ring.callback_calls
+        ns = self.ring.callback_ns
+        self.ring.callback_calls = 0
+        self.ring.callback_ns = 0
+        if calls:
+            self.callback_us = ns / calls / 1000.0
+            self.callback_load = ns / 1e9 / max(elapsed, 1e-6)
+
+    def _analyze(self, serial: int) -> Optional[SpectrumFrame]:
+        if not self.ring.read_latest(self._pcm):
+            return None
+        pcm = self._pcm.reshape(-1, self.ring.channels).astype(np.float32) / 32768.0
+        mono = pcm.mean(axis=1) * self._window
+        mag = np.abs(np.fft.rfft(mono)) * self._norm
+        bands = _db(np.maximum.reduceat(mag, self._edges))
+        decay = self._smoothed - 1.5
+        self._smoothed = np.maximum(bands.astype(np.float32), decay)
+        rms = np.sqrt(np.mean(np.square(pcm), axis=0))
+        peak = np.abs(pcm).max(axis=0)
+        return SpectrumFrame(self._smoothed.copy(), tuple(_db(rms).tolist()), tuple(_db(peak).tolist()), serial)
+
+    def run(self):
+        period = 1.0 / ANALYSIS_HZ
+        serial = 0
+        last_sync = 0.0
+        last_cost = time.monotonic()
+        last_pos = -1
+        last_error = -ERROR_LOG_INTERVAL
+        while not self._stop_event.wait(period):
+            now = time.monotonic()
+            try:
+                if self.sync is not None and now - last_sync >= SYNC_INTERVAL:
+                    last_sync = now
+                    self.sync()
+                if now - last_cost >= 1.0:
+                    self._update_cost(now - last_cost)
+                    last_cost = now
+                pos = self.ring.write_pos
+                if pos == last_pos:
+                    continue
+                last_pos = pos
+                t0 = time.perf_counter()
+                serial += 1
+                frame = self._analyze(serial)
+                self.analysis_us = (time.perf_counter() - t0) * 1e6
+                if frame is not None:
+                    self.latest = frame
+            except Exception as e:
+                # A persistent failure would repeat on every tick; log it at
+                # most once per ERROR_LOG_INTERVAL.
+                if now - last_error >= ERROR_LOG_INTERVAL:
+                    last_error = now
+                    log_exc_to_file(e)
@@ -0,0 +1,93 @@
+from PyQt5 import QtCore, QtGui, QtWidgets
+from typing import Optional
+
+from spectrum import PcmRing, SpectrumAnalyzer, TAP_RATE, TAP_CHANNELS, FLOOR_DB
+from utils import log_exc_to_file
+
+class SpectrumWidget(QtWidgets.QWidget):
+    BAR_COLOR = QtGui.QColor("#00d2ff")
+    METER_COLOR = QtGui.QColor("#3ddc84")
+    PEAK_COLOR = QtGui.QColor("#ff5252")
+    TEXT_COLOR = QtGui.QColor("#9a9a9a")
+    METER_WIDTH = 10
+
+    def __init__(self, engine, parent: QtWidgets.QWidget = None):
+        super().__init__(parent)
+        self.engine = engine
+        self.ring: Optional[PcmRing] = None
+        self.analyzer: Optional[SpectrumAnalyzer] = None
+        self._frame = None
+        self.setMinimumHeight(110)
+        self.setToolTip("Live spectrum and level meter (post-equalizer)")
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.setInterval(16)
+        self.timer.timeout.connect(self._on_tick)
+
+    def start(self):
+        if self.analyzer is not None or self.engine is None:
+            return
+        try:
+            self.ring = PcmRing()
+            if not self.engine.enable_tap(self.ring, TAP_RATE, TAP_CHANNELS):
+                self.ring = None
+                return
+            self.analyzer = SpectrumAnalyzer(self.ring, self.engine.sync_tap)
+            self.analyzer.start()
+            self.timer.start()
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def stop(self):
+        self.timer.stop()
+        if self.analyzer is not None:
+            self.analyzer.stop()
+            self.analyzer = None
+        if self.engine is not None:
+            try:
+                self.engine.disable_tap()
+            except Exception as e:
+                log_exc_to_file(e)
+        self.ring = None
+        self._frame = None
+        self.update()
+
+    def _on_tick(self):
+        if self.analyzer is None:
+            return
+        frame = self.analyzer.latest
+        if frame is not None and (self._frame is None or frame.serial != self._frame.serial):
+            self._frame = frame
+            self.update()
+
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), QtGui.QColor("#0f0f0f"))
+        frame = self._frame
+        w, h = self.width(), self.height() - 14
+        meters_w = (self.METER_WIDTH + 4) * 2
+        if frame is not None:
+            bands = frame.bands
+            n = len(bands)
+            bw = (w - meters_w - 8) / max(1, n)
+            for i, db in enumerate(bands.tolist()):
+                frac = min(1.0, max(0.0, (db - FLOOR_DB) / -FLOOR_DB))
+                bar_h = frac * h
+                painter.fillRect(QtCore.QRectF(i * bw + 1, h - bar_h, max(1.0, bw - 2), bar_h), self.BAR_COLOR)
+            x = w - meters_w
+            for level, peak in zip(frame.levels, frame.peaks):
+                lf = min(1.0, max(0.0, (level - FLOOR_DB) / -FLOOR_DB))
+                pf = min(1.0, max(0.0, (peak - FLOOR_DB) / -FLOOR_DB))
+                painter.fillRect(QtCore.QRectF(x, h - lf * h, self.METER_WIDTH, lf * h), self.METER_COLOR)
+                painter.fillRect(QtCore.QRectF(x, h - pf * h, self.METER_WIDTH, 2), self.PEAK_COLOR)
+                x += self.METER_WIDTH + 4
+        painter.setPen(self.TEXT_COLOR)
+        if self.analyzer is not None:
+            a = self.analyzer
+            text = (f"audio callback {a.callback_us:.1f} µs/call ({a.callback_load * 100:.2f}% CPU) · "
+                    f"FFT {a.analysis_us:.0f} µs")
+        else:
+            text = "Spectrum idle"
+        painter.drawText(QtCore.QRectF(0, h, w, 14), QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter, text)
+        painter.end()
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from paths import THEME_CACHE_FILE, STARTUP_LOG_FILE
+
+_T0 = time.perf_counter()
+
+FAST_START_FLAG = "--fast-start"
+FAST_START_ENV = "BEATZ_FAST_START"
+MILESTONES = ("imports", "window_shown", "library_ready", "first_audio")
+TIMELINE_KEEP = 50
+
+def fast_start_requested(argv: Optional[List[str]] = None) -> bool:
+    argv = sys.argv if argv is None else argv
+    return FAST_START_FLAG in argv or os.environ.get(FAST_START_ENV, "") not in ("", "0")
+
+FAST_START = fast_start_requested()
+
+_marks: List[Tuple[str, float]] = []
+_written = False
+
+def mark(name: str):
+    if any(n == name for n, _ in _marks):
+        return
+    _marks.append((name, (time.perf_counter() - _T0) * 1000.0))
+    if name == MILESTONES[-1]:
+        write_timeline()
+
+def timeline() -> List[Tuple[str, float]]:
+    return list(_marks)
+
+def write_timeline():
+    global _written
+    if _written or not _marks:
+        return
+    _written = True
+    parts = " ".join(f"{name}={ms:.0f}ms" for name, ms in _marks)
+    line = f"{time.strftime('%Y-%m-%d %H:%M:%S')} {'fast' if FAST_START else 'normal'} {parts}\n"
+    try:
+        try:
+            kept = STARTUP_LOG_FILE.read_text(encoding="utf-8").splitlines(keepends=True)[-(TIMELINE_KEEP - 1):]
+        except FileNotFoundError:
+            kept = []
+        tmp = STARTUP_LOG_FILE.with_suffix(".tmp")
+        tmp.write_text("".join(kept) + line, encoding="utf-8")
+        os.replace(tmp, STARTUP_LOG_FILE)
+    except Exception:
+        pass
+
+def load_stylesheet() -> str:
+    if FAST_START:
+        try:
+            return THEME_CACHE_FILE.read_text(encoding="utf-8")
+        except OSError:
+            pass
+    import qdarktheme
+    qss = qdarktheme.load_stylesheet("dark")
+    try:
+        tmp = THEME_CACHE_FILE.with_suffix(".tmp")
+        tmp.write_text(qss, encoding="utf-8")
+        os.replace(tmp, THEME_CACHE_FILE)
+    except OSError:
+        pass
+    return qss
@@ -0,0 +1,274 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from app_logging import get_logger
+from metrics import counter, gauge
+from utils import log_exc_to_file
+
+SANDBOX_PROCESSES = 2
+INTERACTIVE_PROCESSES = 1
+PARSE_TIMEOUT = 3.0
+STARTUP_TIMEOUT = 30.0
+MEMORY_LIMIT = 512 << 20
+ART_LIMIT = 16 << 20
+QUARANTINE_AFTER = 2
+
+TAGS, ART = "tags", "art"
+TAG_KEYS = ("title", "artist", "albumartist", "album", "tracknumber")
+
+_timeouts = counter("tag_parse_timeouts_total", "Tag parses killed for exceeding the time limit")
+_crashes = counter("tag_parse_crashes_total", "Tag parser processes that died (memory limit or crash)")
+_skipped = counter("tag_parse_quarantined_total", "Tag parses skipped because the file is quarantined")
+_quarantine_size = gauge("tag_files_quarantined", "Files whose tags are no longer parsed after repeated failures")
+
+def _first_art(m) -> Optional[bytes]:
+    tags = getattr(m, "tags", None)
+    if tags is not None:
+        try:
+            for v in tags.values():
+                d = getattr(v, "data", None)
+                if d:
+                    return d
+        except Exception:
+            pass
+    pics = getattr(m, "pictures", None)
+    if isinstance(pics, (list, tuple)):
+        return pics[0].data if pics else None
+    return getattr(pics, "data", None)
+
+def parse_file(path_str: str, kind: str) -> Any:
+    # Everything Mutagen returns is reduced to plain values here, so that
+    # only strings, numbers and bytes cross the process boundary.
+    from mutagen import File
+    if kind == ART:
+        m = File(path_str)
+        data = _first_art(m) if m else None
+        return bytes(data) if data and len(data) <= ART_LIMIT else None
+    m = File(path_str, easy=True)
+    if not m:
+        return None
+    tags = {}
+    for key in TAG_KEYS:
+        try:
+            values = m.get(key)
+        except Exception:
+            values = None
+        if values:
+            tags[key] = str(values[0])
+    info = getattr(m, "info", None)
+    length = getattr(info, "length", None) if info else None
+    if length:
+        tags["length"] = float(length)
+    return tags
+
+def _limit_memory():
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (MEMORY_LIMIT, MEMORY_LIMIT))
+    except Exception:
+        pass
+
+def _serve(conn):
+    _limit_memory()
+    try:
+        os.nice(5)
+    except Exception:
+        pass
+    import mutagen  # noqa: F401  (imported before the first deadline starts)
+    conn.send((True, None))
+    while True:
+        try:
+            path_str, kind = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            reply = (True, parse_file(path_str, kind))
+        except MemoryError:
+            reply = (False, "memory limit exceeded")
+        except Exception:
+            # A file Mutagen rejects is just untagged; only hitting a limit
+            # or killing the process counts towards quarantine.
+            reply = (True, None)
+        try:
+            conn.send(reply)
+        except Exception:
+            os._exit(1)
+
+class _Parser:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(child,), name="tag-sandbox", daemon=True)
+        self.process.start()
+        child.close()
+        if not self.conn.poll(STARTUP_TIMEOUT):
+            self.kill()
+            raise OSError("tag parser process did not start")
+        self.conn.recv()
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def call(self, path_str: str, kind: str, timeout: float) -> Tuple[bool, Any]:
+        self.conn.send((path_str, kind))
+        if not self.conn.poll(timeout):
+            raise TimeoutError
+        return self.conn.recv()
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(1.0)
+            self.conn.close()
+        except Exception:
+            pass
+
+class TagSandbox:
+    """Runs Mutagen in a small pool of child processes with time and memory limits.
+
+    A parse that times out or takes its process down counts as a failure;
+    after QUARANTINE_AFTER failures of the same file version it is recorded
+    as quarantined in the library index and never handed to Mutagen again.
+    The GUI thread has INTERACTIVE_PROCESSES slots of its own, so a lookup
+    there never queues behind parse_many keeping the other processes busy.
+    """
+
+    def __init__(self, processes: int = SANDBOX_PROCESSES, timeout: float = PARSE_TIMEOUT):
+        self.processes = processes
+        self.timeout = timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._slots = threading.BoundedSemaphore(processes)
+        self._interactive = threading.BoundedSemaphore(INTERACTIVE_PROCESSES)
+        self._idle: "queue.LifoQueue[_Parser]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._failures: Optional[Dict[str, Tuple[int, int, int]]] = None
+        self._disabled = False
+
+    def _failure_table(self) -> Dict[str, Tuple[int, int, int]]:
+        with self._lock:
+            if self._failures is None:
+                try:
+                    from library_index import get_library_index
+                    self._failures = get_library_index().tag_failures()
+                except Exception as e:
+                    log_exc_to_file(e)
+                    self._failures = {}
+                _quarantine_size.set(sum(1 for r in self._failures.values() if r[2] >= QUARANTINE_AFTER))
+            return self._failures
+
+    def is_quarantined(self, path: Path) -> bool:
+        row = self._failure_table().get(str(path))
+        if row is None or row[2] < QUARANTINE_AFTER:
+            return False
+        from library_index import file_identity
+        return file_identity(path) == row[:2]
+
+    def _record_failure(self, path: Path, reason: str):
+        try:
+            from library_index import get_library_index
+            row = get_library_index().record_tag_failure(path, reason)
+        except Exception as e:
+            log_exc_to_file(e)
+            return
+        table = self._failure_table()
+        with self._lock:
+            table[str(path)] = row
+            _quarantine_size.set(sum(1 for r in table.values() if r[2] >= QUARANTINE_AFTER))
+        if row[2] == QUARANTINE_AFTER:
+            get_logger().warning("Quarantined %s after %d failed tag parses (%s)", path, row[2], reason)
+
+    def _clear_failure(self, path: Path):
+        if str(path) not in self._failure_table():
+            return
+        with self._lock:
+            self._failures.pop(str(path), None)
+        try:
+            from library_index import get_library_index
+            get_library_index().clear_tag_failure(path)
+        except Exception as e:
+            log_exc_to_file(e)
+
+    def _checkout(self) -> Optional[_Parser]:
+        while True:
+            try:
+                parser = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if parser.alive():
+                return parser
+            parser.kill()
+        if self._disabled:
+            return None
+        try:
+            return _Parser(self._ctx)
+        except Exception as e:
+            # Without child processes (e.g. a restricted environment) tags
+            # are still read, just without isolation.
+            log_exc_to_file(e)
+            self._disabled = True
+            return None
+
+    def parse(self, path: Path, kind: str = TAGS) -> Any:
+        path = Path(path)
+        if multiprocessing.parent_process() is not None:
+            # Already inside a worker process, which is isolated from the GUI.
+            try:
+                return parse_file(str(path), kind)
+            except Exception:
+                return None
+        if self.is_quarantined(path):
+            _skipped.inc()
+            return None
+        on_gui = threading.current_thread() is threading.main_thread()
+        with self._interactive if on_gui else self._slots:
+            parser = self._checkout()
+            if parser is None:
+                try:
+                    return parse_file(str(path), kind)
+                except Exception:
+                    return None
+            try:
+                ok, value = parser.call(str(path), kind, self.timeout)
+            except TimeoutError:
+                parser.kill()
+                parser = None
+                _timeouts.inc()
+                ok, value = False, f"timed out after {self.timeout:g}s"
+            except (EOFError, OSError):
+                parser.kill()
+                parser = None
+                _crashes.inc()
+                ok, value = False, "parser process died"
+            finally:
+                if parser is not None:
+                    self._idle.put(parser)
+        if ok:
+            self._clear_failure(path)
+            return value
+        self._record_failure(path, value)
+        return None
+
+    def parse_many(self, paths: Iterable[Path], kind: str = TAGS) -> Iterator[Tuple[Path, Any]]:
+        # Results arrive as they complete, so a file that hangs until its
+        # timeout holds up one process while the rest keep going.
+        with ThreadPoolExecutor(max_workers=self.processes, thread_name_prefix="tag-sandbox") as pool:
+            futures = {pool.submit(self.parse, p, kind): p for p in paths}
+            try:
+                for fut in as_completed(futures):
+                    yield futures[fut], fut.result()
+            finally:
+                for fut in futures:
+                    fut.cancel()
+
+    def shutdown(self):
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+TAG_SANDBOX = TagSandbox()
@@ -0,0 +1,85 @@
+from PyQt5 import QtCore, QtGui
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+from cache_manager import CACHES, LRU
+from metadata_utils import extract_embedded_art
+from metrics import counter
+from utils import log_exc_to_file
+
+THUMBNAIL_CACHE_BUDGET = 24 << 20
+THUMBNAIL_SIZE = 128
+LOADER_THREADS = 3
+
+def _image_size(image) -> int:
+    return image.sizeInBytes() if isinstance(image, QtGui.QImage) else 0
+
+_thumbnail_cache = CACHES.create("thumbnails", THUMBNAIL_CACHE_BUDGET, LRU, sizeof=_image_size)
+_cancelled = counter("thumbnail_requests_cancelled_total", "Thumbnail loads dropped after their tile left the viewport")
+
+def thumbnail_key(path: str, size: int = THUMBNAIL_SIZE) -> Tuple[str, int]:
+    return path, size
+
+def has_thumbnail(path: str, size: int = THUMBNAIL_SIZE) -> bool:
+    # Null images are cached too, so tracks without art are not re-read.
+    return thumbnail_key(path, size) in _thumbnail_cache
+
+def cached_thumbnail(path: str, size: int = THUMBNAIL_SIZE) -> Optional[QtGui.QImage]:
+    key = thumbnail_key(path, size)
+    return _thumbnail_cache.get(key) if key in _thumbnail_cache else None
+
+def _decode_thumbnail(path: str, size: int) -> QtGui.QImage:
+    data = extract_embedded_art(Path(path))
+    image = QtGui.QImage()
+    if data and image.loadFromData(data):
+        image = image.scaled(size, size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+    return image
+
+def load_thumbnail(path: str, size: int = THUMBNAIL_SIZE) -> QtGui.QImage:
+    # QImage (unlike QPixmap) may be decoded and scaled off the GUI thread.
+    return _thumbnail_cache.get_or_load(thumbnail_key(path, size), lambda: _decode_thumbnail(path, size))
+
+class ThumbnailLoader(QtCore.QObject):
+    ready = QtCore.pyqtSignal(str, object)
+
+    def __init__(self, size: int = THUMBNAIL_SIZE, threads: int = LOADER_THREADS, parent: QtCore.QObject = None):
+        super().__init__(parent)
+        self.size = size
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="thumbnails")
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+
+    def request(self, paths: Iterable[str]):
+        # Replace the outstanding requests with `paths` (in priority order):
+        # queued loads for tiles that are no longer wanted are cancelled, and
+        # ones already running finish into the cache for later.
+        wanted = [p for p in paths if p]
+        keep = set(wanted)
+        with self._lock:
+            for path in [p for p in self._pending if p not in keep]:
+                if self._pending.pop(path).cancel():
+                    _cancelled.inc()
+            for path in wanted:
+                if path not in self._pending:
+                    self._pending[path] = self._pool.submit(self._load, path)
+
+    def _load(self, path: str):
+        try:
+            image = load_thumbnail(path, self.size)
+        except Exception as e:
+            log_exc_to_file(e)
+            image = QtGui.QImage()
+        with self._lock:
+            self._pending.pop(path, None)
+        try:
+            self.ready.emit(path, image)
+        except RuntimeError:
+            pass
+
+    def cancel_all(self):
+        self.request(())
+
+    def shutdown(self):
+        self.cancel_all()
+        self._pool.shutdown(wait=False)
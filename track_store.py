@@ -0,0 +1,485 @@
+import argparse
+import os
+import threading
+import time
+import tracemalloc
+from array import array
+from collections.abc import MutableSequence
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+PathLike = Union[str, os.PathLike]
+
+ENCODING = "utf-8"
+ERRORS = "surrogatepass"
+EMPTY_SLOT = -1
+NARROW_MAX = 0xFFFF
+TITLE_LEN_MASK = 0x3FFF
+TITLE_IN_NAME = 0x8000
+TAGGED = 0x4000
+DIR_CACHE_SIZE = 4096
+MAX_LOAD = 0.75
+COUNT_SATURATED = 255
+
+def _encode(s: str) -> bytes:
+    return s.encode(ENCODING, ERRORS)
+
+def _clip_utf8(raw: bytes, limit: int) -> bytes:
+    # Cut to at most limit bytes without splitting a character.
+    if len(raw) <= limit:
+        return raw
+    while limit and raw[limit] & 0xC0 == 0x80:
+        limit -= 1
+    return raw[:limit]
+
+def _fit(column: array, value: int) -> array:
+    # Id columns start 16-bit and are widened once a value needs 32 bits.
+    return array("I", column) if value > NARROW_MAX and column.typecode == "H" else column
+
+class _PackedKeys:
+    """(group id, UTF-8 name) pairs packed into one buffer, with an
+    open-addressing table from the pair to its position."""
+
+    def __init__(self):
+        self.group = array("H")
+        self.names = bytearray()
+        self.offsets = array("I", [0])
+        self._table = array("i", [EMPTY_SLOT]) * 8
+        self._limit = int(len(self._table) * MAX_LOAD)
+
+    def __len__(self) -> int:
+        return len(self.group)
+
+    def name(self, i: int) -> bytes:
+        return bytes(self.names[self.offsets[i]:self.offsets[i + 1]])
+
+    def _probe(self, group: int, raw: bytes) -> Tuple[int, int]:
+        table, names, offsets = self._table, self.names, self.offsets
+        size = len(table)
+        i = hash((group, raw)) % size
+        while True:
+            k = table[i]
+            if k == EMPTY_SLOT or (self.group[k] == group and names[offsets[k]:offsets[k + 1]] == raw):
+                return i, k
+            i = i + 1 if i + 1 < size else 0
+
+    def find(self, group: int, raw: bytes) -> Optional[int]:
+        k = self._probe(group, raw)[1]
+        return None if k == EMPTY_SLOT else k
+
+    def add(self, group: int, raw: bytes) -> Tuple[int, bool]:
+        slot, k = self._probe(group, raw)
+        if k != EMPTY_SLOT:
+            return k, False
+        k = len(self.group)
+        self.group = _fit(self.group, group)
+        self.group.append(group)
+        self.names += raw
+        self.offsets.append(len(self.names))
+        self._table[slot] = k
+        if len(self.group) > self._limit:
+            # Sized to the count rather than a power of two, so the load
+            # stays between 0.5 and MAX_LOAD instead of dropping to 0.375.
+            # The new table is filled before it replaces the old one, so a
+            # lock-free reader probes one complete table or the other.
+            size = len(self.group) * 2
+            table = array("i", [EMPTY_SLOT]) * size
+            for j in range(len(self.group)):
+                i = hash((self.group[j], self.name(j))) % size
+                while table[i] != EMPTY_SLOT:
+                    i = i + 1 if i + 1 < size else 0
+                table[i] = j
+            self._table = table
+            self._limit = int(size * MAX_LOAD)
+        return k, True
+
+class TrackStore:
+    """Every known track once, as columns indexed by track id.
+
+    Directories are a tree of interned path components (id 0 is the empty
+    directory), file names are packed UTF-8, and a title found inside the
+    file name is stored as a slice of it rather than a second copy.
+
+    Writers hold the lock. Paths are append-only and their hash tables are
+    swapped in whole, so lookup() and path() read without it; a title spans
+    two columns, so the tag readers take the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._dirs = _PackedKeys()
+        self._dirs.add(0, b"")
+        self._dir_ids: Dict[str, int] = {"": 0}
+        self._dir_strs: Dict[int, str] = {0: ""}
+        self._tracks = _PackedKeys()
+        self._titles = bytearray()
+        self._title_off = array("H")
+        self._title_len = array("H")
+        self.artist_of = array("H")
+        self.album_of = array("H")
+        self.durations = array("I")
+        self._strings: List[str] = [""]
+        self._string_ids: Dict[str, int] = {"": 0}
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def _intern(self, s: Optional[str]) -> int:
+        if not s:
+            return 0
+        sid = self._string_ids.get(s)
+        if sid is None:
+            sid = self._string_ids[s] = len(self._strings)
+            self._strings.append(s)
+        return sid
+
+    def _dir_id(self, d: str, create: bool) -> Optional[int]:
+        # Recently used directories are cached by their full string; the
+        # cache is bounded, so a miss walks the path one component at a time.
+        dir_id = self._dir_ids.get(d)
+        if dir_id is not None:
+            return dir_id
+        head, tail = os.path.split(d)
+        if tail:
+            parent = self._dir_id(head, create)
+            if parent is None:
+                return None
+            raw = _encode(tail)
+        else:
+            parent, raw = 0, _encode(d)  # a root such as "/" or "C:\\"
+        if create:
+            dir_id = self._dirs.add(parent, raw)[0]
+        else:
+            dir_id = self._dirs.find(parent, raw)
+            if dir_id is None:
+                return None
+        if len(self._dir_ids) >= DIR_CACHE_SIZE:
+            self._dir_ids = {"": 0}
+        self._dir_ids[d] = dir_id
+        return dir_id
+
+    def dir_str(self, dir_id: int) -> str:
+        d = self._dir_strs.get(dir_id)
+        if d is None:
+            parent = self._dirs.group[dir_id]
+            name = self._dirs.name(dir_id).decode(ENCODING, ERRORS)
+            d = name if parent == 0 else os.path.join(self.dir_str(parent), name)
+            if len(self._dir_strs) >= DIR_CACHE_SIZE:
+                self._dir_strs = {0: ""}
+            self._dir_strs[dir_id] = d
+        return d
+
+    def lookup(self, path: PathLike) -> Optional[int]:
+        d, name = os.path.split(os.fspath(path))
+        dir_id = self._dir_id(d, create=False)
+        if dir_id is None:
+            return None
+        return self._tracks.find(dir_id, _encode(name))
+
+    def add(self, path: PathLike) -> int:
+        return self.add_many((path,))[0]
+
+    def add_many(self, paths: Iterable[PathLike]) -> array:
+        ids = array("I")
+        split, fspath = os.path.split, os.fspath
+        tracks = self._tracks
+        with self._lock:
+            before = len(tracks)
+            last_dir, last_id = None, 0
+            for path in paths:
+                d, name = split(fspath(path))
+                if d != last_dir:
+                    last_dir, last_id = d, self._dir_id(d, create=True)
+                ids.append(tracks.add(last_id, _encode(name))[0])
+            # Tag columns grow in one step per batch; new tracks start untagged.
+            added = len(tracks) - before
+            if added:
+                for column in (self._title_off, self._title_len, self.artist_of, self.album_of, self.durations):
+                    column.frombytes(bytes(added * column.itemsize))
+        return ids
+
+    @property
+    def dir_of(self) -> array:
+        return self._tracks.group
+
+    def name(self, tid: int) -> str:
+        tracks = self._tracks
+        return tracks.names[tracks.offsets[tid]:tracks.offsets[tid + 1]].decode(ENCODING, ERRORS)
+
+    def path_str(self, tid: int) -> str:
+        dir_id = self._tracks.group[tid]
+        d = self._dir_strs.get(dir_id)
+        return os.path.join(self.dir_str(dir_id) if d is None else d, self.name(tid))
+
+    def path(self, tid: int) -> Path:
+        return Path(self.path_str(tid))
+
+    def set_tags(self, tid: int, title: str, artist: str, duration_ms: int, album: Optional[str] = None):
+        raw = _clip_utf8(_encode(title), TITLE_LEN_MASK) if title else b""
+        with self._lock:
+            tracks = self._tracks
+            start, end = tracks.offsets[tid], tracks.offsets[tid + 1]
+            at = tracks.names.find(raw, start, end) if raw else -1
+            if not raw:
+                off, flags = 0, 0
+            elif at >= 0:
+                off, flags = at - start, TITLE_IN_NAME
+            elif raw == self._title_bytes(tid):
+                off, flags = self._title_off[tid], 0
+            else:
+                off, flags = len(self._titles), 0
+                self._titles += raw
+            self._title_off = _fit(self._title_off, off)
+            self._title_off[tid] = off
+            self._title_len[tid] = len(raw) | flags | TAGGED
+            artist_id = self._intern(artist)
+            self.artist_of = _fit(self.artist_of, artist_id)
+            self.artist_of[tid] = artist_id
+            if album is not None:
+                album_id = self._intern(album)
+                self.album_of = _fit(self.album_of, album_id)
+                self.album_of[tid] = album_id
+            self.durations[tid] = max(0, min(int(duration_ms or 0), 0xFFFFFFFF))
+
+    def clear_tags(self, tid: int):
+        with self._lock:
+            self._title_len[tid] &= ~TAGGED
+
+    def has_tags(self, tid: int) -> bool:
+        return bool(self._title_len[tid] & TAGGED)
+
+    def _title_bytes(self, tid: int) -> Optional[bytes]:
+        # Callers hold the lock.
+        packed = self._title_len[tid]
+        n = packed & TITLE_LEN_MASK
+        if not n:
+            return None
+        off = self._title_off[tid]
+        if packed & TITLE_IN_NAME:
+            off += self._tracks.offsets[tid]
+            return bytes(self._tracks.names[off:off + n])
+        return bytes(self._titles[off:off + n])
+
+    def title(self, tid: int) -> str:
+        with self._lock:
+            raw = self._title_bytes(tid)
+        return self.name(tid) if raw is None else raw.decode(ENCODING, ERRORS)
+
+    def artist(self, tid: int) -> str:
+        return self._strings[self.artist_of[tid]]
+
+    def album(self, tid: int) -> str:
+        return self._strings[self.album_of[tid]]
+
+    def tags(self, tid: int) -> Optional[Tuple[str, str, int]]:
+        with self._lock:
+            if not self.has_tags(tid):
+                return None
+            return self.title(tid), self.artist(tid), self.durations[tid]
+
+class TrackList(MutableSequence):
+    """A list of track ids that reads and writes as a list of Paths.
+
+    Membership uses per-track counts in a bytearray, built on the first
+    test and kept up to date by every mutation; a count that reaches
+    COUNT_SATURATED is recounted from the ids when it drops again. A copy
+    shares the id array until either list is changed.
+    """
+
+    def __init__(self, store: TrackStore, paths: Iterable[PathLike] = (), ids: Optional[Iterable[int]] = None):
+        self.store = store
+        self.ids = array("I", ids) if ids is not None else store.add_many(paths)
+        self._shared = False
+        self._counts: Optional[bytearray] = None
+
+    def copy(self) -> "TrackList":
+        twin = TrackList(self.store, ids=())
+        twin.ids = self.ids
+        twin._shared = self._shared = True
+        return twin
+
+    def _own(self):
+        if self._shared:
+            self.ids = array("I", self.ids)
+            self._shared = False
+
+    def _count_index(self) -> bytearray:
+        if self._counts is None:
+            counts = bytearray(len(self.store))
+            for tid in self.ids:
+                if counts[tid] < COUNT_SATURATED:
+                    counts[tid] += 1
+            self._counts = counts
+        return self._counts
+
+    def _added(self, tids: Iterable[int]):
+        counts = self._counts
+        if counts is None:
+            return
+        for tid in tids:
+            if tid >= len(counts):
+                counts.extend(bytes(max(tid + 1, len(self.store)) - len(counts)))
+            if counts[tid] < COUNT_SATURATED:
+                counts[tid] += 1
+
+    def _removed(self, tids: Iterable[int]):
+        counts = self._counts
+        if counts is None:
+            return
+        for tid in tids:
+            c = counts[tid]
+            counts[tid] = c - 1 if c < COUNT_SATURATED else min(self.ids.count(tid), COUNT_SATURATED)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.store.path(tid) for tid in self.ids[i]]
+        return self.store.path(self.ids[i])
+
+    def __setitem__(self, i, path):
+        self._own()
+        old = self.ids[i]
+        if isinstance(i, slice):
+            new = self.store.add_many(path)
+            self.ids[i] = new
+            self._added(new)
+            self._removed(old)
+        else:
+            tid = self.store.add(path)
+            self.ids[i] = tid
+            self._added((tid,))
+            self._removed((old,))
+
+    def __delitem__(self, i):
+        self._own()
+        old = self.ids[i]
+        del self.ids[i]
+        self._removed(old if isinstance(i, slice) else (old,))
+
+    def insert(self, i: int, path: PathLike):
+        tid = self.store.add(path)
+        self._own()
+        self.ids.insert(i, tid)
+        self._added((tid,))
+
+    def append_id(self, tid: int):
+        self._own()
+        self.ids.append(tid)
+        self._added((tid,))
+
+    def __iter__(self) -> Iterator[Path]:
+        for tid in self.ids:
+            yield self.store.path(tid)
+
+    def has_id(self, tid: int) -> bool:
+        counts = self._count_index()
+        return tid < len(counts) and counts[tid] > 0
+
+    def __contains__(self, path) -> bool:
+        if path is None:
+            return False
+        tid = self.store.lookup(path)
+        return tid is not None and self.has_id(tid)
+
+    def index(self, path, start: int = 0, stop: Optional[int] = None) -> int:
+        tid = None if path is None else self.store.lookup(path)
+        if tid is None:
+            raise ValueError(f"{path} is not in the list")
+        return self.ids.index(tid, start, len(self.ids) if stop is None else stop)
+
+    def __repr__(self) -> str:
+        return f"TrackList({len(self.ids)} tracks)"
+
+TRACKS = TrackStore()
+
+def _synthetic_library(n: int) -> List[Tuple[str, str, str, int]]:
+    # One file in four is named after its title; the rest carry names that
+    # share nothing with the tag, so the title has to be stored.
+    rows = []
+    for i in range(n):
+        artist = f"Artist {i // 200:05d}"
+        album = f"Album {i // 12:06d}"
+        title = f"Song Title {i:07d}"
+        name = f"{i % 12 + 1:02d} - {title}.mp3" if i % 4 == 0 else f"Track{i % 12 + 1:02d}_{i:07d}.mp3"
+        rows.append((os.path.join(os.sep, "music", "library", artist, album, name), title, artist, 180000 + i % 120000))
+    return rows
+
+def _measure(build) -> Tuple[object, int, float]:
+    # Timed without tracemalloc, whose per-allocation hook would dominate.
+    t0 = time.perf_counter()
+    obj = build()
+    elapsed = time.perf_counter() - t0
+    del obj
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size, elapsed
+
+def run_benchmark(n: int) -> Dict[str, float]:
+    rows = _synthetic_library(n)
+
+    def build_paths():
+        # The old layout: Path objects shared by all_songs/playlist/queue plus a
+        # (title, artist, duration) tuple per str(path) in the metadata dict.
+        songs = [Path(p) for p, _, _, _ in rows]
+        playlist = list(songs)
+        queue = songs[:100]
+        tags = {str(p): (title, "".join(artist), dur) for p, (_, title, artist, dur) in zip(songs, rows)}
+        return songs, playlist, queue, tags
+
+    def build_store():
+        store = TrackStore()
+        songs = TrackList(store, (p for p, _, _, _ in rows))
+        for tid, (_, title, artist, dur) in enumerate(rows):
+            store.set_tags(tid, title, "".join(artist), dur)
+        playlist = songs.copy()
+        queue = TrackList(store, ids=songs.ids[:100])
+        return store, songs, playlist, queue
+
+    old, old_bytes, old_s = _measure(build_paths)
+    del old
+    new, new_bytes, new_s = _measure(build_store)
+    store, songs = new[0], new[1]
+    probe = rows[n // 2][0]
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        store.path(store.lookup(probe))
+    lookup_us = (time.perf_counter() - t0) * 1000
+    probe in songs  # builds the membership counts
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        probe in songs
+    contains_us = (time.perf_counter() - t0) * 1000
+    return {
+        "tracks": n,
+        "paths_bytes_per_track": old_bytes / n,
+        "store_bytes_per_track": new_bytes / n,
+        "ratio": old_bytes / new_bytes if new_bytes else 0.0,
+        "paths_build_s": old_s,
+        "store_build_s": new_s,
+        "lookup_us": lookup_us,
+        "contains_us": contains_us,
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare memory of Path lists vs the compact track store.")
+    parser.add_argument("--bench", action="store_true", help="run the memory benchmark")
+    parser.add_argument("--tracks", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+    if not args.bench:
+        parser.print_help()
+        return 0
+    r = run_benchmark(args.tracks)
+    print(f"{r['tracks']:,} tracks")
+    print(f"  Path lists + tag dict : {r['paths_bytes_per_track']:7.1f} B/track  (built in {r['paths_build_s']:.2f}s)")
+    print(f"  TrackStore            : {r['store_bytes_per_track']:7.1f} B/track  (built in {r['store_build_s']:.2f}s)")
+    print(f"  reduction             : {r['ratio']:.1f}x")
+    print(f"  id lookup + path      : {r['lookup_us']:.2f} us")
+    print(f"  'path in library'     : {r['contains_us']:.2f} us")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,26 +1,22 @@
-import traceback
-from pathlib import Path
 import sys
+import traceback
 
-CRASH_LOG = Path("crash.log")
+from app_logging import get_logger
 
 def log_exc_to_file(exc: Exception = None):
     try:
-        with CRASH_LOG.open("a", encoding="utf-8") as fh:
-            fh.write("==== Exception / Traceback ====\n")
-            if exc:
-                fh.write(str(exc) + "\n")
-            traceback.print_exc(file=fh)
-            fh.write("\n")
+        exc_info = sys.exc_info()
+        if exc_info[0] is None and exc is not None:
+            exc_info = (type(exc), exc, exc.__traceback__)
+        if exc_info[0] is None:
+            exc_info = None
+        get_logger().error(str(exc) if exc else "Exception", exc_info=exc_info)
     except Exception:
         pass
 
 def handle_uncaught(exctype, value, tb):
     try:
-        with CRASH_LOG.open("a", encoding="utf-8") as fh:
-            fh.write("==== Uncaught Exception ====\n")
-            traceback.print_exception(exctype, value, tb, file=fh)
-            fh.write("\n")
+        get_logger().critical("Uncaught exception", exc_info=(exctype, value, tb))
     except Exception:
         pass
     traceback.print_exception(exctype, value, tb)
@@ -0,0 +1,57 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from library_index import file_identity
+from paths import WAVEFORM_DIR
+
+WAVEFORM_BUCKETS = 2000
+WAVEFORM_RATE = 22050
+
+def compute_peaks(samples: np.ndarray, buckets: int = WAVEFORM_BUCKETS) -> np.ndarray:
+    mono = samples.mean(axis=1) if samples.ndim == 2 else samples
+    n = len(mono)
+    out = np.zeros((buckets, 2), dtype=np.int8)
+    if n == 0:
+        return out
+    buckets = min(buckets, n)
+    edges = (np.arange(buckets) * n) // buckets
+    lo = np.minimum.reduceat(mono, edges)
+    hi = np.maximum.reduceat(mono, edges)
+    out[:buckets, 0] = np.clip(np.round(lo * 127.0), -127, 127)
+    out[:buckets, 1] = np.clip(np.round(hi * 127.0), -127, 127)
+    return out[:buckets]
+
+def waveform_path(path: Path) -> Optional[Path]:
+    ident = file_identity(path)
+    if ident is None:
+        return None
+    key = hashlib.blake2b(f"{path}|{ident[0]}|{ident[1]}".encode("utf-8"), digest_size=12).hexdigest()
+    return WAVEFORM_DIR / f"{key}.npy"
+
+def load_peaks(path: Path) -> Optional[np.ndarray]:
+    wf = waveform_path(path)
+    if wf is None or not wf.exists():
+        return None
+    try:
+        return np.load(str(wf), mmap_mode="r")
+    except Exception:
+        return None
+
+def build_waveform(path: Path, buckets: int = WAVEFORM_BUCKETS) -> Optional[Path]:
+    from pcm_utils import decode_pcm
+    wf = waveform_path(path)
+    if wf is None:
+        return None
+    decoded = decode_pcm(path, samplerate=WAVEFORM_RATE)
+    if decoded is None:
+        return None
+    peaks = compute_peaks(decoded[0], buckets)
+    WAVEFORM_DIR.mkdir(exist_ok=True)
+    tmp = wf.with_suffix(".tmp.npy")
+    np.save(str(tmp), peaks)
+    os.replace(tmp, wf)
+    return wf
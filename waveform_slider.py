@@ -0,0 +1,96 @@
+from PyQt5 import QtCore, QtGui, QtWidgets
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+class WaveformSlider(QtWidgets.QSlider):
+    WAVE_COLOR = QtGui.QColor("#5a5a5a")
+    PLAYED_COLOR = QtGui.QColor(0, 210, 255, 150)
+    HEAD_COLOR = QtGui.QColor("#00d2ff")
+
+    def __init__(self, orientation=QtCore.Qt.Horizontal, parent: QtWidgets.QWidget = None):
+        super().__init__(orientation, parent)
+        self._peaks: Optional["np.ndarray"] = None
+        self._cache: Optional[QtGui.QPixmap] = None
+
+    def set_peaks(self, peaks: Optional["np.ndarray"]):
+        self._peaks = peaks
+        self._cache = None
+        self.setMinimumHeight(44 if peaks is not None else 0)
+        self.update()
+
+    def has_peaks(self) -> bool:
+        return self._peaks is not None
+
+    def resizeEvent(self, event: QtGui.QResizeEvent):
+        self._cache = None
+        super().resizeEvent(event)
+
+    def _render_cache(self) -> QtGui.QPixmap:
+        import numpy as np
+        w, h = max(1, self.width()), max(1, self.height())
+        ratio = self.devicePixelRatioF()
+        pix = QtGui.QPixmap(int(w * ratio), int(h * ratio))
+        pix.setDevicePixelRatio(ratio)
+        pix.fill(QtCore.Qt.transparent)
+        peaks = np.asarray(self._peaks)
+        if len(peaks) == 0:
+            return pix
+        edges = (np.arange(w) * len(peaks)) // w
+        lo = np.minimum.reduceat(peaks[:, 0], edges).astype(np.float32) / 127.0
+        hi = np.maximum.reduceat(peaks[:, 1], edges).astype(np.float32) / 127.0
+        mid = h / 2.0
+        half = mid - 1.0
+        y0 = mid - hi * half
+        y1 = np.maximum(mid - lo * half, y0 + 1.0)
+        painter = QtGui.QPainter(pix)
+        painter.setPen(QtGui.QPen(self.WAVE_COLOR, 1.0))
+        painter.drawLines([QtCore.QLineF(x + 0.5, a, x + 0.5, b) for x, (a, b) in enumerate(zip(y0.tolist(), y1.tolist()))])
+        painter.end()
+        return pix
+
+    def _value_to_x(self) -> float:
+        span = max(1, self.maximum() - self.minimum())
+        return (self.value() - self.minimum()) / span * self.width()
+
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        if self._peaks is None:
+            super().paintEvent(event)
+            return
+        if self._cache is None:
+            self._cache = self._render_cache()
+        painter = QtGui.QPainter(self)
+        painter.drawPixmap(0, 0, self._cache)
+        x = self._value_to_x()
+        painter.fillRect(QtCore.QRectF(0, 0, x, self.height()), self.PLAYED_COLOR)
+        painter.setPen(QtGui.QPen(self.HEAD_COLOR, 2.0))
+        painter.drawLine(QtCore.QPointF(x, 0), QtCore.QPointF(x, self.height()))
+        painter.end()
+
+    def _set_value_from_x(self, x: float):
+        frac = min(1.0, max(0.0, x / max(1, self.width())))
+        self.setValue(self.minimum() + int(round(frac * (self.maximum() - self.minimum()))))
+
+    def mousePressEvent(self, event: QtGui.QMouseEvent):
+        if self._peaks is None or event.button() != QtCore.Qt.LeftButton:
+            super().mousePressEvent(event)
+            return
+        self.setSliderDown(True)
+        self._set_value_from_x(event.pos().x())
+        event.accept()
+
+    def mouseMoveEvent(self, event: QtGui.QMouseEvent):
+        if self._peaks is None or not self.isSliderDown():
+            super().mouseMoveEvent(event)
+            return
+        self._set_value_from_x(event.pos().x())
+        event.accept()
+
+    def mouseReleaseEvent(self, event: QtGui.QMouseEvent):
+        if self._peaks is None or not self.isSliderDown():
+            super().mouseReleaseEvent(event)
+            return
+        self._set_value_from_x(event.pos().x())
+        self.setSliderDown(False)
+        event.accept()
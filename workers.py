@@ -1,18 +1,42 @@
 from PyQt5 import QtCore
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, CancelledError, as_completed, wait, FIRST_COMPLETED
+import multiprocessing
+import os
 from metadata_utils import read_text_file, find_lyrics_file
 from metadata_utils import extract_embedded_art
-from typing import Optional
+from import_utils import zero_copy_file
+from dedup import hash_audio_payload, update_library_hashes, DUPLICATE_ALLOW, DUPLICATE_LINK
+from library_index import get_library_index, LYRICS_OPTIMIZE_THRESHOLD
+from metadata_utils import scan_folder_for_songs, read_browse_tags_many, load_metadata_many, LYRICS_EXTS
+from lyrics_utils import parse_lyrics_by_suffix
+from smart_playlists import refresh_smart_playlists, LYRICS
+from paths import SONGS_DIR, LYRICS_DIR
+from utils import log_exc_to_file
+from typing import Callable, Dict, List, Optional, Tuple
+import threading
+import time
+from metrics import histogram
+from profiler import profiled
+
+ImportJob = Tuple[Path, Path, Optional[Path], Optional[Path]]
+
+_QUEUE_WAIT_HELP = "Delay between creating a worker and its thread starting it"
 
 class LyricsWorker(QtCore.QObject):
     finished = QtCore.pyqtSignal(str, object)
+    _queue_wait = histogram("worker_queue_wait_seconds", _QUEUE_WAIT_HELP, worker="lyrics")
+
     def __init__(self, song_path: Path):
         super().__init__()
         self.song_path = song_path
         self._interrupted = False
+        self._created = time.perf_counter()
 
     @QtCore.pyqtSlot()
+    @profiled
     def run(self):
+        self._queue_wait.observe(time.perf_counter() - self._created)
         try:
             if self._interrupted:
                 return
@@ -35,13 +59,18 @@ class LyricsWorker(QtCore.QObject):
 
 class ArtWorker(QtCore.QObject):
     finished = QtCore.pyqtSignal(str, bytes)
+    _queue_wait = histogram("worker_queue_wait_seconds", worker="art")
+
     def __init__(self, path: Path):
         super().__init__()
         self.path = path
         self._interrupted = False
+        self._created = time.perf_counter()
 
     @QtCore.pyqtSlot()
+    @profiled
     def run(self):
+        self._queue_wait.observe(time.perf_counter() - self._created)
         try:
             if self._interrupted:
                 return
@@ -58,3 +87,439 @@ class ArtWorker(QtCore.QObject):
 
     def interrupt(self):
         self._interrupted = True
+
+class MetadataWorker(QtCore.QObject):
+    finished = QtCore.pyqtSignal(int)
+
+    def __init__(self, paths: List[Path]):
+        super().__init__()
+        self.paths = paths
+        self._interrupted = False
+
+    @QtCore.pyqtSlot()
+    @profiled
+    def run(self):
+        loaded = 0
+        try:
+            loaded = load_metadata_many(self.paths, lambda: self._interrupted)
+        except Exception as e:
+            log_exc_to_file(e)
+        try:
+            self.finished.emit(loaded)
+        except Exception:
+            pass
+
+    def interrupt(self):
+        self._interrupted = True
+
+class DuplicateImport(Exception):
+    def __init__(self, existing: Path):
+        super().__init__(f"duplicate of {existing.name}")
+        self.existing = existing
+
+class ImportWorker(QtCore.QObject):
+    progress = QtCore.pyqtSignal(int, int, str)
+    finished = QtCore.pyqtSignal(list, list, list, list)
+    def __init__(self, jobs: List[ImportJob], overwrite: bool = False, max_workers: int = 4,
+                 duplicate_policy: str = DUPLICATE_ALLOW):
+        super().__init__()
+        self.jobs = jobs
+        self.overwrite = overwrite
+        self.max_workers = max(1, max_workers)
+        self.duplicate_policy = duplicate_policy
+        self._seen: Dict[str, Path] = {}
+        self._seen_lock = threading.Lock()
+        self._interrupted = False
+
+    def _claim_hash(self, content_hash: str, dest: Path) -> Optional[Path]:
+        with self._seen_lock:
+            existing = self._seen.get(content_hash)
+            if existing is None:
+                matches = [p for p in get_library_index().find_by_hash(content_hash) if p != dest]
+                existing = matches[0] if matches else None
+            if existing is None:
+                self._seen[content_hash] = dest
+            return existing
+
+    def _import_one(self, job: ImportJob) -> Path:
+        music_src, music_dest, lyrics_src, lyrics_dest = job
+        if self._interrupted:
+            raise CancelledError
+        content_hash = None
+        if self.duplicate_policy != DUPLICATE_ALLOW:
+            content_hash = hash_audio_payload(music_src)
+            existing = self._claim_hash(content_hash, music_dest) if content_hash else None
+            if existing is not None:
+                if self.duplicate_policy != DUPLICATE_LINK:
+                    raise DuplicateImport(existing)
+                if lyrics_src and not find_lyrics_file(existing):
+                    zero_copy_file(lyrics_src, LYRICS_DIR / f"{existing.stem}{lyrics_src.suffix}")
+                return existing
+        zero_copy_file(music_src, music_dest, overwrite=self.overwrite)
+        if lyrics_src and lyrics_dest:
+            zero_copy_file(lyrics_src, lyrics_dest, overwrite=self.overwrite)
+        if content_hash:
+            get_library_index().set_hashes({str(music_dest): content_hash})
+        return music_dest
+
+    @QtCore.pyqtSlot()
+    @profiled
+    def run(self):
+        imported: List[str] = []
+        errors: List[str] = []
+        duplicates: List[str] = []
+        cancelled: List[str] = []
+        total = len(self.jobs)
+        try:
+            if self.duplicate_policy != DUPLICATE_ALLOW:
+                update_library_hashes(get_library_index(), scan_folder_for_songs(SONGS_DIR))
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, max(1, total))) as pool:
+                futures = {pool.submit(self._import_one, job): job for job in self.jobs}
+                done = 0
+                for fut in as_completed(futures):
+                    job = futures[fut]
+                    done += 1
+                    try:
+                        imported.append(str(fut.result()))
+                    except DuplicateImport as e:
+                        duplicates.append(f"{job[0].name}: {e}")
+                    except CancelledError:
+                        cancelled.append(job[0].name)
+                    except Exception as e:
+                        errors.append(f"{job[0].name}: {e}")
+                    self.progress.emit(done, total, job[0].name)
+                    if self._interrupted:
+                        for f in futures:
+                            f.cancel()
+        except Exception as e:
+            log_exc_to_file(e)
+            errors.append(str(e))
+        try:
+            self.finished.emit(imported, errors, duplicates, cancelled)
+        except Exception:
+            pass
+
+    def interrupt(self):
+        self._interrupted = True
+
+class HashWorker(QtCore.QObject):
+    finished = QtCore.pyqtSignal(list)
+    def __init__(self, paths: List[Path]):
+        super().__init__()
+        self.paths = paths
+        self._interrupted = False
+
+    @QtCore.pyqtSlot()
+    @profiled
+    def run(self):
+        groups: List[List[Path]] = []
+        try:
+            index = get_library_index()
+            if not self._interrupted:
+                update_library_hashes(index, self.paths)
+            if not self._interrupted:
+                groups = index.duplicate_groups()
+        except Exception as e:
+            log_exc_to_file(e)
+        try:
+            self.finished.emit(groups)
+        except Exception:
+            pass
+
+    def interrupt(self):
+        self._interrupted = True
+
+def run_in_spawn_pool(fn: Callable, items: List, max_workers: int, on_batch: Callable[[list], None],
+                      batch_size: int, progress: Callable[[int, int], None],
+                      interrupted: Callable[[], bool]) -> int:
+    # Runs fn over items in spawned, low-priority processes (forking the GUI
+    # process with its threads running is unsafe), keeping at most two tasks
+    # per process in flight so an interrupt is noticed within half a second.
+    # Results reach on_batch in groups of batch_size; returns how many ran.
+    from loudness import lower_priority
+    done_count = 0
+    total = len(items)
+    if not items or interrupted():
+        return 0
+    batch = []
+    ctx = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx, initializer=lower_priority)
+    try:
+        pending = set()
+        it = iter(items)
+        while not interrupted():
+            while len(pending) < max_workers * 2:
+                nxt = next(it, None)
+                if nxt is None:
+                    break
+                pending.add(pool.submit(fn, nxt))
+            if not pending:
+                break
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    batch.append(fut.result())
+                except Exception as e:
+                    log_exc_to_file(e)
+                done_count += 1
+            if len(batch) >= batch_size:
+                on_batch(batch)
+                batch = []
+            if done:
+                progress(done_count, total)
+    finally:
+        pool.shutdown(wait=not interrupted(), cancel_futures=True)
+    if batch:
+        on_batch(batch)
+    return done_count
+
+class LoudnessWorker(QtCore.QObject):
+    progress = QtCore.pyqtSignal(int, int)
+    finished = QtCore.pyqtSignal(int)
+    BATCH_SIZE = 8
+    def __init__(self, paths: List[Path], max_workers: Optional[int] = None):
+        super().__init__()
+        self.paths = paths
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self._interrupted = False
+
+    @QtCore.pyqtSlot()
+    @profiled
+    def run(self):
+        analyzed = 0
+        try:
+            from loudness import analyze_track
+            index = get_library_index()
+            todo = [str(p) for p in index.stale_loudness_paths(self.paths)]
+            analyzed = run_in_spawn_pool(analyze_track, todo, self.max_workers, index.set_loudness, self.BATCH_SIZE,
+                                         self.progress.emit, lambda: self._interrupted)
+        except Exception as e:
+            log_exc_to_file(e)
+        try:
+            self.finished.emit(analyzed)
+        except Exception:
+            pass
+
+    def interrupt(self):
+        self._interrupted = True
+
+class FeatureWorker(QtCore.QObject):
+    progress = QtCore.pyqtSignal(int, int)
+    finished = QtCore.pyqtSignal(int)
+    BATCH_SIZE = 16
+    def __init__(self, paths: List[Path], max_workers: Optional[int] = None):
+        super().__init__()
+        self.paths = paths
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self._interrupted = False
+
+    @QtCore.pyqtSlot()
+    @profiled
+    def run(self):
+        analyzed = 0
+        try:
+            from similarity import analyze_features, build_feature_matrix, get_similarity_index
+            index = get_library_index()
+            todo = [str(p) for p in index.stale_feature_paths(self.paths)]
+            analyzed = run_in_spawn_pool(analyze_features, todo, self.max_workers, index.set_features, self.BATCH_SIZE,
+                                         self.progress.emit, lambda: self._interrupted)
+            # Rebuild the matrix when vectors were added, or when tracks were
+            # removed from the library since the last build.
+            rows = index.feature_rows()
+            if not self._interrupted and (analyzed or len(rows) != len(get_similarity_index())):
+                build_feature_matrix(rows)
+        except Exception as e:
+            log_exc_to_file(e)
+        try:
+            self.finished.emit(analyzed)
+        except Exception:
+            pass
+
+    def interrupt(self):
+        self._interrupted = True
+
+class LyricsIndexWorker(QtCore.QObject):
+    finished = QtCore.pyqtSignal(int, int)
+    BATCH_SIZE = 200
+    def __init__(self, lyrics_dir: Path = LYRICS_DIR):
+        super().__init__()
+        self.lyrics_dir = lyrics_dir
+        self._interrupted = False
+
+    @QtCore.pyqtSlot()
+    @profiled
+    def run(self):
+        indexed = 0
+        removed = 0
+        try:
+            files = []
+            if self.lyrics_dir.exists():
+                files = [f for f in self.lyrics_dir.iterdir() if f.is_file() and f.suffix.lower() in LYRICS_EXTS]
+            index = get_library_index()
+            removed = index.prune_lyric_files(files)
+            batch = []
+            for f in index.stale_lyric_files(files):
+                if self._interrupted:
+                    break
+                content = read_text_file(f)
+                batch.append((str(f), parse_lyrics_by_suffix(content, f.suffix) if content else []))
+                if len(batch) >= self.BATCH_SIZE:
+                    index.set_lyrics(batch)
+                    indexed += len(batch)
+                    batch = []
+            if batch:
+                index.set_lyrics(batch)
+                indexed += len(batch)
+            if indexed + removed >= LYRICS_OPTIMIZE_THRESHOLD and not self._interrupted:
+                index.optimize_lyrics()
+            if indexed or removed:
+                refresh_smart_playlists(None, LYRICS)
+        except Exception as e:
+            log_exc_to_file(e)
+        try:
+            self.finished.emit(indexed, removed)
+        except Exception:
+            pass
+
+    def interrupt(self):
+        self._interrupted = True
+
+class BrowseIndexWorker(QtCore.QObject):
+    finished = QtCore.pyqtSignal(list, list, bool)
+    BATCH_SIZE = 500
+    def __init__(self, paths: List[Path], offline_roots: Optional[List[str]] = None,
+                 forget: Optional[List[Path]] = None):
+        super().__init__()
+        self.paths = paths
+        self.offline_roots = offline_roots or []
+        self.forget = forget or []
+        self._interrupted = False
+
+    @QtCore.pyqtSlot()
+    @profiled
+    def run(self):
+        updated: List[str] = []
+        removed: List[str] = []
+        rekeyed = False
+        try:
+            index = get_library_index()
+            # Tracks of an offline library root keep their browse rows (and
+            # so their place in smart playlists) until the root is removed.
+            keep = list(self.paths)
+            for root in self.offline_roots:
+                keep.extend(index.root_tracks(root))
+            removed = index.prune_browse_tracks(keep)
+            # Tracks removed from the library, and pruned ones whose file is
+            # gone, lose the rest of their index rows (hashes, loudness, tags,
+            # features, play history). A pruned file that still exists only
+            # left the list for now and keeps them.
+            gone = [str(p) for p in self.forget] + [p for p in removed if not os.path.exists(p)]
+            if gone:
+                index.remove_paths(gone)
+            rekeyed = index.rekey_browse_tracks() > 0
+            batch = []
+            for p, tags in read_browse_tags_many(index.stale_browse_paths(self.paths)):
+                if self._interrupted:
+                    break
+                batch.append((str(p),) + tags)
+                if len(batch) >= self.BATCH_SIZE:
+                    index.set_browse_tracks(batch)
+                    updated.extend(b[0] for b in batch)
+                    batch = []
+            if batch:
+                index.set_browse_tracks(batch)
+                updated.extend(b[0] for b in batch)
+            if updated or removed or (self.paths and not index.browse_artist_count()):
+                index.rebuild_browse_aggregates()
+            if updated:
+                refresh_smart_playlists(updated)
+        except Exception as e:
+            log_exc_to_file(e)
+        try:
+            self.finished.emit(updated, removed, rekeyed)
+        except Exception:
+            pass
+
+    def interrupt(self):
+        self._interrupted = True
+
+class LibraryRowsWorker(QtCore.QObject):
+    finished = QtCore.pyqtSignal(object)
+    def __init__(self, prepare: Callable[[list], object], index=None):
+        super().__init__()
+        self.prepare = prepare
+        self.index = index
+
+    @QtCore.pyqtSlot()
+    @profiled
+    def run(self):
+        result = None
+        try:
+            result = self.prepare((self.index or get_library_index()).library_rows())
+        except Exception as e:
+            log_exc_to_file(e)
+        try:
+            self.finished.emit(result)
+        except Exception:
+            pass
+
+class WaveformWorker(QtCore.QObject):
+    finished = QtCore.pyqtSignal(str, bool)
+    _queue_wait = histogram("worker_queue_wait_seconds", worker="waveform")
+
+    def __init__(self, path: Path):
+        super().__init__()
+        self.path = path
+        self._interrupted = False
+        self._created = time.perf_counter()
+
+    @QtCore.pyqtSlot()
+    @profiled
+    def run(self):
+        self._queue_wait.observe(time.perf_counter() - self._created)
+        ok = False
+        try:
+            if not self._interrupted:
+                from waveform import build_waveform
+                ok = build_waveform(self.path) is not None
+        except Exception as e:
+            log_exc_to_file(e)
+        try:
+            self.finished.emit(str(self.path), ok)
+        except Exception:
+            pass
+
+    def interrupt(self):
+        self._interrupted = True
+
+class RenderWorker(QtCore.QObject):
+    progress = QtCore.pyqtSignal(int, int, str)
+    finished = QtCore.pyqtSignal(int, int, float)
+    def __init__(self, jobs: List[Tuple[str, str, float]], bands: Optional[List[float]], fmt: str = "wav"):
+        super().__init__()
+        self.jobs = jobs
+        self.bands = bands
+        self.fmt = fmt
+        self._interrupted = False
+
+    @QtCore.pyqtSlot()
+    @profiled
+    def run(self):
+        ok = 0
+        multiple = 0.0
+        try:
+            from audio_engine import OfflineRenderer
+            renderer = OfflineRenderer(bands=self.bands, fmt=self.fmt)
+            results, multiple = renderer.render_many(
+                self.jobs, progress=lambda res, done, total: self.progress.emit(done, total, Path(res.src).name),
+                cancelled=lambda: self._interrupted)
+            ok = sum(1 for r in results if r.ok)
+        except Exception as e:
+            log_exc_to_file(e)
+        try:
+            self.finished.emit(ok, len(self.jobs), multiple)
+        except Exception:
+            pass
+
+    def interrupt(self):
+        self._interrupted = True